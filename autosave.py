@@ -0,0 +1,84 @@
+import queue
+import threading
+import time
+from typing import Optional
+
+from savegame import SaveSnapshot, write_snapshot
+
+# ---------- Background autosave ----------
+#
+# The frame loop only copies the chunks changed since the last save into a
+# SaveSnapshot (a few KiB per chunk) and queues it.  A worker thread does the
+# JSON encoding and the file writes, in submission order, so the game never
+# waits on the disk.  Until a full snapshot has reached the file (a new world,
+# or a failed write) the saver asks for full snapshots.  ``needs_full`` is
+# shared with the worker under a lock; whether the file can take a partial
+# write is tracked by the worker alone, so a partial snapshot queued behind
+# a failed write is dropped rather than appended to an incomplete save.
+
+AUTOSAVE_INTERVAL = 30.0     # seconds between autosaves
+
+
+class AutoSaver:
+    def __init__(self, path: str, interval: float = AUTOSAVE_INTERVAL, needs_full: bool = True):
+        self.path = path
+        self.interval = interval
+        self._needs_full = needs_full
+        self._lock = threading.Lock()
+        self.last_error: Optional[BaseException] = None
+        self.last_write_ms = 0.0
+        self.writes = 0
+        self._since = 0.0
+        self._queue: "queue.Queue[Optional[SaveSnapshot]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(not needs_full,), name="autosave", daemon=True)
+        self._thread.start()
+
+    def due(self, dt: float) -> bool:
+        """Advance the timer; True once per interval."""
+        self._since += dt
+        if self._since < self.interval:
+            return False
+        self._since = 0.0
+        return True
+
+    @property
+    def needs_full(self) -> bool:
+        """True if the next snapshot submitted should be a full one."""
+        with self._lock:
+            return self._needs_full
+
+    def submit(self, snapshot: SaveSnapshot) -> None:
+        with self._lock:
+            if snapshot.full:
+                self._needs_full = False
+            self._queue.put(snapshot)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Finish every queued write, then stop the worker."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self, file_ok: bool) -> None:
+        # file_ok: the file holds every chunk written so far, so partial snapshots can be appended to it
+        while True:
+            snap = self._queue.get()
+            if snap is None:
+                return
+            if not snap.full and not file_ok:
+                continue    # no complete save yet; the next full snapshot covers this
+            t0 = time.perf_counter()
+            try:
+                write_snapshot(self.path, snap)
+            except (OSError, ValueError) as e:
+                self.last_error = e
+                file_ok = False
+                with self._lock:
+                    self._needs_full = True
+                print(f"[world] Autosave to {self.path} failed: {e}")
+            else:
+                file_ok = True
+                self.writes += 1
+                self.last_write_ms = (time.perf_counter() - t0) * 1000.0
@@ -0,0 +1,355 @@
+"""
+Micro-benchmarks for the world pipeline.
+
+Times the hot world functions at several world sizes with fixed seeds and
+writes the results as JSON (mean / p50 / p95 in ms, peak traced memory).
+
+    python benchmarks/bench_world.py --out bench.json
+    python benchmarks/bench_world.py --compare bench.json      # flag regressions
+
+Setup work (building the world a benchmark needs) is never timed.  Memory
+peaks come from a separate tracemalloc run so tracing does not skew timings;
+they cover Python and NumPy allocations, not SDL surface pixels.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+
+import platformer as game
+from collision import SolidBitmap
+from flowfield import FlowField
+
+game.TILE_CACHE_DIR = None      # timings must not depend on, or fill, the user's atlas cache
+
+DEFAULT_SIZES = "100x100,200x150,400x200"
+DEFAULT_SEED = 1234
+DEFAULT_REPEAT = 7
+DEFAULT_THRESHOLD = 0.15      # flag p50 slowdowns above 15 %
+FLUID_TICKS = 60              # update_fluids is timed over one second of ticks
+NPC_COUNT = 1000              # NPCs in the npc_* benchmarks
+
+
+# ---------------------------- Benchmarks --------------------------------------
+# Each benchmark is setup(seed) -> state and run(state).  setup runs before
+# every repetition (untimed) so mutating benchmarks always start fresh.
+
+def _seeded(seed: int) -> None:
+    game.configure_world(seed=seed)
+
+def _world(seed: int):
+    _seeded(seed)
+    return game.generate_world()
+
+def _cave_start(world) -> tuple[int, int]:
+    """Empty underground tile closest to the middle of the world."""
+    solid = world.solid_slice(0, world.width, 0, world.height)
+    solid[:, :game.SURFACE_LEVEL + 1] = True
+    xs, ys = np.nonzero(~solid)
+    if not len(xs):
+        return world.width // 2, world.height // 2
+    d = (xs - world.width // 2) ** 2 + (ys - world.height // 2) ** 2
+    i = int(np.argmin(d))
+    return int(xs[i]), int(ys[i])
+
+def setup_generate_world(seed):
+    _seeded(seed)
+
+def run_generate_world(_):
+    game.generate_world()
+
+def setup_generate_column(seed):
+    _seeded(seed)
+    return game.WORLD_WIDTH // game.CHUNK_SIZE // 2
+
+def run_generate_column(cx):
+    game.generate_column(cx)
+
+# The cave and pool stages of generate_column, over every column of the world
+
+def _columns(seed: int):
+    """(cx, rng, tiles, bg) for every column, with tiles still uncarved."""
+    _seeded(seed)
+    columns = []
+    for cx in range(-(-game.WORLD_WIDTH // game.CHUNK_SIZE)):
+        rng = game.column_rng(cx, seed)
+        tiles = game.column_terrain(cx, seed, rng)
+        columns.append((cx, rng, tiles, tiles.copy()))
+    return seed, columns
+
+def setup_generate_caves(seed):
+    return _columns(seed)
+
+def run_generate_caves(state):
+    seed, columns = state
+    for cx, _, tiles, bg in columns:
+        game.carve_caves(tiles, bg, cx, seed)
+
+def setup_spawn_fluids(seed):
+    state = _columns(seed)
+    run_generate_caves(state)
+    return state
+
+def run_spawn_fluids(state):
+    _, columns = state
+    for cx, rng, tiles, _ in columns:
+        game.place_fluid_pools(tiles, min(game.CHUNK_SIZE, game.WORLD_WIDTH - cx * game.CHUNK_SIZE), rng)
+
+def setup_update_fluids(seed):
+    world = _world(seed)
+    fluids = game.new_fluid_sim(world)
+    fluids.wake_all()
+    return world, fluids
+
+def run_update_fluids(state):
+    world, fluids = state
+    for _ in range(FLUID_TICKS):
+        game.update_fluids(world, fluids)
+
+def setup_reveal_cave(seed):
+    world = _world(seed)
+    sx, sy = _cave_start(world)
+    return world, game.new_fog(world), sx, sy
+
+def run_reveal_cave(state):
+    world, fog, sx, sy = state
+    fog.reveal_cave_and_halo(world, sx, sy)
+
+def setup_build_minimap(seed):
+    world = _world(seed)
+    return world, game.new_fog(world)
+
+def run_build_minimap(state):
+    world, fog = state
+    game.build_minimap(world, fog.revealed)
+
+def setup_tile_variants(seed):
+    _seeded(seed)
+
+def run_tile_variants(_):
+    game.build_tile_variants()
+
+_atlas_cache: list[tempfile.TemporaryDirectory] = []     # removed at the end of run_suite
+
+def setup_load_atlas(seed):
+    # A cache directory already holding this seed's atlas, as on a second launch
+    if not _atlas_cache:
+        _atlas_cache.append(tempfile.TemporaryDirectory(prefix="digsim-bench-"))
+    cache_dir = _atlas_cache[0].name
+    game.load_tile_atlas(seed, cache_dir)
+    return seed, cache_dir
+
+def run_load_atlas(state):
+    game.load_tile_atlas(*state)
+
+def setup_npcs(seed):
+    # NPCs scattered over a few screens around a player in a cave, so some are
+    # far (LOD) and the near ones path through real terrain
+    world = _world(seed)
+    tx, ty = _cave_start(world)
+    ts = game.TILE_SIZE
+    player = (tx * ts + ts // 2, ty * ts + ts // 2)
+    rng = np.random.default_rng(seed)
+    npcs = game.new_npc_pool()
+    for dx, dy in rng.uniform(-2.5, 2.5, (NPC_COUNT, 2)) * (game.SCREEN_WIDTH, game.SCREEN_HEIGHT):
+        npcs.spawn(player[0] + dx, player[1] + dy)
+    paths = FlowField(ts, game.NPC_PATH_RADIUS, world.solid_slice)
+    solids = SolidBitmap(ts, game.COLLISION_RADIUS, world.solid_slice)
+    solids.ensure(tx, tx, ty, ty)
+    return npcs, paths, solids, (tx, ty), player
+
+def run_update_npcs(state):
+    npcs, paths, solids, tile, player = state
+    collide = lambda x, y, dx, dy: solids.move_boxes(x, y, game.NPC_W, game.NPC_H, dx, dy)
+    for i in range(FLUID_TICKS):
+        if i % 6 == 0:
+            paths.stale = True      # the player crosses ~10 tiles a second
+        paths.update(*tile)
+        npcs.update(1.0 / 60.0, lambda cx, cy: paths.goals(cx, cy, player), player, collide)
+        npcs.touching(player[0], player[1], 14, 28)
+
+def setup_draw_npcs(seed):
+    npcs = setup_npcs(seed)[0]
+    for i in npcs.slots()[::10]:
+        npcs.damage(int(i), 1.0, game.NPC_SHOW_BAR_TIME)
+    return pygame.display.get_surface(), npcs
+
+def run_draw_npcs(state):
+    screen, npcs = state
+    game.draw_npcs(screen, npcs, 0, 0)
+
+_frame_cache: dict = {}
+
+def setup_frame(seed):
+    # One warm GameState/WorldView per size: this times a steady-state frame,
+    # not the first one that bakes every visible terrain chunk.
+    key = (game.WORLD_WIDTH, game.WORLD_HEIGHT, seed)
+    if key not in _frame_cache:
+        _seeded(seed)
+        screen = pygame.display.set_mode((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+        state = game.GameState()
+        view = game.WorldView(screen, state)
+        view.draw(screen, state)
+        _frame_cache.clear()
+        _frame_cache[key] = (screen, state, view)
+    return _frame_cache[key]
+
+def run_frame(state):
+    screen, game_state, view = state
+    view.draw(screen, game_state)
+    pygame.display.flip()
+
+BENCHMARKS = {
+    "generate_world": (setup_generate_world, run_generate_world),
+    "generate_column": (setup_generate_column, run_generate_column),
+    "generate_caves": (setup_generate_caves, run_generate_caves),
+    "spawn_fluids": (setup_spawn_fluids, run_spawn_fluids),
+    f"update_fluids_x{FLUID_TICKS}": (setup_update_fluids, run_update_fluids),
+    "reveal_cave_and_halo": (setup_reveal_cave, run_reveal_cave),
+    "build_minimap": (setup_build_minimap, run_build_minimap),
+    "build_tile_variants": (setup_tile_variants, run_tile_variants),
+    "load_tile_atlas": (setup_load_atlas, run_load_atlas),
+    f"update_npcs{NPC_COUNT}_x{FLUID_TICKS}": (setup_npcs, run_update_npcs),
+    f"draw_npcs{NPC_COUNT}": (setup_draw_npcs, run_draw_npcs),
+    "frame_render": (setup_frame, run_frame),
+}
+
+# Only built once per run; world size does not affect it.
+SIZE_INDEPENDENT = {"build_tile_variants", "load_tile_atlas", f"update_npcs{NPC_COUNT}_x{FLUID_TICKS}", f"draw_npcs{NPC_COUNT}"}
+
+
+# ------------------------------ Runner ----------------------------------------
+def parse_sizes(text: str) -> list[tuple[int, int]]:
+    sizes = []
+    for part in text.split(","):
+        w, h = part.lower().split("x")
+        sizes.append((int(w), int(h)))
+    return sizes
+
+def percentile(samples: list[float], q: float) -> float:
+    return float(np.percentile(np.asarray(samples), q))
+
+def measure(name: str, seed: int, repeat: int) -> dict:
+    setup, run = BENCHMARKS[name]
+    times = []
+    run(setup(seed))   # warm-up
+    for _ in range(repeat):
+        state = setup(seed)
+        t0 = time.perf_counter()
+        run(state)
+        times.append((time.perf_counter() - t0) * 1000.0)
+
+    state = setup(seed)
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mean_ms": round(statistics.fmean(times), 4),
+        "p50_ms": round(percentile(times, 50), 4),
+        "p95_ms": round(percentile(times, 95), 4),
+        "min_ms": round(min(times), 4),
+        "peak_kib": round(peak / 1024.0, 1),
+        "repeat": repeat,
+    }
+
+def run_suite(sizes, seed: int, repeat: int, only=None) -> dict:
+    pygame.init()
+    pygame.display.set_mode((game.SCREEN_WIDTH, game.SCREEN_HEIGHT))
+    results = {}
+    try:
+        for name in BENCHMARKS:
+            if only and name not in only:
+                continue
+            for w, h in (sizes[:1] if name in SIZE_INDEPENDENT else sizes):
+                game.configure_world(width=w, height=h)
+                key = f"{name}@{w}x{h}"
+                res = measure(name, seed, repeat)
+                res.update(name=name, width=w, height=h, seed=seed)
+                results[key] = res
+                print(f"{key:<36} mean {res['mean_ms']:9.3f} ms  p50 {res['p50_ms']:9.3f}  "
+                      f"p95 {res['p95_ms']:9.3f}  peak {res['peak_kib']:9.1f} KiB")
+    finally:
+        for d in _atlas_cache:
+            d.cleanup()
+        _atlas_cache.clear()
+    pygame.quit()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float, only=None) -> list[str]:
+    """Lines describing every benchmark whose p50 got slower than threshold allows,
+    or that the baseline has and this run lacks (unless ``only`` left it out)."""
+    regressions = []
+    print(f"\n{'benchmark':<36} {'base p50':>10} {'now p50':>10} {'change':>8}")
+    for key, now in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            print(f"{key:<36} {'-':>10} {now['p50_ms']:10.3f}      new")
+            continue
+        change = now["p50_ms"] / base["p50_ms"] - 1.0 if base["p50_ms"] > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(f"{key}: p50 {base['p50_ms']:.3f} -> {now['p50_ms']:.3f} ms ({change:+.0%})")
+        print(f"{key:<36} {base['p50_ms']:10.3f} {now['p50_ms']:10.3f} {change:+8.0%}{flag}")
+    for key, base in baseline.get("results", {}).items():
+        if key in current["results"] or (only and base.get("name", key.split("@")[0]) not in only):
+            continue
+        print(f"{key:<36} {base['p50_ms']:10.3f} {'-':>10}  MISSING")
+        regressions.append(f"{key}: in the baseline but not run")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Digsim world pipeline benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated WxH world sizes")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark")
+    parser.add_argument("--only", nargs="*", help="benchmark names to run (default: all)")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative p50 slowdown before flagging (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    current = run_suite(parse_sizes(args.sizes), args.seed, args.repeat, args.only)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold, args.only)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+from functools import lru_cache
+
+import numpy as np
+
+# ---------- Cave carving from coordinate-hashed noise ----------
+#
+# Every lattice value comes from hashing (seed, octave, ix, iy), so any
+# rectangle of the cave field can be computed on its own and always agrees
+# with its neighbours: the same seed carves the same caves whether the world
+# is built in one piece or region by region.
+#
+# The field is the smaller of a ridged "tunnel" noise (low along winding
+# lines) and a coarser "cavern" noise (low in blobs).  Tiles whose field is
+# under a threshold are carved, then one 3x3 majority pass (a cellular
+# automaton step) removes single-tile specks.  The threshold is calibrated
+# once per seed on a fixed sample so the carved fraction matches ``density``
+# at any world size.
+
+TUNNEL_CELL = 24.0
+CAVERN_CELL = 40.0
+OCTAVES = 3
+CALIBRATION_SIZE = 384
+
+_M1 = np.uint64(0x9E3779B97F4A7C15)
+_M2 = np.uint64(0xBF58476D1CE4E5B9)
+_M3 = np.uint64(0x94D049BB133111EB)
+
+
+def _hash01(seed: int, salt: int, ix: np.ndarray, iy: np.ndarray) -> np.ndarray:
+    """Uniform [0, 1) value per integer lattice point (splitmix64 finaliser)."""
+    h = (ix.astype(np.int64).astype(np.uint64) * _M1) ^ (iy.astype(np.int64).astype(np.uint64) * _M2)
+    h ^= np.uint64((seed * 1000003 + salt * 7919) & 0xFFFFFFFFFFFFFFFF)
+    h ^= h >> np.uint64(30)
+    h *= _M2
+    h ^= h >> np.uint64(27)
+    h *= _M3
+    h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def value_noise(seed: int, salt: int, x0: int, y0: int, w: int, h: int, cell: float) -> np.ndarray:
+    """Smoothly interpolated lattice noise in [0, 1) over tiles [x0, x0+w) x [y0, y0+h)."""
+    fx = (np.arange(x0, x0 + w, dtype=np.float64) + 0.5) / cell
+    fy = (np.arange(y0, y0 + h, dtype=np.float64) + 0.5) / cell
+    ix, iy = np.floor(fx), np.floor(fy)
+    tx, ty = fx - ix, fy - iy
+    tx = (tx * tx * (3.0 - 2.0 * tx))[:, np.newaxis]
+    ty = (ty * ty * (3.0 - 2.0 * ty))[np.newaxis, :]
+    # Hash only the lattice points the region spans, then gather the corners.
+    lx0, ly0 = int(ix[0]), int(iy[0])
+    lattice = _hash01(seed, salt,
+                      np.arange(lx0, int(ix[-1]) + 2)[:, np.newaxis],
+                      np.arange(ly0, int(iy[-1]) + 2)[np.newaxis, :])
+    a = ix.astype(np.intp) - lx0
+    b = iy.astype(np.intp) - ly0
+    # Interpolate along x on the (small) lattice rows, then along y per tile.
+    cols = lattice[a] + (lattice[a + 1] - lattice[a]) * tx        # (w, lattice rows)
+    top, bottom = cols[:, b], cols[:, b + 1]
+    return top + (bottom - top) * ty
+
+
+def fbm(seed: int, salt: int, x0: int, y0: int, w: int, h: int, cell: float,
+        octaves: int = OCTAVES) -> np.ndarray:
+    """Octaves of value_noise, normalised back to [0, 1)."""
+    total = np.zeros((w, h))
+    amp, norm = 1.0, 0.0
+    for o in range(octaves):
+        total += amp * value_noise(seed, salt * 16 + o, x0, y0, w, h, cell / (1 << o))
+        norm += amp
+        amp *= 0.5
+    return total / norm
+
+
+def cave_field(seed: int, x0: int, y0: int, w: int, h: int) -> np.ndarray:
+    """Lower means more cave-like."""
+    tunnels = np.abs(fbm(seed, 1, x0, y0, w, h, TUNNEL_CELL) - 0.5) * 2.0
+    caverns = fbm(seed, 2, x0, y0, w, h, CAVERN_CELL)
+    return np.minimum(tunnels, caverns)
+
+
+def _smooth(raw: np.ndarray) -> np.ndarray:
+    """3x3 majority vote; ``raw`` carries one tile of halo on every side."""
+    w, h = raw.shape[0] - 2, raw.shape[1] - 2
+    votes = np.zeros((w, h), dtype=np.uint8)
+    for dx in range(3):
+        for dy in range(3):
+            votes += raw[dx:dx + w, dy:dy + h]
+    return votes >= 5
+
+
+@lru_cache(maxsize=16)
+def cave_threshold(seed: int, density: float) -> float:
+    """Field threshold that carves ``density`` of all tiles after smoothing (sampled once per seed)."""
+    if density <= 0.0:
+        return -1.0
+    n = CALIBRATION_SIZE
+    sample = cave_field(seed, -n * 7, -n * 3, n + 2, n + 2)
+    lo, hi = 0.0, 1.0
+    for _ in range(20):
+        mid = (lo + hi) / 2.0
+        if _smooth(sample < mid).mean() < density:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+
+def cave_mask(seed: int, x0: int, y0: int, w: int, h: int, density: float) -> np.ndarray:
+    """Bool (w, h): True where a cave is carved."""
+    if w <= 0 or h <= 0 or density <= 0.0:
+        return np.zeros((max(0, w), max(0, h)), dtype=bool)
+    # One tile of halo so the majority pass sees real neighbours at the edges.
+    raw = cave_field(seed, x0 - 1, y0 - 1, w + 2, h + 2) < cave_threshold(seed, density)
+    return _smooth(raw)
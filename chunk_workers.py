@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# ---------- Chunk generation in worker processes ----------
+#
+# Column generation is CPU-bound Python and NumPy, so it runs in a process
+# pool rather than threads.  Columns are submitted ahead of need (the cold
+# start range, the columns in the direction of travel); the frame loop
+# collects finished ones at the start of a frame and the streamer installs
+# them.  A column asked for before its job is done waits for that job; one
+# nobody submitted is generated inline.  With no workers, or once the pool
+# breaks, everything is generated inline.
+#
+# ``job(cx, *args)`` runs in another process: it must be a module-level
+# function and must not rely on state configured only in this process.
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# job(cx, *args) -> (chunks_y, NUM_LAYERS, C, C) uint8
+ColumnJob = Callable[..., np.ndarray]
+
+
+class ChunkWorkers:
+    def __init__(self, job: ColumnJob, args: Tuple = (), workers: int = 0):
+        self.job = job
+        self.args = tuple(args)
+        self.workers = max(0, int(workers))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[int, Future] = {}
+        self._ready: Dict[int, np.ndarray] = {}
+        self.inline = 0         # columns generated on the calling thread
+        self.offloaded = 0      # columns that came from a worker
+
+    # -- submitting ---------------------------------------------------------
+    def _pool(self) -> Optional[ProcessPoolExecutor]:
+        if self._executor is None and self.workers:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            except (OSError, NotImplementedError, ValueError) as e:
+                self._give_up(e)
+        return self._executor
+
+    def prefetch(self, columns: Iterable[int]) -> None:
+        """Start generating ``columns`` in the background (no-op without workers)."""
+        for cx in columns:
+            if cx in self._pending or cx in self._ready:
+                continue
+            pool = self._pool()
+            if pool is None:
+                return
+            try:
+                self._pending[cx] = pool.submit(self.job, cx, *self.args)
+            except (BrokenProcessPool, RuntimeError) as e:
+                self._give_up(e)
+                return
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # -- collecting ---------------------------------------------------------
+    def collect(self) -> List[int]:
+        """Move finished jobs to the ready set without blocking; returns their columns."""
+        done = [cx for cx, fut in self._pending.items() if fut.done()]
+        finished = []
+        for cx in done:
+            fut = self._pending.pop(cx)
+            try:
+                self._ready[cx] = fut.result()
+            except Exception as e:      # a failed job is regenerated inline on demand
+                if isinstance(e, BrokenProcessPool):
+                    self._give_up(e)
+                continue
+            finished.append(cx)
+        return finished
+
+    def generate(self, cx: int) -> np.ndarray:
+        """Column cx: a finished job, a running one (waited for), or generated inline."""
+        chunks = self._ready.pop(cx, None)
+        if chunks is None and cx in self._pending:
+            try:
+                chunks = self._pending.pop(cx).result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._give_up(e)
+                chunks = None
+        if chunks is not None:
+            self.offloaded += 1
+            return chunks
+        self.inline += 1
+        return self.job(cx, *self.args)
+
+    def trim(self, lo: int, hi: int) -> None:
+        """Forget work for columns outside [lo, hi]; the player turned away from them."""
+        for cx in [cx for cx in self._pending if not lo <= cx <= hi]:
+            self._pending.pop(cx).cancel()
+        for cx in [cx for cx in self._ready if not lo <= cx <= hi]:
+            del self._ready[cx]
+
+    # -- shutdown -----------------------------------------------------------
+    def _give_up(self, error: BaseException) -> None:
+        print(f"[world] Chunk workers unavailable ({error}); generating on the main thread")
+        self.workers = 0
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def close(self) -> None:
+        self._pending.clear()
+        self._ready.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
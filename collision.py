@@ -0,0 +1,195 @@
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# ---------- Swept AABB collision against a packed solid bitmap ----------
+#
+# Solidity of a window of tiles around the player is kept as bits: one
+# Python int per tile row (bit i = column x0 + i) for single boxes, and the
+# same rows as NumPy packbits bytes (little bit order) for vectorized queries
+# over many boxes.  Tiles outside the window count as solid.
+#
+# Boxes are integer pixels, [x, x + w) x [y, y + h), and move one axis at a
+# time.  A move tests every tile column (or row) the leading edge passes,
+# however long it is, and stops flush against the first solid one, so a
+# large dt cannot tunnel through a thin wall.  A sweep never pushes a box
+# that already overlaps rock, it only stops at tiles the box newly enters;
+# depenetrate() moves such a box out.
+
+# solid(x0, x1, y0, y1) -> bool (w, h); outside the world should read solid
+SolidFn = Callable[[int, int, int, int], np.ndarray]
+
+
+class SolidBitmap:
+    def __init__(self, tile_size: int, radius: int, solid: SolidFn):
+        self.tile_size = tile_size
+        self.radius = radius
+        self.solid = solid
+        self.x0 = self.y0 = 0
+        self.width = self.height = 0
+        self.rows: List[int] = []
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+        self.stale = True
+        self.rebuilds = 0
+
+    # -- window -------------------------------------------------------------
+    def contains(self, tx0: int, tx1: int, ty0: int, ty1: int) -> bool:
+        """True if tiles [tx0, tx1] x [ty0, ty1] all lie in the window."""
+        return (not self.stale and self.x0 <= tx0 and tx1 < self.x0 + self.width
+                and self.y0 <= ty0 and ty1 < self.y0 + self.height)
+
+    def ensure(self, tx0: int, tx1: int, ty0: int, ty1: int) -> None:
+        """Rebuild the window around the centre of [tx0, tx1] x [ty0, ty1] unless it is covered."""
+        if self.contains(tx0, tx1, ty0, ty1):
+            return
+        r = max(self.radius, (tx1 - tx0) // 2 + 2, (ty1 - ty0) // 2 + 2)
+        cx, cy = (tx0 + tx1) // 2, (ty0 + ty1) // 2
+        self.x0, self.y0 = cx - r, cy - r
+        self.width = self.height = 2 * r + 1
+        solid = self.solid(self.x0, self.x0 + self.width, self.y0, self.y0 + self.height)
+        self.bits = np.packbits(solid.T, axis=1, bitorder="little")       # (rows, bytes)
+        self.rows = [int.from_bytes(row.tobytes(), "little") for row in self.bits]
+        self.stale = False
+        self.rebuilds += 1
+
+    def set(self, tx: int, ty: int, solid: bool) -> None:
+        """Tile (tx, ty) changed solidity (no-op outside the window)."""
+        i, j = tx - self.x0, ty - self.y0
+        if self.stale or not (0 <= i < self.width and 0 <= j < self.height):
+            return
+        if solid:
+            self.rows[j] |= 1 << i
+            self.bits[j, i >> 3] |= np.uint8(1 << (i & 7))
+        else:
+            self.rows[j] &= ~(1 << i)
+            self.bits[j, i >> 3] &= np.uint8(~(1 << (i & 7)) & 0xFF)
+
+    def _span_mask(self, tx0: int, tx1: int) -> int:
+        return ((1 << (tx1 - tx0 + 1)) - 1) << (tx0 - self.x0)
+
+    # -- one box --------------------------------------------------------------
+    def sweep_x(self, x: int, y: int, w: int, h: int, dx: int) -> Tuple[int, bool]:
+        """Move box (x, y, w, h) by dx; returns (new x, whether it hit a wall)."""
+        if dx == 0:
+            return x, False
+        ts = self.tile_size
+        ty0, ty1 = y // ts, (y + h - 1) // ts
+        if dx > 0:
+            c0, c1 = (x + w - 1) // ts + 1, (x + dx + w - 1) // ts
+        else:
+            c0, c1 = (x + dx) // ts, x // ts - 1
+        if c0 > c1:
+            return x + dx, False
+        self.ensure(c0, c1, ty0, ty1)
+        row_bits = 0
+        for j in range(ty0 - self.y0, ty1 - self.y0 + 1):
+            row_bits |= self.rows[j]
+        hits = row_bits & self._span_mask(c0, c1)
+        if not hits:
+            return x + dx, False
+        if dx > 0:
+            col = self.x0 + (hits & -hits).bit_length() - 1        # nearest = lowest bit
+            return col * ts - w, True
+        col = self.x0 + hits.bit_length() - 1                      # nearest = highest bit
+        return (col + 1) * ts, True
+
+    def sweep_y(self, x: int, y: int, w: int, h: int, dy: int) -> Tuple[int, bool]:
+        """Move box (x, y, w, h) by dy; returns (new y, whether it hit a floor or ceiling)."""
+        if dy == 0:
+            return y, False
+        ts = self.tile_size
+        tx0, tx1 = x // ts, (x + w - 1) // ts
+        if dy > 0:
+            r0, r1 = (y + h - 1) // ts + 1, (y + dy + h - 1) // ts
+            order = range(r0, r1 + 1)
+        else:
+            r0, r1 = (y + dy) // ts, y // ts - 1
+            order = range(r1, r0 - 1, -1)
+        if r0 > r1:
+            return y + dy, False
+        self.ensure(tx0, tx1, r0, r1)
+        span = self._span_mask(tx0, tx1)
+        for row in order:
+            if self.rows[row - self.y0] & span:
+                return (row * ts - h, True) if dy > 0 else ((row + 1) * ts, True)
+        return y + dy, False
+
+    def first_overlap(self, x: int, y: int, w: int, h: int) -> Optional[Tuple[int, int]]:
+        """First solid tile the box overlaps, row by row from the top, left to right."""
+        ts = self.tile_size
+        tx0, tx1, ty0, ty1 = x // ts, (x + w - 1) // ts, y // ts, (y + h - 1) // ts
+        self.ensure(tx0, tx1, ty0, ty1)
+        span = self._span_mask(tx0, tx1)
+        for ty in range(ty0, ty1 + 1):
+            bits = self.rows[ty - self.y0] & span
+            if bits:
+                return self.x0 + (bits & -bits).bit_length() - 1, ty
+        return None
+
+    def depenetrate(self, x: int, y: int, w: int, h: int, max_steps: int = 64) -> Tuple[int, int, bool]:
+        """Push a box out of rock; returns (x, y, freed).
+
+        Each step takes the first overlapping tile and applies the shortest
+        of the four pushes that clear it, until nothing overlaps or
+        ``max_steps`` runs out (freed is then False).
+        """
+        ts = self.tile_size
+        for _ in range(max_steps):
+            tile = self.first_overlap(x, y, w, h)
+            if tile is None:
+                return x, y, True
+            left, top = tile[0] * ts, tile[1] * ts
+            moves = ((left + ts - x, 0), (left - (x + w), 0), (0, top + ts - y), (0, top - (y + h)))
+            dx, dy = min(moves, key=lambda v: abs(v[0]) + abs(v[1]))
+            x, y = x + dx, y + dy
+        return x, y, self.first_overlap(x, y, w, h) is None
+
+    # -- many boxes -----------------------------------------------------------
+    def solid_tiles(self, tx: np.ndarray, ty: np.ndarray) -> np.ndarray:
+        """Bool per (tx, ty) pair; tiles outside the window are solid."""
+        i, j = tx - self.x0, ty - self.y0
+        inside = (i >= 0) & (i < self.width) & (j >= 0) & (j < self.height)
+        i, j = np.where(inside, i, 0), np.where(inside, j, 0)
+        bit = (self.bits[j, i >> 3] >> (i & 7).astype(np.uint8)) & 1
+        return ~inside | (bit != 0)
+
+    def _edge_hits(self, lead: np.ndarray, a0: np.ndarray, a1: np.ndarray, along_x: bool) -> np.ndarray:
+        """Per box: is any tile solid on line ``lead`` between cross-axis tiles a0..a1?"""
+        hit = np.zeros(len(lead), dtype=bool)
+        for k in range(int((a1 - a0).max(initial=0)) + 1):
+            a = np.minimum(a0 + k, a1)
+            hit |= self.solid_tiles(lead, a) if along_x else self.solid_tiles(a, lead)
+        return hit
+
+    def move_boxes(self, x: np.ndarray, y: np.ndarray, w: int, h: int,
+                   dx: np.ndarray, dy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Move many (w, h) boxes with float top-lefts by (dx, dy), X then Y.
+
+        Moves longer than a tile are split into sub-steps, so the leading edge
+        never skips a tile.  Returns the new float positions.
+        """
+        ts = self.tile_size
+        x, y = x.copy(), y.copy()
+        n = max(1, int(np.ceil(max(np.abs(dx).max(initial=0.0), np.abs(dy).max(initial=0.0)) / (ts - 1))))
+        dx, dy = dx / n, dy / n
+        for _ in range(n):
+            # X: the tile column the leading edge enters, over the rows the box spans
+            xi, yi = np.trunc(x).astype(np.int64), np.trunc(y).astype(np.int64)
+            nx = np.trunc(x + dx).astype(np.int64)
+            right = dx > 0
+            old_edge = np.where(right, (xi + w - 1) // ts, xi // ts)
+            new_edge = np.where(right, (nx + w - 1) // ts, nx // ts)
+            entering = new_edge != old_edge
+            hit = entering & self._edge_hits(new_edge, yi // ts, (yi + h - 1) // ts, True)
+            x = np.where(hit, np.where(right, new_edge * ts - w, (new_edge + 1) * ts), x + dx)
+
+            # Y: likewise for the row the top or bottom edge enters
+            xi = np.trunc(x).astype(np.int64)
+            ny = np.trunc(y + dy).astype(np.int64)
+            down = dy > 0
+            old_edge = np.where(down, (yi + h - 1) // ts, yi // ts)
+            new_edge = np.where(down, (ny + h - 1) // ts, ny // ts)
+            entering = new_edge != old_edge
+            hit = entering & self._edge_hits(new_edge, xi // ts, (xi + w - 1) // ts, False)
+            y = np.where(hit, np.where(down, new_edge * ts - h, (new_edge + 1) * ts), y + dy)
+        return x, y
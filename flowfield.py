@@ -0,0 +1,108 @@
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# ---------- Shared flow field towards the player ----------
+#
+# One breadth-first search over empty tiles, outward from the player's tile
+# and limited to a square window ``radius`` tiles around it, gives every
+# reachable tile its step count to the player.  An NPC steers by looking at
+# the tiles around its own: it heads for the neighbour closest to the player,
+# or for the player itself once it shares the player's tile.  One search
+# serves every NPC, so pathing costs O(tiles in the window) per recompute and
+# O(1) per NPC per frame.
+#
+# The field is rebuilt only when the player moves to another tile or a tile
+# inside the window changes (invalidate()).  The search works on flat
+# indices of the window padded with a solid border, one NumPy pass per
+# distance ring, so each tile is handled once.
+
+UNREACHED = -1
+
+# solid(x0, x1, y0, y1) -> bool (w, h), True where a tile blocks movement
+SolidFn = Callable[[int, int, int, int], np.ndarray]
+
+
+class FlowField:
+    def __init__(self, tile_size: int, radius: int, solid: SolidFn):
+        self.tile_size = tile_size
+        self.radius = radius
+        self.solid = solid
+        self.origin: Optional[Tuple[int, int]] = None
+        self.stale = True
+        self.x0 = self.y0 = 0
+        self._h = 0                     # padded window height (flat index stride)
+        self._dist = np.zeros(0, dtype=np.int32)
+        self._offsets = np.zeros(4, dtype=np.intp)
+        self.rebuilds = 0
+
+    def invalidate(self, x: int, y: int) -> None:
+        """Tile (x, y) changed solidity; rebuild if it lies in the window."""
+        if self.origin is None:
+            return
+        ox, oy = self.origin
+        if abs(x - ox) <= self.radius and abs(y - oy) <= self.radius:
+            self.stale = True
+
+    def update(self, tx: int, ty: int) -> bool:
+        """Make the field lead to tile (tx, ty); returns True if it was rebuilt."""
+        if not self.stale and self.origin == (tx, ty):
+            return False
+        r = self.radius
+        self.x0, self.y0 = tx - r - 1, ty - r - 1       # corner of the padded window
+        n = 2 * r + 3
+        passable = np.zeros((n, n), dtype=bool)
+        passable[1:-1, 1:-1] = ~self.solid(tx - r, tx + r + 1, ty - r, ty + r + 1)
+        passable[r + 1, r + 1] = True       # even if the player is wedged in rock
+        free = passable.ravel()
+
+        h = self._h = n
+        offsets = self._offsets = np.array([h, -h, 1, -1], dtype=np.intp)
+        dist = np.full(n * n, UNREACHED, dtype=np.int32)
+        start = (r + 1) * h + (r + 1)
+        dist[start] = 0
+        front = np.array([start], dtype=np.intp)
+        d = 0
+        while front.size:
+            d += 1
+            nb = (front[:, np.newaxis] + offsets).ravel()
+            nb = np.unique(nb[free[nb] & (dist[nb] == UNREACHED)])
+            dist[nb] = d
+            front = nb
+        self._dist = dist
+        self.origin = (tx, ty)
+        self.stale = False
+        self.rebuilds += 1
+        return True
+
+    def goals(self, px: np.ndarray, py: np.ndarray, target: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Pixel point each of the points (px, py) should head for.
+
+        That is the centre of the neighbouring tile nearest the player,
+        ``target`` on the player's own tile, or the point itself (stay) where
+        no path is known.
+        """
+        ts = self.tile_size
+        gx, gy = px.astype(np.float64), py.astype(np.float64)
+        if self.origin is None or not len(px):
+            return gx, gy
+        h = self._h
+        wx = (px // ts).astype(np.intp) - self.x0
+        wy = (py // ts).astype(np.intp) - self.y0
+        inside = (wx >= 1) & (wx < h - 1) & (wy >= 1) & (wy < h - 1)
+        idx = np.where(inside, wx * h + wy, 0)
+        dist = self._dist
+
+        own = np.where(inside, dist[idx], UNREACHED)
+        arrived = own == 0
+        gx[arrived], gy[arrived] = target
+
+        nbd = dist[idx[:, np.newaxis] + self._offsets].astype(np.int64)
+        nbd[nbd == UNREACHED] = np.iinfo(np.int64).max
+        best = np.argmin(nbd, axis=1)
+        best_d = nbd[np.arange(len(idx)), best]
+        step = inside & ~arrived & (best_d != np.iinfo(np.int64).max)
+        nxt = idx[step] + self._offsets[best[step]]
+        gx[step] = (nxt // h + self.x0) * ts + ts / 2.0
+        gy[step] = (nxt % h + self.y0) * ts + ts / 2.0
+        return gx, gy
@@ -0,0 +1,146 @@
+import heapq
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+# ---------- Tile fluids: NumPy layers + active-cell scheduling ----------
+#
+# Each cell holds a fluid id (0 = none) and a level of 0..FLUID_UNITS units.
+# A tick applies the classic down-then-sideways rule to every cell in
+# column-major order (x ascending, y from the bottom up), reading the cell's
+# own fluid from the previous tick and its neighbours from the current one.
+#
+# ``kind`` and ``level`` may be any (width, height) array-like with scalar
+# indexing, such as a WorldStore layer view; by default they are new arrays.
+#
+# Only cells that can still move are visited.  Whenever a cell is written,
+# the cells whose decision depends on it (itself, the one above and the two
+# beside it) are woken for the next tick, and for the current tick too if
+# they come later in scan order.  Settled pools therefore drop out of the
+# active set and cost nothing until something around them changes.
+
+FLUID_UNITS = 4
+
+Cell = Tuple[int, int]
+
+
+class FluidSim:
+    def __init__(self, width: int, height: int, fluid_names: Iterable[str], kind=None, level=None):
+        self.width = int(width)
+        self.height = int(height)
+        self.names: Tuple[Optional[str], ...] = (None,) + tuple(fluid_names)
+        self.ids = {name: i for i, name in enumerate(self.names) if name}
+        self.kind = np.zeros((self.width, self.height), dtype=np.uint8) if kind is None else kind
+        self.level = np.zeros((self.width, self.height), dtype=np.uint8) if level is None else level
+        self._active: Set[Cell] = set()
+        # Cells written during the last step (for renderers that cache tiles),
+        # and the (kind, level) each of them had before it
+        self.changed: Set[Cell] = set()
+        self.previous: Dict[Cell, Tuple[int, int]] = {}
+
+    # -- queries ----------------------------------------------------------
+    def kind_at(self, x: int, y: int) -> Optional[str]:
+        return self.names[self.kind[x, y]]
+
+    def level_at(self, x: int, y: int) -> int:
+        return int(self.level[x, y])
+
+    def active_count(self) -> int:
+        return len(self._active)
+
+    # -- edits ------------------------------------------------------------
+    def place(self, x: int, y: int, name: str, level: int = FLUID_UNITS) -> None:
+        self.kind[x, y] = self.ids[name]
+        self.level[x, y] = max(0, min(FLUID_UNITS, int(level)))
+        self.wake(x, y)
+
+    def wake(self, x: int, y: int) -> None:
+        """Reactivate (x, y) and the cells that flow into it (above, left, right)."""
+        for cx, cy in ((x, y), (x, y - 1), (x - 1, y), (x + 1, y)):
+            if 0 <= cx < self.width and 0 <= cy < self.height:
+                self._active.add((cx, cy))
+
+    def wake_all(self) -> None:
+        self.wake_region(0, self.width, 0, self.height)
+
+    def wake_region(self, x0: int, x1: int, y0: int, y1: int) -> None:
+        """Reactivate every cell holding fluid in [x0, x1) x [y0, y1)."""
+        x0, x1 = max(0, x0), min(self.width, x1)
+        y0, y1 = max(0, y0), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        xs, ys = np.nonzero(self.level[x0:x1, y0:y1])
+        self._active.update(zip((xs + x0).tolist(), (ys + y0).tolist()))
+
+    def sleep_region(self, x0: int, x1: int, y0: int, y1: int) -> None:
+        """Stop simulating [x0, x1) x [y0, y1) until it is woken again."""
+        self._active = {(x, y) for x, y in self._active if not (x0 <= x < x1 and y0 <= y < y1)}
+
+    # -- simulation -------------------------------------------------------
+    def step(self, is_solid: Callable[[int, int], bool]) -> None:
+        """Advance one tick; ``is_solid(x, y)`` says whether a tile blocks fluid."""
+        self.changed = set()
+        self.previous = before = {}     # previous-tick values of written cells
+        if not self._active:
+            return
+
+        W, H = self.width, self.height
+        kind, level = self.kind, self.level
+        done: Set[Cell] = set()
+        next_active: Set[Cell] = set()
+        heap = [(x, -y) for x, y in self._active]
+        heapq.heapify(heap)
+
+        def write(cx: int, cy: int, k: int, lvl: int, order: Tuple[int, int]) -> None:
+            c = (cx, cy)
+            if c not in before:
+                before[c] = (int(kind[cx, cy]), int(level[cx, cy]))
+            kind[cx, cy] = k
+            level[cx, cy] = lvl
+            self.changed.add(c)
+            for wx, wy in ((cx, cy), (cx, cy - 1), (cx - 1, cy), (cx + 1, cy)):
+                if not (0 <= wx < W and 0 <= wy < H):
+                    continue
+                w = (wx, wy)
+                next_active.add(w)
+                if w not in done and (wx, -wy) > order:
+                    heapq.heappush(heap, (wx, -wy))
+
+        while heap:
+            x, ny = heapq.heappop(heap)
+            y = -ny
+            c = (x, y)
+            if c in done:
+                continue
+            done.add(c)
+            order = (x, ny)
+
+            t, lvl = before.get(c) or (int(kind[x, y]), int(level[x, y]))
+            if not t or lvl <= 0:
+                continue
+
+            # Flow down
+            if y + 1 < H and not is_solid(x, y + 1):
+                below = int(level[x, y + 1])
+                space = FLUID_UNITS - below
+                if space > 0:
+                    move = min(lvl, space)
+                    rest = int(level[x, y]) - move
+                    write(x, y + 1, t, below + move, order)
+                    write(x, y, kind[x, y] if rest > 0 else 0, rest, order)
+                    continue
+
+            # Spread sideways
+            for dx in (-1, 1):
+                nx = x + dx
+                if 0 <= nx < W and not is_solid(nx, y):
+                    side = int(level[nx, y])
+                    space = (lvl - 1) - side
+                    if space > 0:
+                        move = min(space, lvl)
+                        rest = int(level[x, y]) - move
+                        write(nx, y, t, side + move, order)
+                        write(x, y, kind[x, y] if rest > 0 else 0, rest, order)
+                        lvl = rest
+
+        self._active = next_active
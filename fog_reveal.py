@@ -0,0 +1,135 @@
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pygame
+
+# ---------- Fog of war: revealed mask + viewport renderer ----------
+#
+# ``revealed`` is a (width, height) bool array, or any array-like view with
+# the same indexing (e.g. a WorldStore layer).  The viewport's fog is one
+# tile-resolution alpha mask scaled up by the tile size and blitted once.  The
+# scaled mask is reused while the camera stays on the same tile origin; tiles
+# revealed in the meantime are punched out of it in place.
+
+Tile = Tuple[int, int]
+
+NEIGHBORS4 = ((1, 0), (-1, 0), (0, 1), (0, -1))
+MAX_PENDING_HOLES = 4096
+
+
+class FogOfWar:
+    def __init__(self, width: int, height: int, tile_size: int,
+                 fog_rgba: Tuple[int, int, int, int], revealed=None):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.fog_rgba = fog_rgba
+        self.revealed = np.zeros((width, height), dtype=bool) if revealed is None else revealed
+        self.version = 0
+        self._small = None
+        self._scaled = None
+        self._view: Optional[tuple] = None   # (tx0, ty0, cols, rows) of the scaled mask
+        self._holes: List[Tile] = []         # reveals not yet punched into it
+
+    # -- state ------------------------------------------------------------
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def is_revealed(self, x: int, y: int) -> bool:
+        return bool(self.revealed[x, y])
+
+    def reveal(self, x: int, y: int, out: Optional[List[Tile]] = None) -> bool:
+        """Reveal one tile; returns True (and appends to ``out``) if it was hidden."""
+        if not (0 <= x < self.width and 0 <= y < self.height) or self.revealed[x, y]:
+            return False
+        self.revealed[x, y] = True
+        self.version += 1
+        if len(self._holes) < MAX_PENDING_HOLES:
+            self._holes.append((x, y))
+        else:
+            self._view = None   # nobody is drawing; rebuild from scratch later
+        if out is not None:
+            out.append((x, y))
+        return True
+
+    def reveal_neighbors4(self, x: int, y: int, out: Optional[List[Tile]] = None) -> None:
+        for dx, dy in NEIGHBORS4:
+            self.reveal(x + dx, y + dy, out)
+
+    def reveal_cave(self, world, sx: int, sy: int) -> List[Tile]:
+        """Flood-reveal connected empty tiles starting from (sx, sy); returns newly revealed tiles."""
+        newly: List[Tile] = []
+        if not self.in_bounds(sx, sy) or world.is_solid(sx, sy):
+            return newly
+        q = deque([(sx, sy)])
+        while q:
+            x, y = q.popleft()
+            if not self.reveal(x, y, newly):
+                continue
+            for dx, dy in NEIGHBORS4:
+                nx, ny = x + dx, y + dy
+                if self.in_bounds(nx, ny) and not world.is_solid(nx, ny):
+                    q.append((nx, ny))
+        return newly
+
+    def reveal_cave_and_halo(self, world, sx: int, sy: int) -> List[Tile]:
+        """
+        Flood-fill through connected empty tiles starting at (sx, sy)
+        and reveal a 4-neighbour halo so cave walls also become visible.
+        Returns the tiles that were newly revealed.
+
+        Every revealed empty tile already has its halo revealed, so the flood
+        only spreads through empty tiles it uncovers itself; an open sky or a
+        cave seen before is never walked again.
+        """
+        newly: List[Tile] = []
+        if not self.in_bounds(sx, sy):
+            return newly
+
+        self.reveal(sx, sy, newly)
+        if world.is_solid(sx, sy):
+            self.reveal_neighbors4(sx, sy, newly)
+            return newly
+
+        q = deque([(sx, sy)])
+        while q:
+            x, y = q.popleft()
+            for dx, dy in NEIGHBORS4:
+                nx, ny = x + dx, y + dy
+                if self.reveal(nx, ny, newly) and not world.is_solid(nx, ny):
+                    q.append((nx, ny))
+        return newly
+
+    # -- drawing ----------------------------------------------------------
+    def _rebuild(self, tx0: int, ty0: int, cols: int, rows: int) -> None:
+        ts = self.tile_size
+        hidden = np.zeros((cols, rows), dtype=bool)
+        x1, y1 = min(self.width, tx0 + cols), min(self.height, ty0 + rows)
+        if tx0 < x1 and ty0 < y1:
+            hidden[:x1 - tx0, :y1 - ty0] = ~self.revealed[tx0:x1, ty0:y1]
+        if self._small is None or self._small.get_size() != (cols, rows):
+            self._small = pygame.Surface((cols, rows), pygame.SRCALPHA)
+            self._small.fill((*self.fog_rgba[:3], 0))
+        pygame.surfarray.pixels_alpha(self._small)[:] = np.where(hidden, self.fog_rgba[3], 0)
+        size = (cols * ts, rows * ts)
+        if self._scaled is None or self._scaled.get_size() != size:
+            self._scaled = pygame.Surface(size, pygame.SRCALPHA)
+        pygame.transform.scale(self._small, size, self._scaled)
+        self._view = (tx0, ty0, cols, rows)
+        self._holes.clear()
+
+    def draw(self, screen: pygame.Surface, camera_x: int, camera_y: int) -> None:
+        ts = self.tile_size
+        sw, sh = screen.get_size()
+        tx0, ty0 = camera_x // ts, camera_y // ts
+        cols, rows = sw // ts + 2, sh // ts + 2
+        if self._view != (tx0, ty0, cols, rows):
+            self._rebuild(tx0, ty0, cols, rows)
+        elif self._holes:
+            clear = (*self.fog_rgba[:3], 0)
+            for x, y in self._holes:
+                if tx0 <= x < tx0 + cols and ty0 <= y < ty0 + rows:
+                    self._scaled.fill(clear, ((x - tx0) * ts, (y - ty0) * ts, ts, ts))
+            self._holes.clear()
+        screen.blit(self._scaled, (tx0 * ts - camera_x, ty0 * ts - camera_y))
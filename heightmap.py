@@ -0,0 +1,47 @@
+from typing import Callable, Dict
+
+import numpy as np
+
+# ---------- Per-column surface heights ----------
+#
+# The row of the topmost solid tile in each tile column, found once per
+# column (a vectorized scan, one block of rows at a time from the top, so a
+# tall world costs no more than the depth of its surface) and then answered
+# from a dict.  Mining the top tile forgets the column so the next lookup
+# finds the new surface; mining anything below it cannot change the answer.
+# Only columns that were asked about are stored, so the map grows with the
+# area the player visits.
+
+SCAN_ROWS = 32
+
+# solid(x0, x1, y0, y1) -> bool (w, h)
+SolidFn = Callable[[int, int, int, int], np.ndarray]
+
+
+class SurfaceHeights:
+    def __init__(self, width: int, height: int, solid: SolidFn):
+        self.width = width
+        self.height = height
+        self.solid = solid
+        self._top: Dict[int, int] = {}
+
+    def top(self, x: int) -> int:
+        """Row of the topmost solid tile in column x, or ``height`` if it has none."""
+        y = self._top.get(x)
+        if y is None:
+            y = self.height
+            for y0 in range(0, self.height, SCAN_ROWS):
+                col = self.solid(x, x + 1, y0, min(self.height, y0 + SCAN_ROWS))[0]
+                if col.any():
+                    y = y0 + int(col.argmax())
+                    break
+            self._top[x] = y
+        return y
+
+    def mined(self, x: int, y: int) -> None:
+        """Tile (x, y) was removed."""
+        if self._top.get(x) == y:
+            del self._top[x]
+
+    def clear(self) -> None:
+        self._top.clear()
@@ -0,0 +1,212 @@
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pygame
+
+# ---------- Tile light grid + darkness overlay ----------
+#
+# Every tile has a light level 0..LIGHT_MAX.  The level is the larger of the
+# ambient skylight for its row and the light flooded in from emitters (the
+# player / lantern, lava, torches).  Light loses one level per tile and stops
+# at solid tiles: the wall face is lit, nothing behind it.
+#
+# Levels are computed per BLOCK x BLOCK block, lazily, and only blocks that
+# have been read are kept.  A change at a tile drops every block within
+# LIGHT_MAX tiles; missing blocks are recomputed (vectorised, as one padded
+# region) the next time something reads them.
+
+LIGHT_MAX = 8
+BLOCK = 16
+
+# solid_slice(x0, x1, y0, y1) -> bool (w, h); emit_slice(...) -> uint8 (w, h)
+RegionQuery = Callable[[int, int, int, int], np.ndarray]
+
+
+def flood_light(seed: np.ndarray, solid: np.ndarray) -> np.ndarray:
+    """Spread ``seed`` levels through non-solid cells, losing 1 per step."""
+    level = seed.astype(np.int16)
+    emits = seed > 0
+    for _ in range(int(level.max(initial=0))):
+        src = np.where(~solid | emits, level, 0)
+        nb = np.zeros_like(level)
+        np.maximum(nb[1:], src[:-1], out=nb[1:])
+        np.maximum(nb[:-1], src[1:], out=nb[:-1])
+        np.maximum(nb[:, 1:], src[:, :-1], out=nb[:, 1:])
+        np.maximum(nb[:, :-1], src[:, 1:], out=nb[:, :-1])
+        grown = np.maximum(level, nb - 1)
+        if np.array_equal(grown, level):
+            break
+        level = grown
+    return level
+
+
+class LightGrid:
+    def __init__(self, width: int, height: int, ambient_rows: np.ndarray,
+                 solid_slice: RegionQuery, emit_slice: RegionQuery):
+        self.width = width
+        self.height = height
+        self.ambient_rows = np.clip(ambient_rows, 0, LIGHT_MAX).astype(np.uint8)
+        self.solid_slice = solid_slice
+        self.emit_slice = emit_slice
+        self.blocks: Dict[Tuple[int, int], np.ndarray] = {}   # (bx, by) -> up-to-date levels
+        self.sources: Dict[str, Tuple[int, int, int]] = {}
+        self.version = 0
+
+    # -- changes ----------------------------------------------------------
+    def invalidate(self, x: int, y: int) -> None:
+        """Tile (x, y) changed (mined, lava flowed, source moved)."""
+        self.invalidate_region(x - LIGHT_MAX, x + LIGHT_MAX + 1, y - LIGHT_MAX, y + LIGHT_MAX + 1)
+
+    def invalidate_many(self, tiles) -> None:
+        """invalidate() for every tile, dropping each affected block once."""
+        if not self.blocks:
+            return
+        drop = set()
+        for x, y in tiles:
+            for bx in range(max(0, (x - LIGHT_MAX) // BLOCK), (x + LIGHT_MAX) // BLOCK + 1):
+                for by in range(max(0, (y - LIGHT_MAX) // BLOCK), (y + LIGHT_MAX) // BLOCK + 1):
+                    drop.add((bx, by))
+        for key in drop:
+            self.blocks.pop(key, None)
+
+    def invalidate_region(self, x0: int, x1: int, y0: int, y1: int) -> None:
+        """Drop the cached blocks overlapping [x0, x1) x [y0, y1)."""
+        if not self.blocks or x0 >= x1 or y0 >= y1:
+            return
+        bx0, bx1 = max(0, x0 // BLOCK), (x1 - 1) // BLOCK + 1
+        by0, by1 = max(0, y0 // BLOCK), (y1 - 1) // BLOCK + 1
+        if (bx1 - bx0) * (by1 - by0) > len(self.blocks):
+            for key in [k for k in self.blocks if bx0 <= k[0] < bx1 and by0 <= k[1] < by1]:
+                del self.blocks[key]
+            return
+        for bx in range(bx0, bx1):
+            for by in range(by0, by1):
+                self.blocks.pop((bx, by), None)
+
+    def set_source(self, key: str, x: int, y: int, level: int) -> None:
+        """Add or move a point light (player, lantern, torch)."""
+        new = (int(x), int(y), max(0, min(LIGHT_MAX, int(level))))
+        old = self.sources.get(key)
+        if old == new:
+            return
+        if old is not None:
+            self.invalidate(old[0], old[1])
+        self.sources[key] = new
+        self.invalidate(new[0], new[1])
+
+    # -- queries ----------------------------------------------------------
+    def level_slice(self, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        """Light levels over [x0, x1) x [y0, y1), clipped to the world."""
+        x0, x1 = max(0, x0), min(self.width, x1)
+        y0, y1 = max(0, y0), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return np.zeros((max(0, x1 - x0), max(0, y1 - y0)), dtype=np.uint8)
+        self._refresh(x0, x1, y0, y1)
+        out = np.empty((x1 - x0, y1 - y0), dtype=np.uint8)
+        for bx in range(x0 // BLOCK, (x1 - 1) // BLOCK + 1):
+            sx0, sx1 = max(x0, bx * BLOCK), min(x1, (bx + 1) * BLOCK)
+            for by in range(y0 // BLOCK, (y1 - 1) // BLOCK + 1):
+                sy0, sy1 = max(y0, by * BLOCK), min(y1, (by + 1) * BLOCK)
+                out[sx0 - x0:sx1 - x0, sy0 - y0:sy1 - y0] = \
+                    self.blocks[(bx, by)][sx0 - bx * BLOCK:sx1 - bx * BLOCK, sy0 - by * BLOCK:sy1 - by * BLOCK]
+        return out
+
+    def level_at(self, x: int, y: int) -> int:
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return 0
+        block = self.blocks.get((x // BLOCK, y // BLOCK))
+        if block is None:
+            self._refresh(x, x + 1, y, y + 1)
+            block = self.blocks[(x // BLOCK, y // BLOCK)]
+        return int(block[x % BLOCK, y % BLOCK])
+
+    def ambient_level(self, y: int) -> int:
+        return int(self.ambient_rows[max(0, min(self.height - 1, y))])
+
+    # -- propagation ------------------------------------------------------
+    def _refresh(self, x0: int, x1: int, y0: int, y1: int) -> None:
+        missing = [(bx, by)
+                   for bx in range(x0 // BLOCK, (x1 - 1) // BLOCK + 1)
+                   for by in range(y0 // BLOCK, (y1 - 1) // BLOCK + 1)
+                   if (bx, by) not in self.blocks]
+        if not missing:
+            return
+        bxs = [b[0] for b in missing]
+        bys = [b[1] for b in missing]
+        rx0, rx1 = min(bxs) * BLOCK, min(self.width, (max(bxs) + 1) * BLOCK)
+        ry0, ry1 = min(bys) * BLOCK, min(self.height, (max(bys) + 1) * BLOCK)
+        lit = self._compute(rx0, rx1, ry0, ry1)
+        for bx in range(rx0 // BLOCK, (rx1 - 1) // BLOCK + 1):
+            for by in range(ry0 // BLOCK, (ry1 - 1) // BLOCK + 1):
+                block = np.zeros((BLOCK, BLOCK), dtype=np.uint8)
+                part = lit[bx * BLOCK - rx0:(bx + 1) * BLOCK - rx0, by * BLOCK - ry0:(by + 1) * BLOCK - ry0]
+                block[:part.shape[0], :part.shape[1]] = part
+                self.blocks[(bx, by)] = block
+        self.version += 1
+
+    def _compute(self, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        """Levels over [x0, x1) x [y0, y1)."""
+        # Pad by LIGHT_MAX so emitters outside the region still reach into it.
+        px0, px1 = max(0, x0 - LIGHT_MAX), min(self.width, x1 + LIGHT_MAX)
+        py0, py1 = max(0, y0 - LIGHT_MAX), min(self.height, y1 + LIGHT_MAX)
+        solid = self.solid_slice(px0, px1, py0, py1)
+        seed = self.emit_slice(px0, px1, py0, py1).astype(np.uint8)
+        for sx, sy, lvl in self.sources.values():
+            if px0 <= sx < px1 and py0 <= sy < py1:
+                seed[sx - px0, sy - py0] = max(seed[sx - px0, sy - py0], lvl)
+        lit = flood_light(seed, solid)
+        ambient = self.ambient_rows[py0:py1][np.newaxis, :]
+        lit = np.maximum(lit, ambient)
+        return lit[x0 - px0:x1 - px0, y0 - py0:y1 - py0]
+
+
+def darkness_lut(max_alpha: int) -> np.ndarray:
+    """Overlay alpha for each light level: max_alpha when unlit, 0 at LIGHT_MAX."""
+    levels = np.arange(LIGHT_MAX + 1, dtype=np.float32)
+    return np.round(max_alpha * (1.0 - levels / LIGHT_MAX)).astype(np.uint8)
+
+
+class DarknessOverlay:
+    """Draws the light grid as one smoothly scaled alpha mask.
+
+    The tile-resolution mask is written through surfarray, scaled into a
+    persistent buffer and blitted once.  It is only rebuilt when the grid or
+    the top-left visible tile changes.
+    """
+
+    def __init__(self, tile_size: int, max_alpha: int):
+        self.tile_size = tile_size
+        self.lut = darkness_lut(max_alpha)
+        self._small = None
+        self._scaled = None
+        self._key: Optional[tuple] = None
+
+    def alpha_for(self, level: int) -> int:
+        return int(self.lut[level])
+
+    def draw(self, screen: pygame.Surface, grid: LightGrid, camera_x: int, camera_y: int) -> None:
+        ts = self.tile_size
+        sw, sh = screen.get_size()
+        tx0, ty0 = camera_x // ts, camera_y // ts
+        cols, rows = sw // ts + 2, sh // ts + 2
+        levels = grid.level_slice(tx0, tx0 + cols, ty0, ty0 + rows)
+        key = (tx0, ty0, levels.shape, grid.version)
+        if key != self._key:
+            if not levels.size:
+                return
+            alpha = self.lut[levels]
+            if not alpha.any():
+                self._key = key
+                self._scaled = None
+                return
+            if self._small is None or self._small.get_size() != alpha.shape:
+                self._small = pygame.Surface(alpha.shape, pygame.SRCALPHA)
+                self._small.fill((0, 0, 0, 0))
+            pygame.surfarray.pixels_alpha(self._small)[:] = alpha
+            size = (alpha.shape[0] * ts, alpha.shape[1] * ts)
+            if self._scaled is None or self._scaled.get_size() != size:
+                self._scaled = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.transform.smoothscale(self._small, size, self._scaled)
+            self._key = key
+        if self._scaled is not None:
+            screen.blit(self._scaled, (tx0 * ts - camera_x, ty0 * ts - camera_y))
@@ -0,0 +1,130 @@
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pygame
+
+# ---------- Minimap: one pixel per world tile ----------
+#
+# The surface is built once with surfarray and then patched pixel by pixel as
+# tiles are mined or revealed, so upkeep scales with the number of changed
+# tiles instead of the world area.  In worlds wider than ``span`` it shows a
+# window of columns that is re-centred (and rebuilt) as the player moves.  ``version`` increases on every change so
+# presenters can tell when their scaled copies are stale.
+
+MINI_SKY      = (255, 255, 255)
+MINI_HIDDEN   = (0, 0, 0)
+MINI_OPEN     = (120, 120, 120)
+MINI_SOLID    = (255, 255, 255)
+
+
+class Minimap:
+    def __init__(self, width: int, height: int, surface_level: int, span: Optional[int] = None):
+        self.world_width = width
+        self.width = width if span is None else min(width, span)
+        self.height = height
+        self.surface_level = surface_level
+        self.x0 = 0                 # first world column shown
+        self.surface = pygame.Surface((self.width, height))
+        self.version = 0
+
+    def window_for(self, x: int) -> int:
+        """First column of a window centred on world column x."""
+        return max(0, min(self.world_width - self.width, x - self.width // 2))
+
+    def follow(self, world, revealed, x: int) -> bool:
+        """Re-centre on world column x (and rebuild) once it is a quarter window off-centre."""
+        x0 = self.window_for(x)
+        if abs(x0 - self.x0) <= self.width // 4:
+            return False
+        self.x0 = x0
+        self.rebuild(world, revealed)
+        return True
+
+    def color_at(self, world, revealed, x: int, y: int) -> Tuple[int, int, int]:
+        if y < self.surface_level:
+            return MINI_SKY
+        if not revealed[x, y]:
+            return MINI_HIDDEN
+        return MINI_SOLID if world.is_solid(x, y) else MINI_OPEN
+
+    def rebuild(self, world, revealed) -> None:
+        """Redraw every pixel of the window from the world and revealed grids."""
+        x0, x1 = self.x0, self.x0 + self.width
+        solid = world.solid_slice(x0, x1, 0, self.height)
+        seen = np.asarray(revealed[x0:x1, 0:self.height], dtype=bool)
+        rgb = np.empty((self.width, self.height, 3), dtype=np.uint8)
+        rgb[:] = MINI_HIDDEN
+        rgb[seen & ~solid] = MINI_OPEN
+        rgb[seen & solid] = MINI_SOLID
+        rgb[:, :self.surface_level] = MINI_SKY
+        pygame.surfarray.blit_array(self.surface, rgb)
+        self.version += 1
+
+    def update_tiles(self, world, revealed, tiles: Iterable[Tuple[int, int]]) -> None:
+        """Repaint only the given tiles (mined or newly revealed)."""
+        changed = False
+        x0 = self.x0
+        for x, y in tiles:
+            if x0 <= x < x0 + self.width and 0 <= y < self.height:
+                self.surface.set_at((x - x0, y), self.color_at(world, revealed, x, y))
+                changed = True
+        if changed:
+            self.version += 1
+
+
+class MinimapPresenter:
+    """Scaled minimap widget and full-screen map, re-rendered only when stale.
+
+    The scaled images, backdrop and title are kept until the minimap's
+    ``version`` or the screen size changes.
+    """
+
+    def __init__(self, minimap: Minimap, size: Tuple[int, int], pad: int,
+                 backdrop_rgba: Tuple[int, int, int, int]):
+        self.minimap = minimap
+        self.size = size
+        self.pad = pad
+        self.backdrop_rgba = backdrop_rgba
+        self._small = None          # (version, Surface)
+        self._backdrop = None
+        self._big = None            # (version, Surface, pos)
+        self._shade = None          # full-screen dim overlay
+        self._title = None
+        self._title_font = None
+
+    def small_rect(self, screen_size: Tuple[int, int]) -> pygame.Rect:
+        """Where the small minimap sits (top-right corner); draws nothing."""
+        w, h = self.size
+        return pygame.Rect(screen_size[0] - w - self.pad, self.pad, w, h)
+
+    def draw_small(self, screen: pygame.Surface) -> pygame.Rect:
+        rect = self.small_rect(screen.get_size())
+        version = self.minimap.version
+        if self._small is None or self._small[0] != version:
+            self._small = (version, pygame.transform.smoothscale(self.minimap.surface, self.size))
+        if self._backdrop is None:
+            self._backdrop = pygame.Surface((rect.w + 8, rect.h + 8), pygame.SRCALPHA)
+            self._backdrop.fill(self.backdrop_rgba)
+        screen.blit(self._backdrop, (rect.x - 4, rect.y - 4))
+        screen.blit(self._small[1], rect.topleft)
+        return rect
+
+    def draw_big(self, screen: pygame.Surface) -> None:
+        sw, sh = screen.get_size()
+        if self._shade is None or self._shade.get_size() != (sw, sh):
+            self._shade = pygame.Surface((sw, sh), pygame.SRCALPHA)
+            self._shade.fill((0, 0, 0, 180))
+            self._big = None
+        version = self.minimap.version
+        if self._big is None or self._big[0] != version:
+            mw, mh = self.minimap.width, self.minimap.height
+            scale = min((sw - 80) / mw, (sh - 120) / mh)
+            tw, th = int(mw * scale), int(mh * scale)
+            target = pygame.transform.smoothscale(self.minimap.surface, (tw, th))
+            self._big = (version, target, ((sw - tw) // 2, (sh - th) // 2))
+        if self._title is None:
+            self._title_font = pygame.font.SysFont(None, 24)
+            self._title = self._title_font.render("Minimap (M to close)", True, (240, 240, 240))
+        screen.blit(self._shade, (0, 0))
+        screen.blit(self._big[1], self._big[2])
+        screen.blit(self._title, (sw // 2 - self._title.get_width() // 2, 24))
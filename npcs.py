@@ -0,0 +1,182 @@
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from spatial_hash import SpatialHash
+
+# ---------- Hostile NPCs as parallel arrays ----------
+#
+# Every NPC is one slot in a set of NumPy arrays (position, hp, cooldowns),
+# and a frame moves all of them in a few vector operations.  Slots never
+# move: a dead NPC's slot is recycled by the next spawn, so a slot number is a
+# stable handle for the spatial hash and for callers.
+#
+# NPCs further than ``lod_radius`` pixels from the camera centre are moved
+# less often, every ``far_interval`` seconds by the time they missed; timers
+# still tick every frame.  Each far NPC starts at a different point of that
+# interval so they do not all catch up on the same frame.
+#
+# Boxes are integer pixels like pygame.Rect: (int(x), int(y), width, height).
+# The spatial hash only tracks which cells each slot covers.  ``prev_x`` and
+# ``prev_y`` hold the positions before the last step (see remember()) so a
+# renderer can draw between steps.
+
+GROW = 64    # initial capacity; doubled when full
+
+# goal(cx, cy) -> (gx, gy): the pixel point each NPC centre should head for
+GoalFn = Callable[[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]
+# collide(x, y, dx, dy) -> (x, y): top-lefts after moving by (dx, dy) against terrain
+CollideFn = Callable[[np.ndarray, np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+class NPCPool:
+    def __init__(self, width: int, height: int, max_hp: float, speed: float, hash_cell: int,
+                 lod_radius: float, far_interval: float):
+        self.width = int(width)
+        self.height = int(height)
+        self.max_hp = float(max_hp)
+        self.speed = float(speed)
+        self.lod_radius = float(lod_radius)
+        self.far_interval = float(far_interval)
+        self.hash = SpatialHash(hash_cell)
+        self._free: List[int] = []
+        self._alloc(GROW)
+
+    def _alloc(self, n: int) -> None:
+        self.x = np.zeros(n)
+        self.y = np.zeros(n)
+        self.prev_x = np.zeros(n)
+        self.prev_y = np.zeros(n)
+        self.hp = np.zeros(n)
+        self.attack_cd = np.zeros(n)
+        self.show_bar = np.zeros(n)
+        self.lag = np.zeros(n)      # seconds of movement a far NPC still owes
+        self.alive = np.zeros(n, dtype=bool)
+        self._free = list(range(n - 1, -1, -1))
+
+    def _grow(self) -> None:
+        old = len(self.alive)
+        fields = ("x", "y", "prev_x", "prev_y", "hp", "attack_cd", "show_bar", "lag", "alive")
+        saved = {f: getattr(self, f) for f in fields}
+        self._alloc(old * 2)
+        for f, arr in saved.items():
+            getattr(self, f)[:old] = arr
+        self._free = list(range(old * 2 - 1, old - 1, -1))
+
+    def __len__(self) -> int:
+        return len(self.alive) - len(self._free)
+
+    def slots(self) -> np.ndarray:
+        return np.flatnonzero(self.alive)
+
+    # -- lifecycle ----------------------------------------------------------
+    def spawn(self, x: float, y: float) -> int:
+        if not self._free:
+            self._grow()
+        i = self._free.pop()
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.hp[i] = self.max_hp
+        self.attack_cd[i] = self.show_bar[i] = 0.0
+        self.lag[i] = (i * 0.618034 % 1.0) * self.far_interval
+        self.alive[i] = True
+        self.hash.update(i, *self.box(i))
+        return i
+
+    def kill(self, i: int) -> None:
+        if self.alive[i]:
+            self.alive[i] = False
+            self.hash.remove(i)
+            self._free.append(i)
+
+    def clear(self) -> None:
+        self.hash.clear()
+        self._alloc(len(self.alive))
+
+    def box(self, i: int) -> Tuple[int, int, int, int]:
+        return int(self.x[i]), int(self.y[i]), self.width, self.height
+
+    def damage(self, i: int, amount: float, show_bar: float) -> bool:
+        """Hurt NPC i; kills it and returns False once its hp reaches zero."""
+        self.hp[i] = max(0.0, self.hp[i] - amount)
+        self.show_bar[i] = show_bar
+        if self.hp[i] <= 0.0:
+            self.kill(i)
+            return False
+        return True
+
+    # -- simulation -----------------------------------------------------------
+    def remember(self) -> None:
+        """Keep the current positions as the previous ones; call before a step."""
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+
+    def update(self, dt: float, goal: GoalFn, camera: Tuple[float, float],
+               collide: Optional[CollideFn] = None) -> None:
+        """Move every NPC towards the point ``goal`` gives it; far ones from ``camera`` less often.
+
+        Without ``collide`` NPCs move freely.
+        """
+        live = self.alive
+        if not live.any():
+            return
+        x, y = self.x, self.y
+        xi, yi = np.trunc(x), np.trunc(y)
+        cx = xi + self.width // 2
+        cy = yi + self.height // 2
+
+        far = live & ((cx - camera[0]) ** 2 + (cy - camera[1]) ** 2 > self.lod_radius ** 2)
+        self.lag[far] += dt
+        due = far & (self.lag >= self.far_interval)
+        step = np.where(live & ~far, dt, np.where(due, self.lag, 0.0))
+        self.lag[due] = 0.0
+
+        gx, gy = goal(cx, cy)
+        dx, dy = gx - cx, gy - cy
+        dist = np.hypot(dx, dy)
+        move = np.minimum(self.speed * step, dist)
+        scale = np.divide(move, dist, out=np.zeros_like(dist), where=dist > 0)
+        if collide is None:
+            x += dx * scale
+            y += dy * scale
+        else:
+            x[:], y[:] = collide(x, y, dx * scale, dy * scale)
+
+        np.maximum(self.attack_cd - dt, 0.0, out=self.attack_cd)
+        np.maximum(self.show_bar - dt, 0.0, out=self.show_bar)
+
+        # Re-bucket only the NPCs whose box now covers other hash cells; the
+        # exact boxes are read from the arrays at query time
+        c = self.hash.cell_size
+        nxi, nyi = np.trunc(x), np.trunc(y)
+        moved = live & ((nxi // c != xi // c) | (nyi // c != yi // c) |
+                        ((nxi + self.width - 1) // c != (xi + self.width - 1) // c) |
+                        ((nyi + self.height - 1) // c != (yi + self.height - 1) // c))
+        for i in np.flatnonzero(moved).tolist():
+            self.hash.update(i, int(nxi[i]), int(nyi[i]), self.width, self.height)
+
+    def touching(self, x: int, y: int, w: int, h: int) -> List[int]:
+        """Slots whose box overlaps (x, y, w, h)."""
+        hits = []
+        for i in self.hash.candidates(x, y, w, h):
+            bx, by = int(self.x[i]), int(self.y[i])
+            if bx < x + w and x < bx + self.width and by < y + h and y < by + self.height:
+                hits.append(i)
+        return hits
+
+    def at_point(self, px: int, py: int) -> List[int]:
+        """Slots whose box contains (px, py)."""
+        return self.touching(px, py, 1, 1)
+
+    def lerp(self, slots: np.ndarray, alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of ``slots`` ``alpha`` of the way from before the last step to now."""
+        x, y = self.x[slots], self.y[slots]
+        px, py = self.prev_x[slots], self.prev_y[slots]
+        return px + (x - px) * alpha, py + (y - py) * alpha
+
+    def visible(self, x0: int, y0: int, w: int, h: int) -> np.ndarray:
+        """Slots whose box overlaps the pixel rectangle (x0, y0, w, h)."""
+        xi, yi = np.trunc(self.x), np.trunc(self.y)
+        hit = (self.alive & (xi < x0 + w) & (xi + self.width > x0) &
+               (yi < y0 + h) & (yi + self.height > y0))
+        return np.flatnonzero(hit)
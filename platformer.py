@@ -1,10 +1,32 @@
+import argparse
 import math
+import os
 import random
+import time
 from collections import deque
 import pygame
 import colorsys
-
-from collections import deque
+import numpy as np
+
+from fluids import FluidSim, FLUID_UNITS
+from world_store import (CHUNK_SIZE, EMPTY, LAYER_BG, LAYER_FLUID, LAYER_FLUID_LEVEL,
+                         LAYER_REVEALED, LAYER_TILE, LAYER_VARIANT, NUM_LAYERS, WorldStore)
+from world_stream import EVICT_SLACK, ChunkStreamer
+from npcs import NPCPool
+from flowfield import FlowField
+from collision import SolidBitmap
+from heightmap import SurfaceHeights
+from chunk_workers import DEFAULT_WORKERS, ChunkWorkers
+from cavegen import cave_mask, fbm
+from render_cache import TerrainCache
+from minimap import Minimap, MinimapPresenter
+from lighting import DarknessOverlay, LightGrid, LIGHT_MAX
+from fog_reveal import FogOfWar
+from autosave import AutoSaver
+from savegame import SaveFile, SaveSnapshot, compact_save, take_snapshot, write_snapshot
+from profiler import FrameProfiler, ProfilerOverlay
+from tile_atlas import TileAtlas
+from timestep import SIM_HZ, FixedTimestep
 
 
 # =============================================================================
@@ -13,11 +35,13 @@ from collections import deque
 
 # --------------------------------- Config -------------------------------------
 TILE_SIZE = 32
-WORLD_WIDTH = 100
+WORLD_WIDTH = 1 << 20  # tiles; chunk columns are generated as the player approaches them
 WORLD_HEIGHT = 100
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 SKY_BLUE = (135, 206, 235)
+RENDER_FPS = 60       # frame cap; the simulation steps at SIM_HZ regardless
+SIM_DT = 1.0 / SIM_HZ
 SURFACE_LEVEL = 10  # number of empty sky tiles above the ground surface
 
 # Player size + bars
@@ -48,10 +72,13 @@ EMERALD = 'emerald'
 DIAMOND = 'diamond'
 BEDROCK = 'bedrock'
 TILE_TYPES = [GRASS, DIRT, STONE, COAL, COPPER, IRON, GOLD, EMERALD, DIAMOND, BEDROCK]
+TILE_IDS = {name: i + 1 for i, name in enumerate(TILE_TYPES)}   # WorldStore ids
 
 # Fluids
 WATER = 'water'
 LAVA = 'lava'
+FLUID_TYPES = (WATER, LAVA)
+FLUID_IDS = {name: i + 1 for i, name in enumerate(FLUID_TYPES)}  # FluidSim ids
 FLUID_COLORS = {
     WATER: (64, 64, 255),
     LAVA: (255, 100, 0),
@@ -126,6 +153,13 @@ NPC_MAX_HP = 20
 NPC_SPEED = 60
 NPC_CONTACT_DAMAGE = 8
 NPC_SPAWN_RATE = 0.5  # spawns per second in pitch black
+NPC_MAX_COUNT = 5
+NPC_HASH_CELL = 64    # spatial hash cell (pixels) for NPC hit-tests
+NPC_LOD_RADIUS = SCREEN_WIDTH    # pixels from the player beyond which NPCs move less often
+NPC_FAR_INTERVAL = 0.25          # seconds between moves of those far NPCs
+NPC_PATH_RADIUS = 32             # tiles around the player the NPC flow field covers
+COLLISION_RADIUS = 2 * NPC_PATH_RADIUS   # tiles around the player kept in the solid bitmap
+NPC_SPRITE = None
 NPC_SHOW_BAR_TIME = 2.0
 PITCH_BLACK_ALPHA = 180
 TOOL_DAMAGE = {
@@ -181,13 +215,17 @@ MINIMAP_W = 180
 MINIMAP_H = 180
 MINIMAP_PAD = 10
 MINIMAP_BG = (10, 10, 10, 220)
+MINIMAP_SPAN = 192           # world columns shown; the window follows the player
 
 # Lighting & lantern
 MAX_DARK_DEPTH = 40          # tiles below surface to reach full darkness
-LANTERN_BRIGHTNESS = 120     # alpha reduction when lantern enabled
+MAX_DARK_ALPHA = 200         # overlay alpha of a completely unlit tile
 LANTERN_HINT_ALPHA = 100     # show hint when ambient darkness exceeds this alpha
 LIGHT_RADIUS = 80            # radius of visibility without lantern (pixels)
 LANTERN_LIGHT_RADIUS = 160   # radius of visibility with lantern (pixels)
+PLAYER_LIGHT_LEVEL = LIGHT_RADIUS // TILE_SIZE + 1           # light levels fade 1 per tile
+LANTERN_LIGHT_LEVEL = LANTERN_LIGHT_RADIUS // TILE_SIZE + 1
+LAVA_LIGHT_LEVEL = 5
 
 # Skills scaling
 ENDURANCE_STAM_PER_LVL = 10            # +Max Stamina per level
@@ -199,6 +237,24 @@ HP_PER_STRENGTH = 10
 
 random.seed()
 WORLD_SEED = random.randint(0, 2**31 - 1)
+SAVE_PATH = "digsim.sav"
+
+# Caves: fraction of underground tiles carved out, the same at any world size
+CAVE_DENSITY = 0.22
+CAVE_TOP_MARGIN = 3   # rows of solid ground kept under the grass
+
+# Terrain generation, per chunk column
+DIRT_MIN_DEPTH = 9
+DIRT_MAX_DEPTH = 16
+DIRT_CELL = 20.0            # columns between dirt-depth noise lattice points
+WATER_POOLS = (2, 4)        # pools per chunk column (inclusive range)
+LAVA_POOLS = (1, 3)
+POOL_SIZE = (5, 12)         # cells per pool
+
+# World streaming: tile columns kept loaded on each side of the player (covers
+# the screen and the minimap window wherever it sits)
+STREAM_RADIUS = MINIMAP_SPAN
+PREFETCH_COLUMNS = EVICT_SLACK   # chunk columns generated ahead in the direction of travel
 
 # ------------------------------ External Shop ---------------------------------
 # Teleport into a separate scene; buying is only allowed in that scene.
@@ -287,28 +343,28 @@ def create_base_surf(color):
     surf.fill(color)
     return surf
 
-def add_speckles(surf, count, color_range, size_range=(1, 2), margin=0):
+def add_speckles(surf, rng, count, color_range, size_range=(1, 2), margin=0):
     w, h = surf.get_size()
     for _ in range(count):
-        x = random.randint(margin, w - 1 - margin)
-        y = random.randint(margin, h - 1 - margin)
-        rw = random.randint(size_range[0], size_range[1])
-        rh = random.randint(size_range[0], size_range[1])
+        x = rng.randint(margin, w - 1 - margin)
+        y = rng.randint(margin, h - 1 - margin)
+        rw = rng.randint(size_range[0], size_range[1])
+        rh = rng.randint(size_range[0], size_range[1])
         c = (
-            random.randint(color_range[0][0], color_range[1][0]),
-            random.randint(color_range[0][1], color_range[1][1]),
-            random.randint(color_range[0][2], color_range[1][2]),
+            rng.randint(color_range[0][0], color_range[1][0]),
+            rng.randint(color_range[0][1], color_range[1][1]),
+            rng.randint(color_range[0][2], color_range[1][2]),
         )
         pygame.draw.rect(surf, c, pygame.Rect(x, y, rw, rh))
 
-def add_crack(surf, segments, color, thickness=1):
+def add_crack(surf, rng, segments, color, thickness=1):
     w, h = surf.get_size()
-    x = random.randint(2, w-3)
-    y = random.randint(2, h-3)
+    x = rng.randint(2, w-3)
+    y = rng.randint(2, h-3)
     pts = [(x, y)]
     for _ in range(segments):
-        x += random.randint(-4, 4)
-        y += random.randint(-3, 3)
+        x += rng.randint(-4, 4)
+        y += rng.randint(-3, 3)
         x = clamp(x, 1, w-2)
         y = clamp(y, 1, h-2)
         pts.append((x, y))
@@ -327,260 +383,331 @@ def top_gradient(surf, color_light, height=5):
         line.fill((*color_light, int(36 * t)))
         surf.blit(line, (0, y))
 
-def dirt_strata(surf, bands=2):
+def dirt_strata(surf, rng, bands=2):
     for _ in range(bands):
-        y = random.randint(8, 18)
-        c = (120 + random.randint(-5,5), 68 + random.randint(-5,5), 28 + random.randint(-5,5))
+        y = rng.randint(8, 18)
+        c = (120 + rng.randint(-5,5), 68 + rng.randint(-5,5), 28 + rng.randint(-5,5))
         pygame.draw.line(surf, c, (0, y), (TILE_SIZE, y), 1)
 
-def add_grass_tufts(surf, rows=2):
-    for _ in range(random.randint(3, 5)):
-        x = random.randint(2, TILE_SIZE - 3)
-        h = random.randint(3, 4 + rows)
+def add_grass_tufts(surf, rng, rows=2):
+    for _ in range(rng.randint(3, 5)):
+        x = rng.randint(2, TILE_SIZE - 3)
+        h = rng.randint(3, 4 + rows)
         for i in range(h):
             col = (52 + i*2, 180, 64 + i*2)
             surf.set_at((x, 1+i), col)
-            if random.random() < 0.45 and x+1 < TILE_SIZE:
+            if rng.random() < 0.45 and x+1 < TILE_SIZE:
                 surf.set_at((x+1, 1+i), col)
 
-def add_ore_overlay(surf, color, outline=(255,255,255), count=(1,2), max_r=4):
+def add_ore_overlay(surf, rng, color, outline=(255,255,255), count=(1,2), max_r=4):
     """Generic ore blob overlay."""
     w, h = surf.get_size()
-    for _ in range(random.randint(count[0], count[1])):
-        cx = random.randint(6, w-6)
-        cy = random.randint(6, h-6)
-        r  = random.randint(3, max_r)
+    for _ in range(rng.randint(count[0], count[1])):
+        cx = rng.randint(6, w-6)
+        cy = rng.randint(6, h-6)
+        r  = rng.randint(3, max_r)
         pygame.draw.circle(surf, color, (cx, cy), r)
         pygame.draw.circle(surf, outline, (cx, cy), r, 1)
 
-def build_flips_for_variant(s: pygame.Surface, tile_type: str):
-    flips = []
-    for code in ALLOWED_FLIPS[tile_type]:
-        if code == 0: flips.append(s)
-        elif code == 1: flips.append(pygame.transform.flip(s, True, False))
-        elif code == 2: flips.append(pygame.transform.flip(s, False, True))
-        else: flips.append(pygame.transform.flip(s, True, True))
-    return flips
-
-def build_tile_variants():
-    tile_variants = {t: [] for t in TILE_TYPES}
+# Tile art: one variant is painted per call, drawing every random choice
+# from rng.  Bump TILE_ART_VERSION whenever the painting changes, so cached
+# atlases painted by the old code are not reused.
+TILE_ART_VERSION = 1
+TILE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "digsim")   # None disables the atlas cache
+ORE_COLORS = {
+    COAL: (35, 35, 35), COPPER: (200, 140, 70), IRON: (210, 210, 210),
+    GOLD: (230, 190, 60), EMERALD: (46, 204, 113), DIAMOND: (0, 240, 240),
+}
 
-    # Grass
-    for _ in range(VARIANTS_PER_TILE[GRASS]):
+def paint_tile_variant(tile_type: str, rng: random.Random) -> pygame.Surface:
+    """One unflipped variant of tile_type."""
+    if tile_type == GRASS:
         s = create_base_surf(TILE_COLORS[GRASS])
         top_gradient(s, (80, 220, 90), height=5)
-        add_grass_tufts(s, rows=random.randint(1,3))
-        add_speckles(s, random.randint(6,10), ((20,120,20), (40,150,40)), (1,2), 1)
-        tint_slight(s, random.randint(-4,4), random.randint(-4,4), random.randint(-4,4), a=28)
-        tile_variants[GRASS].append(build_flips_for_variant(s, GRASS))
-
-    # Dirt
-    for _ in range(VARIANTS_PER_TILE[DIRT]):
+        add_grass_tufts(s, rng, rows=rng.randint(1,3))
+        add_speckles(s, rng, rng.randint(6,10), ((20,120,20), (40,150,40)), (1,2), 1)
+        tint_slight(s, rng.randint(-4,4), rng.randint(-4,4), rng.randint(-4,4), a=28)
+    elif tile_type == DIRT:
         s = create_base_surf(TILE_COLORS[DIRT])
         top_gradient(s, (180, 110, 50), height=3)
-        dirt_strata(s, bands=random.randint(1,2))
-        add_speckles(s, random.randint(12,18), ((95,55,20), (150,95,48)), (1,2), 1)
-        tint_slight(s, random.randint(-6,4), random.randint(-6,4), random.randint(-6,4), a=30)
-        tile_variants[DIRT].append(build_flips_for_variant(s, DIRT))
-
-    # Stone
-    for _ in range(VARIANTS_PER_TILE[STONE]):
+        dirt_strata(s, rng, bands=rng.randint(1,2))
+        add_speckles(s, rng, rng.randint(12,18), ((95,55,20), (150,95,48)), (1,2), 1)
+        tint_slight(s, rng.randint(-6,4), rng.randint(-6,4), rng.randint(-6,4), a=30)
+    elif tile_type == STONE:
         s = create_base_surf(TILE_COLORS[STONE])
-        add_speckles(s, random.randint(8,12), ((100,100,100),(118,118,118)), (1,2), 1)
-        for _ in range(random.randint(1,2)):
-            add_crack(s, random.randint(3,5), (80,80,80), 1)
-        tint_slight(s, random.randint(-4,4), random.randint(-4,4), random.randint(-4,4), a=24)
-        tile_variants[STONE].append(build_flips_for_variant(s, STONE))
-
-    # Ores
-    def ore_variant(base_color, ore_color, tile_type, speckles=((100,100,100),(120,120,120))):
-        s = create_base_surf(base_color)
-        add_speckles(s, random.randint(6,9), speckles, (1,2), 1)
-        add_ore_overlay(s, ore_color)
-        tile_variants[tile_type].append(build_flips_for_variant(s, tile_type))
-
-    for _ in range(VARIANTS_PER_TILE[COAL]):
-        ore_variant(TILE_COLORS[STONE], (35,35,35), COAL)
-    for _ in range(VARIANTS_PER_TILE[COPPER]):
-        ore_variant(TILE_COLORS[STONE], (200,140,70), COPPER)
-    for _ in range(VARIANTS_PER_TILE[IRON]):
-        ore_variant(TILE_COLORS[STONE], (210,210,210), IRON)
-    for _ in range(VARIANTS_PER_TILE[GOLD]):
-        ore_variant(TILE_COLORS[STONE], (230, 190, 60), GOLD)
-    for _ in range(VARIANTS_PER_TILE[EMERALD]):
-        ore_variant(TILE_COLORS[STONE], (46, 204, 113), EMERALD)
-    for _ in range(VARIANTS_PER_TILE[DIAMOND]):
-        ore_variant(TILE_COLORS[STONE], (0, 240, 240), DIAMOND)
-
-    # Bedrock
-    for _ in range(VARIANTS_PER_TILE[BEDROCK]):
-        s = create_base_surf(TILE_COLORS[BEDROCK])
-        for _ in range(random.randint(1,2)):
-            add_crack(s, random.randint(4,6), (5,5,5), 2)
-        add_speckles(s, random.randint(6,9), ((12,12,12),(24,24,24)), (1,2), 1)
-        tile_variants[BEDROCK].append(build_flips_for_variant(s, BEDROCK))
-
-    return tile_variants
-
-def prng_int(x, y, salt):
-    n = (x * 73856093) ^ (y * 19349663) ^ (WORLD_SEED * 83492791) ^ (salt * 2654435761)
-    n ^= (n >> 13)
-    n = (n * 1274126177) & 0xFFFFFFFF
-    n ^= (n >> 16)
-    return n & 0xFFFFFFFF
-
+        add_speckles(s, rng, rng.randint(8,12), ((100,100,100),(118,118,118)), (1,2), 1)
+        for _ in range(rng.randint(1,2)):
+            add_crack(s, rng, rng.randint(3,5), (80,80,80), 1)
+        tint_slight(s, rng.randint(-4,4), rng.randint(-4,4), rng.randint(-4,4), a=24)
+    elif tile_type in ORE_COLORS:
+        s = create_base_surf(TILE_COLORS[STONE])
+        add_speckles(s, rng, rng.randint(6,9), ((100,100,100),(120,120,120)), (1,2), 1)
+        add_ore_overlay(s, rng, ORE_COLORS[tile_type])
+    else:   # bedrock
+        s = create_base_surf(TILE_COLORS[tile_type])
+        for _ in range(rng.randint(1,2)):
+            add_crack(s, rng, rng.randint(4,6), (5,5,5), 2)
+        add_speckles(s, rng, rng.randint(6,9), ((12,12,12),(24,24,24)), (1,2), 1)
+    return s
+
+def tile_atlas_layout():
+    return {t: (VARIANTS_PER_TILE[t], ALLOWED_FLIPS[t]) for t in TILE_TYPES}
+
+def load_tile_atlas(seed: int | None = None, cache_dir: str | None = None) -> TileAtlas:
+    """Every tile variant and flip for seed (default WORLD_SEED), from cache_dir when it has them."""
+    return TileAtlas.load_or_paint(WORLD_SEED if seed is None else seed, TILE_ART_VERSION, TILE_SIZE,
+                                   tile_atlas_layout(), paint_tile_variant, cache_dir)
+
+def build_tile_variants(seed: int | None = None):
+    """tile type -> variant -> flip -> surface, painted afresh (no cache)."""
+    return load_tile_atlas(seed).variants
+
+# Which variant and flip each tile is drawn with is a hash of its position,
+# the seed and its type.  The world generator computes it for a whole column
+# at once into LAYER_VARIANT (variant index in the low four bits, flip index
+# above them), so drawing a tile only reads one byte.
 SALT_BY_TILE = {
     GRASS:101, DIRT:202, STONE:303, COAL:311, COPPER:322, IRON:333,
     GOLD:344, EMERALD:355, DIAMOND:366, BEDROCK:505
 }
-
-def pick_variant_surface(tile_type, tx, ty, variants_dict):
+# By tile id; id 0 (empty) gets one variant and one flip so the modulo is safe
+_VARIANT_SALT = np.array([0] + [SALT_BY_TILE[t] for t in TILE_TYPES], dtype=np.uint64)
+_VARIANT_COUNT = np.array([1] + [VARIANTS_PER_TILE[t] for t in TILE_TYPES], dtype=np.uint64)
+_FLIP_COUNT = np.array([1] + [len(ALLOWED_FLIPS[t]) for t in TILE_TYPES], dtype=np.uint64)
+
+def tile_variant_codes(tiles: np.ndarray, x0: int, y0: int, seed: int | None = None) -> np.ndarray:
+    """LAYER_VARIANT for a (w, h) block of tile ids whose corner is tile (x0, y0); 0 where empty."""
+    seed = WORLD_SEED if seed is None else seed
+    u = np.uint64
+    w, h = tiles.shape
+    x = np.arange(x0, x0 + w, dtype=u)[:, np.newaxis]
+    y = np.arange(y0, y0 + h, dtype=u)[np.newaxis, :]
+    # Only the low 45 bits of n matter below, so uint64 wraparound is harmless
+    n = (x * u(73856093)) ^ (y * u(19349663)) ^ u((seed * 83492791) & 0xFFFFFFFFFFFFFFFF) \
+        ^ (_VARIANT_SALT[tiles] * u(2654435761))
+    n ^= n >> u(13)
+    n = ((n & u(0xFFFFFFFF)) * u(1274126177)) & u(0xFFFFFFFF)
+    n ^= n >> u(16)
+    variant = n % _VARIANT_COUNT[tiles]
+    flip = (n >> u(3)) % _FLIP_COUNT[tiles]
+    return np.where(tiles != EMPTY, variant | (flip << u(4)), 0).astype(np.uint8)
+
+def pick_variant_surface(tile_type, code, variants_dict):
+    """The surface for a tile whose LAYER_VARIANT byte is code."""
     var_list = variants_dict[tile_type]
     if not var_list:
         return None
-    r = prng_int(tx, ty, SALT_BY_TILE[tile_type])
-    v_idx = r % len(var_list)
-    flips = var_list[v_idx]
-    f_idx = (r >> 3) % len(flips)
-    return flips[f_idx]
-
-def smooth_dirt_depths(width: int, min_depth: int, max_depth: int) -> list[int]:
-    start = random.randint((min_depth + max_depth)//2 - 1, (min_depth + max_depth)//2 + 1)
-    d = [start]
-    for _ in range(1, width):
-        r = random.random()
-        step = -1 if r < 0.18 else (1 if r > 0.82 else 0)
-        d.append(max(min_depth, min(max_depth, d[-1] + step)))
-    smoothed = []
-    for x in range(width):
-        acc = d[x]; cnt = 1
-        if x > 0: acc += d[x-1]; cnt += 1
-        if x < width-1: acc += d[x+1]; cnt += 1
-        smoothed.append(int(round(acc / cnt)))
-    return smoothed
-
-def generate_world():
+    flips = var_list[(code & 15) % len(var_list)]
+    return flips[(code >> 4) % len(flips)]
+
+def paint_world_tile(surf: pygame.Surface, world: WorldStore, fluids: FluidSim,
+                     variants_dict, tx: int, ty: int, px: int, py: int) -> None:
+    """Background, tile variant and fluid overlay for one tile (terrain cache painter)."""
+    rect = pygame.Rect(px, py, TILE_SIZE, TILE_SIZE)
+    surf.fill(world.background_at(tx, ty), rect)
+    tile = world.get(tx, ty)
+    if tile:
+        var = pick_variant_surface(tile, world.get_id(tx, ty, LAYER_VARIANT), variants_dict)
+        if var is not None:
+            surf.blit(var, rect.topleft)
+    lvl = fluids.level_at(tx, ty)
+    ftype = fluids.kind_at(tx, ty)
+    if lvl > 0 and ftype:
+        h = int((lvl / FLUID_UNITS) * TILE_SIZE)
+        surf.fill(FLUID_COLORS.get(ftype, (0,0,255)), pygame.Rect(px, rect.bottom - h, TILE_SIZE, h))
+
+def paint_world_block(surf: pygame.Surface, world: WorldStore, fluids: FluidSim,
+                      variants_dict, x0: int, y0: int, cols: int, rows: int) -> None:
+    """paint_world_tile for a cols x rows block of tiles at once (terrain cache baker)."""
+    ts = TILE_SIZE
+    x1, y1 = x0 + cols, y0 + rows
+    tiles = world.slice(x0, x1, y0, y1)
+    codes = world.slice(x0, x1, y0, y1, LAYER_VARIANT)
+    names = world.names
+
+    # Tile art is opaque, so the background only shows in empty cells
+    bg = world.slice(x0, x1, y0, y1, LAYER_BG)
+    bg_colors = [tuple(rgb) for rgb in world.bg_palette.tolist()]
+    for i, j in zip(*(a.tolist() for a in np.nonzero(tiles == EMPTY))):
+        surf.fill(bg_colors[bg[i, j]], (i * ts, j * ts, ts, ts))
+
+    blits = []
+    for i, j in zip(*(a.tolist() for a in np.nonzero(tiles))):
+        var = pick_variant_surface(names[tiles[i, j]], codes[i, j], variants_dict)
+        if var is not None:
+            blits.append((var, (i * ts, j * ts)))
+    surf.blits(blits, False)
+
+    kind = world.slice(x0, x1, y0, y1, LAYER_FLUID)
+    level = world.slice(x0, x1, y0, y1, LAYER_FLUID_LEVEL)
+    for i, j in zip(*(a.tolist() for a in np.nonzero((kind != 0) & (level > 0)))):
+        h = int((int(level[i, j]) / FLUID_UNITS) * ts)
+        surf.fill(FLUID_COLORS.get(fluids.names[kind[i, j]], (0,0,255)), pygame.Rect(i * ts, (j + 1) * ts - h, ts, h))
+
+def dirt_depths(x0: int, width: int, seed: int) -> np.ndarray:
+    """Dirt thickness for columns [x0, x0 + width): smooth 1-D noise in [DIRT_MIN_DEPTH, DIRT_MAX_DEPTH].
+
+    The noise is hashed from the column index, so neighbouring chunk columns
+    line up without knowing about each other.
+    """
+    n = fbm(seed, 3, x0, 0, width, 1, DIRT_CELL, octaves=2)[:, 0]
+    span = DIRT_MAX_DEPTH - DIRT_MIN_DEPTH
+    return np.clip(DIRT_MIN_DEPTH + np.floor(n * (span + 1)), DIRT_MIN_DEPTH, DIRT_MAX_DEPTH).astype(np.int32)
+
+def new_world_store() -> WorldStore:
+    return WorldStore(WORLD_WIDTH, WORLD_HEIGHT, TILE_TYPES, BG_COLORS, SKY_BLUE)
+
+# Ore bands by normalised stone depth (0 = top of stone, 1 = bedrock), checked
+# in order against one uniform draw per tile; the first band that matches wins.
+#   (tile, deeper than, shallower than, chance)
+ORE_BANDS = [
+    (COAL,    None, 0.35, 0.08),    # shallow, common
+    (COPPER,  None, 0.50, 0.06),    # shallow-mid
+    (IRON,    0.30, 0.75, 0.05),    # mid
+    (GOLD,    0.55, None, 0.035),   # deeper
+    (EMERALD, 0.70, None, 0.025),   # deep
+    (DIAMOND, 0.82, None, 0.015),   # deepest
+]
+
+def place_fluid_pools(tiles: np.ndarray, x_end: int, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """Clustered water and lava pools in the empty tiles of one column block; returns (kind, level)."""
+    H = tiles.shape[1]
+    kind = np.zeros_like(tiles)
+    level = np.zeros_like(tiles)
+
+    def cluster(cx, cy, fluid, size):
+        if tiles[cx, cy] != EMPTY:
+            return
+        q = deque([(cx, cy)])
+        visited = set()
+        count = 0
+        while q and count < size:
+            x, y = q.popleft()
+            if (x, y) in visited:
+                continue
+            visited.add((x, y))
+            if not (0 <= x < x_end and 0 <= y < H):
+                continue
+            if tiles[x, y] == EMPTY:
+                kind[x, y] = FLUID_IDS[fluid]
+                level[x, y] = FLUID_UNITS
+                count += 1
+                for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
+                    q.append((x+dx, y+dy))
+
+    for _ in range(int(rng.integers(WATER_POOLS[0], WATER_POOLS[1] + 1))):
+        cx = int(rng.integers(0, x_end))
+        cy = int(rng.integers(SURFACE_LEVEL+3, H//2 + 1))
+        cluster(cx, cy, WATER, int(rng.integers(POOL_SIZE[0], POOL_SIZE[1] + 1)))
+    for _ in range(int(rng.integers(LAVA_POOLS[0], LAVA_POOLS[1] + 1))):
+        cx = int(rng.integers(0, x_end))
+        cy = int(rng.integers(H//2, H-3 + 1))
+        cluster(cx, cy, LAVA, int(rng.integers(POOL_SIZE[0], POOL_SIZE[1] + 1)))
+    return kind, level
+
+def column_rng(cx: int, seed: int) -> np.random.Generator:
+    return np.random.default_rng((seed & 0xFFFFFFFFFFFFFFFF, cx))
+
+def column_terrain(cx: int, seed: int, rng: np.random.Generator) -> np.ndarray:
     """
-    Generate terrain with smoothed dirt thickness and ores by depth:
+    Tiles of chunk column cx before caves, shape (C, WORLD_HEIGHT): grass,
+    dirt of smoothed thickness, stone with ores by depth, and bedrock.
       Shallow → deep rarity: Coal > Copper > Iron > Gold > Emerald > Diamond.
     """
-    world = [[None for _ in range(WORLD_HEIGHT)] for _ in range(WORLD_WIDTH)]
-    background = [[SKY_BLUE for _ in range(WORLD_HEIGHT)] for _ in range(WORLD_WIDTH)]
-    dirt_depth_by_x = smooth_dirt_depths(WORLD_WIDTH, 9, 16)
-
-    for x in range(WORLD_WIDTH):
-        ground_y = SURFACE_LEVEL
-        world[x][ground_y] = GRASS
-        background[x][ground_y] = BG_COLORS[GRASS]
-
-        dirt_depth = dirt_depth_by_x[x]
-        # Dirt below grass
-        for y in range(ground_y + 1, min(WORLD_HEIGHT - 1, ground_y + dirt_depth)):
-            world[x][y] = DIRT
-            background[x][y] = BG_COLORS[DIRT]
-
-        # Stone + Ores
-        for y in range(ground_y + dirt_depth, WORLD_HEIGHT - 1):
-            # Depth normalized 0..1 from start of stone down to bedrock
-            stone_start = ground_y + dirt_depth
-            stone_h = (WORLD_HEIGHT - 1) - stone_start
-            dnorm = 0.0 if stone_h <= 0 else (y - stone_start) / stone_h
-
-            # Base stone
-            tile = STONE
-
-            # Depth-biased ore probabilities
-            r = random.random()
-            # Coal: shallow (dnorm < ~0.35), decent chance
-            if dnorm < 0.35 and r < 0.08:
-                tile = COAL
-            # Copper: shallow-mid
-            elif dnorm < 0.50 and r < 0.06:
-                tile = COPPER
-            # Iron: mid
-            elif 0.30 < dnorm < 0.75 and r < 0.05:
-                tile = IRON
-            # Gold: deeper
-            elif dnorm > 0.55 and r < 0.035:
-                tile = GOLD
-            # Emerald: deep
-            elif dnorm > 0.70 and r < 0.025:
-                tile = EMERALD
-            # Diamond: deepest
-            elif dnorm > 0.82 and r < 0.015:
-                tile = DIAMOND
-
-            world[x][y] = tile
-            background[x][y] = BG_COLORS[tile if tile != STONE else STONE]
-
-        # Bedrock bottom
-        world[x][WORLD_HEIGHT - 1] = BEDROCK
-        background[x][WORLD_HEIGHT - 1] = BG_COLORS[BEDROCK]
-
-    return world, background
-
-def generate_caves(world, background):
-    """Carve random walk caves inside the stone layers."""
-    for _ in range(40):
-        x = random.randint(0, WORLD_WIDTH - 1)
-        y = random.randint(SURFACE_LEVEL + 5, WORLD_HEIGHT - 5)
-        for _ in range(200):
-            if 0 <= x < WORLD_WIDTH and SURFACE_LEVEL < y < WORLD_HEIGHT - 1:
-                world[x][y] = None
-                background[x][y] = BG_COLORS[STONE]
-            dx, dy = random.choice([(1,0),(-1,0),(0,1),(0,-1)])
-            x += dx
-            y += dy
-
-def init_revealed(world):
-    revealed = [[False for _ in range(WORLD_HEIGHT)] for _ in range(WORLD_WIDTH)]
-    for x in range(WORLD_WIDTH):
-        for y in range(0, SURFACE_LEVEL):
-            revealed[x][y] = True
-        if world[x][SURFACE_LEVEL] == GRASS:
-            revealed[x][SURFACE_LEVEL] = True
-    return revealed
-
-def reveal_tile(revealed, x, y):
-    if 0 <= x < WORLD_WIDTH and 0 <= y < WORLD_HEIGHT:
-        revealed[x][y] = True
-
-def reveal_neighbors4(revealed, x, y):
-    reveal_tile(revealed, x + 1, y)
-    reveal_tile(revealed, x - 1, y)
-    reveal_tile(revealed, x, y + 1)
-    reveal_tile(revealed, x, y - 1)
-
-def reveal_cave(revealed, world, sx, sy):
-    """Flood-reveal connected empty tiles starting from (sx, sy)."""
-    if not (0 <= sx < WORLD_WIDTH and 0 <= sy < WORLD_HEIGHT):
-        return
-    if world[sx][sy] is not None:
-        return
-    q = deque([(sx, sy)])
-    while q:
-        x, y = q.popleft()
-        if not (0 <= x < WORLD_WIDTH and 0 <= y < WORLD_HEIGHT):
-            continue
-        if revealed[x][y]:
-            continue
-        revealed[x][y] = True
-        for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < WORLD_WIDTH and 0 <= ny < WORLD_HEIGHT and world[nx][ny] is None:
-                q.append((nx, ny))
-
-def solid_at(world, tx, ty):
-    if 0 <= tx < WORLD_WIDTH and 0 <= ty < WORLD_HEIGHT:
-        return world[tx][ty] is not None
-    return True
-
-def tiles_overlapping_aabb(rect):
-    x_start = max(0, rect.left // TILE_SIZE - 1)
-    x_end = min(WORLD_WIDTH, rect.right // TILE_SIZE + 2)
-    y_start = max(0, rect.top // TILE_SIZE - 1)
-    y_end = min(WORLD_HEIGHT, rect.bottom // TILE_SIZE + 2)
-    return x_start, x_end, y_start, y_end
+    ids = TILE_IDS
+    C, H = CHUNK_SIZE, WORLD_HEIGHT
+    x0 = cx * C
+    ground_y = SURFACE_LEVEL
+
+    dirt_depth = dirt_depths(x0, C, seed)[:, np.newaxis]
+    y = np.arange(H)[np.newaxis, :]
+    stone_start = ground_y + dirt_depth
+    is_dirt = (y > ground_y) & (y < np.minimum(H - 1, stone_start))
+    is_stone = (y >= stone_start) & (y < H - 1)
+
+    # Depth normalized 0..1 from start of stone down to bedrock
+    stone_h = (H - 1) - stone_start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dnorm = np.where(stone_h > 0, (y - stone_start) / np.maximum(stone_h, 1), 0.0)
+
+    tiles = np.zeros((C, H), dtype=np.uint8)
+    tiles[:, ground_y] = ids[GRASS]
+    tiles[is_dirt] = ids[DIRT]
+    tiles[is_stone] = ids[STONE]
+
+    # Depth-biased ore probabilities
+    r = rng.random((C, H))
+    open_stone = is_stone.copy()
+    for tile, deeper, shallower, chance in ORE_BANDS:
+        hit = open_stone & (r < chance)
+        if deeper is not None:
+            hit &= dnorm > deeper
+        if shallower is not None:
+            hit &= dnorm < shallower
+        tiles[hit] = ids[tile]
+        open_stone &= ~hit
+
+    # Bedrock bottom
+    tiles[:, H - 1] = ids[BEDROCK]
+    return tiles
+
+def carve_caves(tiles: np.ndarray, bg: np.ndarray, cx: int, seed: int) -> None:
+    """Empty the cave tiles of column cx below the surface, leaving stone behind them in bg."""
+    # The noise is chunk-local, so columns agree at their edges
+    y0, y1 = SURFACE_LEVEL + CAVE_TOP_MARGIN, tiles.shape[1] - 1
+    if y0 < y1:
+        mask = cave_mask(seed, cx * CHUNK_SIZE, y0, CHUNK_SIZE, y1 - y0, CAVE_DENSITY)
+        tiles[:, y0:y1][mask] = EMPTY
+        bg[:, y0:y1][mask] = TILE_IDS[STONE]
+
+def generate_column(cx: int, seed: int | None = None) -> np.ndarray:
+    """
+    Every layer of chunk column cx, shape (chunks_y, NUM_LAYERS, C, C):
+    column_terrain, then noise caves, fluid pools, and fog already lifted
+    over the sky and the grass.  A pure function of the seed (default
+    WORLD_SEED), the world size and cx, so a column can be dropped and
+    generated again at any time.
+    """
+    seed = WORLD_SEED if seed is None else seed
+    rng = column_rng(cx, seed)
+    C, H = CHUNK_SIZE, WORLD_HEIGHT
+    x0 = cx * C
+    ground_y = SURFACE_LEVEL
+
+    tiles = column_terrain(cx, seed, rng)
+    bg = tiles.copy()
+    carve_caves(tiles, bg, cx, seed)
+    kind, level = place_fluid_pools(tiles, min(C, WORLD_WIDTH - x0), rng)
+
+    rows = -(-H // C) * C
+    layers = np.zeros((NUM_LAYERS, C, rows), dtype=np.uint8)
+    layers[LAYER_TILE, :, :H] = tiles
+    layers[LAYER_BG, :, :H] = bg
+    layers[LAYER_REVEALED, :, :ground_y + 1] = 1
+    layers[LAYER_FLUID, :, :H] = kind
+    layers[LAYER_FLUID_LEVEL, :, :H] = level
+    layers[LAYER_VARIANT, :, :H] = tile_variant_codes(tiles, x0, 0, seed)
+    return layers.reshape(NUM_LAYERS, C, rows // C, C).transpose(2, 0, 1, 3).copy()
+
+def generate_column_job(cx: int, seed: int, width: int, height: int) -> np.ndarray:
+    """generate_column for a worker process, which may not have this process's world size."""
+    configure_world(width, height)
+    return generate_column(cx, seed)
+
+def generate_world(seed: int | None = None) -> WorldStore:
+    """The whole world at once, for tools and benchmarks; the game streams columns instead."""
+    world = new_world_store()
+    for cx in range(world.chunks_x):
+        for cy, ch in enumerate(generate_column(cx, seed)):
+            world.chunks[(cx, cy)] = ch
+    return world
+
+def new_fog(world: WorldStore) -> FogOfWar:
+    return FogOfWar(WORLD_WIDTH, WORLD_HEIGHT, TILE_SIZE, FOG_RGBA, world.layer(LAYER_REVEALED, bool))
+
+def new_fluid_sim(world: WorldStore) -> FluidSim:
+    return FluidSim(WORLD_WIDTH, WORLD_HEIGHT, FLUID_TYPES,
+                    world.layer(LAYER_FLUID), world.layer(LAYER_FLUID_LEVEL))
 
 def mining_time_for(tile_type: str) -> float:
     base = MINING_TIME.get(tile_type, 0.6)
@@ -609,79 +736,31 @@ def color_for_tile(tile_type: str) -> tuple[int, int, int]:
     r, g, b = colorsys.hsv_to_rgb(h, s, v)
     return (int(r*255), int(g*255), int(b*255))
 
-def spawn_fluids(world):
-    """Spawn clustered water and lava pools."""
-    ftype = [[None for _ in range(WORLD_HEIGHT)] for _ in range(WORLD_WIDTH)]
-    flevel = [[0 for _ in range(WORLD_HEIGHT)] for _ in range(WORLD_WIDTH)]
-
-    def cluster(cx, cy, fluid, size):
-        if world[cx][cy] is not None:
-            return
-        q = deque([(cx, cy)])
-        visited = set()
-        count = 0
-        while q and count < size:
-            x, y = q.popleft()
-            if (x, y) in visited:
-                continue
-            visited.add((x, y))
-            if not (0 <= x < WORLD_WIDTH and 0 <= y < WORLD_HEIGHT):
-                continue
-            if world[x][y] is None:
-                ftype[x][y] = fluid
-                flevel[x][y] = 4
-                count += 1
-                for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-                    q.append((x+dx, y+dy))
-
-    for _ in range(10):
-        cx = random.randint(0, WORLD_WIDTH-1)
-        cy = random.randint(SURFACE_LEVEL+3, WORLD_HEIGHT//2)
-        cluster(cx, cy, WATER, random.randint(5,12))
-    for _ in range(6):
-        cx = random.randint(0, WORLD_WIDTH-1)
-        cy = random.randint(WORLD_HEIGHT//2, WORLD_HEIGHT-3)
-        cluster(cx, cy, LAVA, random.randint(5,12))
-    return ftype, flevel
-
-def update_fluids(world, ftype, flevel):
-    """Very simple fluid spreading with 4 units per tile."""
-    new_type = [row[:] for row in ftype]
-    new_lvl = [row[:] for row in flevel]
-    for x in range(WORLD_WIDTH):
-        for y in range(WORLD_HEIGHT-1, -1, -1):
-            t = ftype[x][y]
-            lvl = flevel[x][y]
-            if not t or lvl <= 0:
-                continue
-            # Flow down
-            if y+1 < WORLD_HEIGHT and world[x][y+1] is None:
-                space = 4 - new_lvl[x][y+1]
-                if space > 0:
-                    move = min(lvl, space)
-                    new_lvl[x][y] -= move
-                    new_lvl[x][y+1] += move
-                    new_type[x][y+1] = t
-                    if new_lvl[x][y] <= 0:
-                        new_type[x][y] = None
-                    continue
-            # Spread sideways
-            for dx in (-1, 1):
-                nx = x + dx
-                if 0 <= nx < WORLD_WIDTH and world[nx][y] is None:
-                    space = (lvl - 1) - new_lvl[nx][y]
-                    if space > 0:
-                        move = min(space, lvl)
-                        new_lvl[x][y] -= move
-                        new_lvl[nx][y] += move
-                        new_type[nx][y] = t
-                        if new_lvl[x][y] <= 0:
-                            new_type[x][y] = None
-                        lvl = new_lvl[x][y]
-    for x in range(WORLD_WIDTH):
-        for y in range(WORLD_HEIGHT):
-            flevel[x][y] = new_lvl[x][y]
-            ftype[x][y] = new_type[x][y]
+def update_fluids(world, fluids: FluidSim):
+    """Very simple fluid spreading with 4 units per tile (active cells only).
+    Chunks that are not loaded count as solid, so fluids never pull them in."""
+    fluids.step(world.is_solid_loaded)
+
+def ambient_light_rows() -> np.ndarray:
+    """Skylight level per row: full above ground, fading out over MAX_DARK_DEPTH tiles."""
+    depth = np.arange(WORLD_HEIGHT) - SURFACE_LEVEL
+    ratio = np.clip(depth / MAX_DARK_DEPTH, 0.0, 1.0)
+    return np.ceil(LIGHT_MAX * (1.0 - ratio))
+
+def new_light_grid(world: WorldStore, fluids: FluidSim) -> LightGrid:
+    lava = fluids.ids[LAVA]
+    def lava_glow(x0, x1, y0, y1):
+        kind = fluids.kind[x0:x1, y0:y1]
+        level = fluids.level[x0:x1, y0:y1]
+        return np.where((kind == lava) & (level > 0), LAVA_LIGHT_LEVEL, 0)
+    return LightGrid(WORLD_WIDTH, WORLD_HEIGHT, ambient_light_rows(), world.solid_slice, lava_glow)
+
+def lava_glow_changes(fluids: FluidSim) -> list[tuple[int, int]]:
+    """Cells of the last fluid step where lava appeared or drained; other flow never changes the light."""
+    lava = fluids.ids[LAVA]
+    kind, level = fluids.kind, fluids.level
+    return [(x, y) for (x, y), (k, lvl) in fluids.previous.items()
+            if (k == lava and lvl > 0) != (kind[x, y] == lava and level[x, y] > 0)]
 
 def stamina_regen_rate(current: float, max_value: float) -> float:
     if max_value <= 0: return 0.0
@@ -701,65 +780,29 @@ def can_mine_tile(player_rect: pygame.Rect, tx: int, ty: int, radius_tiles: int)
     return max(dx, dy) <= radius_tiles
 
 # ---- Surface spawn helpers (GLOBAL) ------------------------------------------
-def _top_solid_pixel_y(world, tx: int) -> int:
+def _top_solid_pixel_y(heights: SurfaceHeights, tx: int) -> int:
     tx = max(0, min(WORLD_WIDTH - 1, int(tx)))
-    for y in range(WORLD_HEIGHT):
-        if world[tx][y] is not None:
-            return y * TILE_SIZE
-    return SURFACE_LEVEL * TILE_SIZE
+    y = heights.top(tx)
+    return y * TILE_SIZE if y < WORLD_HEIGHT else SURFACE_LEVEL * TILE_SIZE
 
-def spawn_player_on_surface(world, player: pygame.Rect, prefer_tx: int | None = None) -> None:
+def spawn_player_on_surface(heights: SurfaceHeights, player: pygame.Rect, prefer_tx: int | None = None) -> None:
     if prefer_tx is None:
         prefer_tx = player.centerx // TILE_SIZE
     prefer_tx = max(0, min(WORLD_WIDTH - 1, int(prefer_tx)))
-    top_y = _top_solid_pixel_y(world, prefer_tx)
+    top_y = _top_solid_pixel_y(heights, prefer_tx)
     center_x_px = prefer_tx * TILE_SIZE + TILE_SIZE // 2
     # Correct: bottom sits at top_y, not inside
     player.midbottom = (center_x_px, top_y)
 
 
 # ------------- Unstick helpers (safe after teleport) --------------------------
-def push_player_out_of_solids(world, rect: pygame.Rect) -> pygame.Rect:
-    x_start, x_end, y_start, y_end = tiles_overlapping_aabb(rect)
-    for ty in range(y_start, y_end):
-        for tx in range(x_start, x_end):
-            if not solid_at(world, tx, ty):
-                continue
-            tile_rect = pygame.Rect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-            if rect.colliderect(tile_rect):
-                ox1 = tile_rect.right - rect.left
-                ox2 = rect.right - tile_rect.left
-                oy1 = tile_rect.bottom - rect.top
-                oy2 = rect.bottom - tile_rect.top
-                moves = [(ox1, 0), (-ox2, 0), (0, oy1), (0, -oy2)]
-                dx, dy = min(moves, key=lambda v: abs(v[0]) + abs(v[1]))
-                rect.move_ip(dx, dy)
-                return push_player_out_of_solids(world, rect)
-    return rect
-
-def snap_player_to_ground(world, rect: pygame.Rect, max_fall_px: int = TILE_SIZE * 4) -> tuple[pygame.Rect, bool]:
-    on_ground = False
-    fall = 0
-    while fall < max_fall_px:
-        test = rect.move(0, 1)
-        x_start, x_end, y_start, y_end = tiles_overlapping_aabb(test)
-        hit = False
-        for ty in range(y_start, y_end):
-            for tx in range(x_start, x_end):
-                if not solid_at(world, tx, ty):
-                    continue
-                tile_rect = pygame.Rect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                if test.colliderect(tile_rect):
-                    hit = True
-                    on_ground = True
-                    break
-            if hit:
-                break
-        if hit:
-            break
-        rect = test
-        fall += 1
-    return rect, on_ground
+def push_player_out_of_solids(solids: SolidBitmap, rect: pygame.Rect) -> pygame.Rect:
+    x, y, _ = solids.depenetrate(rect.x, rect.y, rect.width, rect.height)
+    return pygame.Rect(x, y, rect.width, rect.height)
+
+def snap_player_to_ground(solids: SolidBitmap, rect: pygame.Rect, max_fall_px: int = TILE_SIZE * 4) -> tuple[pygame.Rect, bool]:
+    y, on_ground = solids.sweep_y(rect.x, rect.y, rect.width, rect.height, max_fall_px)
+    return pygame.Rect(rect.x, y, rect.width, rect.height), on_ground
 
 # ------------------------------ Effects ---------------------------------------
 class MiningEffect:
@@ -802,63 +845,46 @@ class MiningEffect:
         surface.blit(fx, (cx - TILE_SIZE // 2, cy - TILE_SIZE // 2))
 
 
-class HostileNPC:
-    def __init__(self, x: float, y: float):
-        self.x = float(x)
-        self.y = float(y)
-        self.width = NPC_W
-        self.height = NPC_H
-        self.hp = float(NPC_MAX_HP)
-        self.max_hp = float(NPC_MAX_HP)
-        self.show_bar = 0.0
-        self.attack_cd = 0.0
-
-    @property
-    def rect(self) -> pygame.Rect:
-        return pygame.Rect(int(self.x), int(self.y), self.width, self.height)
-
-    def update(self, dt: float, player: pygame.Rect):
-        # movement towards player
-        px, py = player.centerx, player.centery
-        cx, cy = self.rect.centerx, self.rect.centery
-        dx, dy = px - cx, py - cy
-        dist = math.hypot(dx, dy)
-        if dist > 0:
-            vx = dx / dist * NPC_SPEED
-            vy = dy / dist * NPC_SPEED
-            self.x += vx * dt
-            self.y += vy * dt
-        if self.attack_cd > 0.0:
-            self.attack_cd = max(0.0, self.attack_cd - dt)
-        if self.show_bar > 0.0:
-            self.show_bar = max(0.0, self.show_bar - dt)
-
-    def draw(self, screen: pygame.Surface, cam_x: int, cam_y: int):
-        rect = pygame.Rect(int(self.x - cam_x), int(self.y - cam_y), self.width, self.height)
-        if not rect.colliderect(screen.get_rect()):
-            return
-        pygame.draw.rect(screen, NPC_COLOR, rect)
-        # simple eyes for appearance
-        eye_w = 3
-        eye_h = 3
-        pygame.draw.rect(screen, NPC_EYE_COLOR, (rect.x + 6, rect.y + 10, eye_w, eye_h))
-        pygame.draw.rect(screen, NPC_EYE_COLOR, (rect.right - 6 - eye_w, rect.y + 10, eye_w, eye_h))
-        if self.show_bar > 0.0 and self.hp < self.max_hp:
-            bw = rect.width
-            bh = 4
-            bar_rect = pygame.Rect(rect.x, rect.y - 8, bw, bh)
-            pygame.draw.rect(screen, BAR_BG_COLOR, bar_rect)
-            fill_w = int(bw * (self.hp / self.max_hp))
-            if fill_w > 0:
-                pygame.draw.rect(screen, HP_COLOR, (bar_rect.x, bar_rect.y, fill_w, bh))
-            pygame.draw.rect(screen, BAR_BORDER, bar_rect, 1)
-
-    def damage(self, amount: float):
-        self.hp = max(0.0, self.hp - amount)
-        self.show_bar = NPC_SHOW_BAR_TIME
-
-    def alive(self) -> bool:
-        return self.hp > 0.0
+def new_npc_pool() -> NPCPool:
+    return NPCPool(NPC_W, NPC_H, NPC_MAX_HP, NPC_SPEED, NPC_HASH_CELL, NPC_LOD_RADIUS, NPC_FAR_INTERVAL)
+
+def build_npc_sprite() -> pygame.Surface:
+    surf = pygame.Surface((NPC_W, NPC_H))
+    surf.fill(NPC_COLOR)
+    # simple eyes for appearance
+    eye_w = 3
+    eye_h = 3
+    pygame.draw.rect(surf, NPC_EYE_COLOR, (6, 10, eye_w, eye_h))
+    pygame.draw.rect(surf, NPC_EYE_COLOR, (NPC_W - 6 - eye_w, 10, eye_w, eye_h))
+    return surf.convert() if pygame.display.get_surface() else surf
+
+def draw_npcs(screen: pygame.Surface, npcs: NPCPool, cam_x: int, cam_y: int, alpha: float = 1.0):
+    """Blit the visible NPCs in one call, then the few health bars being shown.
+
+    Each is drawn alpha of the way from its position before the last step.
+    """
+    global NPC_SPRITE
+    if NPC_SPRITE is None:
+        NPC_SPRITE = build_npc_sprite()
+    sw, sh = screen.get_size()
+    vis = npcs.visible(cam_x, cam_y, sw, sh)
+    if not len(vis):
+        return
+    fx, fy = npcs.lerp(vis, alpha)
+    xs = (np.trunc(fx) - cam_x).astype(int).tolist()
+    ys = (np.trunc(fy) - cam_y).astype(int).tolist()
+    screen.blits([(NPC_SPRITE, pos) for pos in zip(xs, ys)], doreturn=False)
+
+    bars = (npcs.show_bar[vis] > 0.0) & (npcs.hp[vis] < npcs.max_hp)
+    for k in np.flatnonzero(bars).tolist():
+        bw = npcs.width
+        bh = 4
+        bar_rect = pygame.Rect(xs[k], ys[k] - 8, bw, bh)
+        pygame.draw.rect(screen, BAR_BG_COLOR, bar_rect)
+        fill_w = int(bw * (npcs.hp[vis[k]] / npcs.max_hp))
+        if fill_w > 0:
+            pygame.draw.rect(screen, HP_COLOR, (bar_rect.x, bar_rect.y, fill_w, bh))
+        pygame.draw.rect(screen, BAR_BORDER, bar_rect, 1)
 
 # --------------------------- UI: Bars above player ----------------------------
 def draw_player_bars(screen: pygame.Surface, cam_x: int, cam_y: int,
@@ -1125,659 +1151,869 @@ def draw_skills(screen: pygame.Surface, font: pygame.font.Font,
     return clickable
 
 # ------------------------------ Minimap ---------------------------------------
-def build_minimap(world, revealed):
-    surf = pygame.Surface((WORLD_WIDTH, WORLD_HEIGHT)).convert()
-    px = pygame.PixelArray(surf)
-    for x in range(WORLD_WIDTH):
-        for y in range(WORLD_HEIGHT):
-            if y < SURFACE_LEVEL:
-                px[x, y] = 0xFFFFFF
-            else:
-                if not revealed[x][y]:
-                    px[x, y] = 0x000000
-                else:
-                    if world[x][y] is None:
-                        px[x, y] = (120 << 16) | (120 << 8) | 120
-                    else:
-                        px[x, y] = 0xFFFFFF
-    del px
-    return surf
-
-def draw_minimap_small(screen: pygame.Surface, mini: pygame.Surface):
-    sw, sh = screen.get_size()
-    target = pygame.transform.smoothscale(mini, (MINIMAP_W, MINIMAP_H))
-    bg = pygame.Surface((MINIMAP_W + 8, MINIMAP_H + 8), pygame.SRCALPHA)
-    bg.fill(MINIMAP_BG)
-    x = sw - MINIMAP_W - MINIMAP_PAD
-    y = MINIMAP_PAD
-    screen.blit(bg, (x - 4, y - 4))
-    screen.blit(target, (x, y))
-    return pygame.Rect(x, y, MINIMAP_W, MINIMAP_H)
-
-from collections import deque
-
-def reveal_cave_and_halo(revealed, world, sx, sy):
-    """
-    Flood-fill through connected empty tiles starting at (sx, sy)
-    and reveal a 4-neighbour halo so cave walls also become visible.
-    """
-    width = len(world)
-    if width <= 0:
-        return
-    height = len(world[0])
-
-    def in_bounds(x, y):
-        return 0 <= x < width and 0 <= y < height
-
-    def reveal_tile(x, y):
-        if in_bounds(x, y):
-            revealed[x][y] = True
-
-    def reveal_neighbors4(x, y):
-        reveal_tile(x + 1, y)
-        reveal_tile(x - 1, y)
-        reveal_tile(x, y + 1)
-        reveal_tile(x, y - 1)
-
-    if not in_bounds(sx, sy):
-        return
-
-    if world[sx][sy] is not None:
-        reveal_tile(sx, sy)
-        reveal_neighbors4(sx, sy)
-        return
-
-    q = deque()
-    visited_empty = set()
-
-    q.append((sx, sy))
-    visited_empty.add((sx, sy))
-    reveal_tile(sx, sy)
-    reveal_neighbors4(sx, sy)
-
-    while q:
-        x, y = q.popleft()
-        reveal_neighbors4(x, y)
-
-        for dx, dy in ((1,0), (-1,0), (0,1), (0,-1)):
-            nx, ny = x + dx, y + dy
-            if not in_bounds(nx, ny):
-                continue
-            if world[nx][ny] is None and (nx, ny) not in visited_empty:
-                visited_empty.add((nx, ny))
-                reveal_tile(nx, ny)
-                q.append((nx, ny))
-
-
-def draw_minimap_big(screen: pygame.Surface, mini: pygame.Surface):
-    sw, sh = screen.get_size()
-    overlay = pygame.Surface((sw, sh), pygame.SRCALPHA)
-    overlay.fill((0,0,0,180))
-    screen.blit(overlay, (0,0))
-    scale = min((sw - 80) / WORLD_WIDTH, (sh - 120) / WORLD_HEIGHT)
-    tw, th = int(WORLD_WIDTH * scale), int(WORLD_HEIGHT * scale)
-    target = pygame.transform.smoothscale(mini, (tw, th))
-    screen.blit(target, ((sw - tw)//2, (sh - th)//2))
-    font = pygame.font.SysFont(None, 24)
-    t = font.render("Minimap (M to close)", True, (240,240,240))
-    screen.blit(t, (sw//2 - t.get_width()//2, 24))
+def build_minimap(world, revealed, center_x: int = 0) -> Minimap:
+    minimap = Minimap(WORLD_WIDTH, WORLD_HEIGHT, SURFACE_LEVEL, MINIMAP_SPAN)
+    minimap.x0 = minimap.window_for(center_x)
+    minimap.rebuild(world, revealed)
+    return minimap
+
+# ------------------------------ Game state ------------------------------------
+TILE_ITEMS = {
+    GRASS: "grass_item",
+    DIRT: "dirt_item",
+    STONE: "stone_item",
+    COAL: "coal_item",
+    COPPER: "copper_item",
+    IRON: "iron_item",
+    GOLD: "gold_item",
+    EMERALD: "emerald_item",
+    DIAMOND: "diamond_item",
+}
 
-# ---------------------------------- Main --------------------------------------
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    clock = pygame.time.Clock()
-    build_shop_button_ui(screen)
+# Brightest light level that still counts as pitch black for NPC spawns: the
+# skylight at the depth where depth-only darkness used to reach PITCH_BLACK_ALPHA
+PITCH_BLACK_LEVEL = math.ceil(LIGHT_MAX * (1.0 - PITCH_BLACK_ALPHA / MAX_DARK_ALPHA))
+
+def tile_to_item(tile_type: str) -> str | None:
+    return TILE_ITEMS.get(tile_type, None)
+
+class Inputs:
+    """What the player is doing during one simulation step."""
+    def __init__(self, left: bool = False, right: bool = False, jump: bool = False,
+                 clicks: list[tuple[int, int]] | None = None):
+        self.left = left
+        self.right = right
+        self.jump = jump
+        self.clicks = clicks if clicks is not None else []   # world-pixel positions
+
+    @classmethod
+    def from_keys(cls, keys, clicks: list[tuple[int, int]] | None = None) -> "Inputs":
+        return cls(
+            left=bool(keys[pygame.K_LEFT] or keys[pygame.K_a]),
+            right=bool(keys[pygame.K_RIGHT] or keys[pygame.K_d]),
+            jump=bool(keys[pygame.K_UP] or keys[pygame.K_w] or keys[pygame.K_SPACE]),
+            clicks=clicks,
+        )
 
-    font = pygame.font.SysFont(None, 20)
-    big_font = pygame.font.SysFont(None, 24)
-
-    tile_variants = build_tile_variants()
-    world, background = generate_world()
-    generate_caves(world, background)
-    fluid_type, fluid_level = spawn_fluids(world)
-    revealed = init_revealed(world)
-
-    fog_tile = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
-    fog_tile.fill(FOG_RGBA)
-
-    # Player (spawn on surface at column 5)
-    player = pygame.Rect(
-        5 * TILE_SIZE, 0,
-        int(TILE_SIZE * PLAYER_WIDTH_RATIO),
-        int(TILE_SIZE * PLAYER_HEIGHT_RATIO),
-    )
-    spawn_player_on_surface(world, player, 5)
-    vx, vy = 0.0, 0.0
-    accel = 900.0
-    max_speed = 180.0
-    friction = 1200.0
-    gravity = 1200.0
-    max_fall = 600.0
-    jump_speed = 380.0
-    on_ground = True
-    coyote_time = 0.08
-    coyote_left = 0.0
-
-    # Skills / Stats
-    strength_lvl = 1
-    endurance_lvl = 0
-    speed_lvl = 0
-    skill_points = 0
-    mined_count_for_skill = 0
-
-    hp_max = hp_for_strength(strength_lvl)
-    hp = float(hp_max)
-    hp_regen_cd = 0.0
-
-    stam_max = stam_for_endurance(endurance_lvl)
-    stam = float(stam_max)
-    stam_regen_cooldown = 0.0
-
-    coins = 30  # starting coins (shop scene will change this)
-
-    camera_x = 0
-    camera_y = 0
-
-    npcs: list[HostileNPC] = []
-
-    mining_effects = {}
-
-    # Inventory (resources & potions)
-    inventory: dict[str, int] = {}
-
-    # Owned tools with shared durability (None=infinite)
-    tools_owned: dict[str, float | None] = {
-        "hand": None,
-        "wood_pick": float(TOOL_MAX_DUR["wood_pick"]),
-    }
-
-    # Equipment
-    armor_items: dict[str, str | None] = {"head": None, "body": None, "legs": None, "feet": None}
-    accessory_item: str | None = "lantern"
-    lantern_on = False
-    lantern_hint = False
-
-    # Hotbar
-    hotbar: list[str | None] = ["hand", "wood_pick", None, None]
-    selected_slot = 0
-
-    # Minimap cache
-    minimap = build_minimap(world, revealed)
-    minimap_dirty = False
-    minimap_open = False
-
-    # Panels toggles
-    inventory_open = False
-    skills_open = False
-
-    # Fog drawer
-    def draw_fog():
-        start_x = max(0, camera_x // TILE_SIZE)
-        end_x = min(WORLD_WIDTH, (camera_x + SCREEN_WIDTH) // TILE_SIZE + 1)
-        start_y = max(SURFACE_LEVEL, camera_y // TILE_SIZE)
-        end_y = min(WORLD_HEIGHT, (camera_y + SCREEN_HEIGHT) // TILE_SIZE + 1)
-        for tx in range(start_x, end_x):
-            for ty in range(start_y, end_y):
-                if not revealed[tx][ty]:
-                    rect = pygame.Rect(tx * TILE_SIZE - camera_x, ty * TILE_SIZE - camera_y, TILE_SIZE, TILE_SIZE)
-                    screen.blit(fog_tile, rect.topleft)
-
-    def add_item(item_id: str, amount: int = 1):
-        nonlocal minimap_dirty
+class GameState:
+    """Everything the simulation owns. No display needed; see step()."""
+    ACCEL = 900.0
+    MAX_SPEED = 180.0
+    FRICTION = 1200.0
+    GRAVITY = 1200.0
+    MAX_FALL = 600.0
+    JUMP_SPEED = 380.0
+    COYOTE_TIME = 0.08
+
+    def __init__(self, track_changes: bool = True, save: SaveFile | None = None, gen_workers: int = 0):
+        # Chunk columns are generated (or read from the save) as the player nears
+        # them; with gen_workers > 0 generation runs in that many processes
+        self.world = new_world_store()
+        if save is not None:
+            save.check(self.world, FLUID_TYPES)
+        self.chunk_gen = ChunkWorkers(generate_column_job, (WORLD_SEED, WORLD_WIDTH, WORLD_HEIGHT), gen_workers)
+        self.streamer = ChunkStreamer(self.world, self.chunk_gen.generate,
+                                      save.chunk if save else None, save.keys() if save else ())
+        self.fog = new_fog(self.world)
+        self.fluids = new_fluid_sim(self.world)
+        self.light = new_light_grid(self.world, self.fluids)
+        self.streamer.on_load.append(self.column_loaded)
+        self.streamer.on_evict.append(self.column_evicted)
+        self.heights = SurfaceHeights(WORLD_WIDTH, WORLD_HEIGHT, self.world.solid_slice)
+        self.solids = SolidBitmap(TILE_SIZE, COLLISION_RADIUS, self.world.solid_slice)
+
+        # Player (spawn on surface at column 5)
+        self.player = pygame.Rect(
+            5 * TILE_SIZE, 0,
+            int(TILE_SIZE * PLAYER_WIDTH_RATIO),
+            int(TILE_SIZE * PLAYER_HEIGHT_RATIO),
+        )
+        spawn_player_on_surface(self.heights, self.player, 5)
+        self.prev_pos = self.player.topleft     # before the last step, for drawing between steps
+        self.vx, self.vy = 0.0, 0.0
+        self.on_ground = True
+        self.coyote_left = 0.0
+
+        # Skills / Stats
+        self.strength_lvl = 1
+        self.endurance_lvl = 0
+        self.speed_lvl = 0
+        self.skill_points = 0
+        self.mined_count_for_skill = 0
+
+        self.hp_max = hp_for_strength(self.strength_lvl)
+        self.hp = float(self.hp_max)
+        self.hp_regen_cd = 0.0
+
+        self.stam_max = stam_for_endurance(self.endurance_lvl)
+        self.stam = float(self.stam_max)
+        self.stam_regen_cooldown = 0.0
+
+        self.coins = 30  # starting coins (shop scene will change this)
+
+        self.npcs = new_npc_pool()
+        self.npc_paths = FlowField(TILE_SIZE, NPC_PATH_RADIUS, self.world.solid_slice)
+        self.mining_effects: dict[tuple[int, int], MiningEffect] = {}
+
+        # Inventory (resources & potions)
+        self.inventory: dict[str, int] = {}
+        # Owned tools with shared durability (None=infinite)
+        self.tools_owned: dict[str, float | None] = {
+            "hand": None,
+            "wood_pick": float(TOOL_MAX_DUR["wood_pick"]),
+        }
+        # Equipment
+        self.armor_items: dict[str, str | None] = {"head": None, "body": None, "legs": None, "feet": None}
+        self.accessory_item: str | None = "lantern"
+        self.lantern_on = False
+        # Hotbar
+        self.hotbar: list[str | None] = ["hand", "wood_pick", None, None]
+        self.selected_slot = 0
+
+        self.time = 0.0
+        self.steps = 0
+        self.profiler = FrameProfiler()
+
+        # Tiles renderers need to repaint, collected until take_changes()
+        self.track_changes = track_changes
+        self.terrain_changes: set[tuple[int, int]] = set()
+        self.map_changes: list[tuple[int, int]] = []
+
+        # World chunks changed since the last save snapshot
+        self.dirty_chunks: set[tuple[int, int]] = set()
+        self.loaded_from: str | None = None
+        if save is not None:
+            self.restore_saved(save.state)
+            self.loaded_from = save.path
+        self.stream_around()
+
+    # -- persistence ----------------------------------------------------------
+    @classmethod
+    def load(cls, path: str, track_changes: bool = True, gen_workers: int = 0) -> "GameState":
+        """Open a save written by save(); the world size and seed come from the file."""
+        try:
+            compact_save(path)
+        except OSError as e:
+            print(f"[world] Could not compact {path}: {e}")
+        save = SaveFile(path)
+        configure_world(save.width, save.height, save.seed)
+        return cls(track_changes, save, gen_workers)
+
+    def save(self, path: str) -> None:
+        write_snapshot(path, self.snapshot(full=True))
+
+    def mark_dirty(self, tiles) -> None:
+        shift = self.world.shift
+        keys = {(x >> shift, y >> shift) for x, y in tiles}
+        self.dirty_chunks |= keys
+        self.streamer.mark_modified(keys)
+
+    def snapshot(self, full: bool = False) -> SaveSnapshot:
+        """Copy what changed since the last snapshot (every changed chunk if full) for a background save."""
+        keys = self.streamer.modified if full else self.dirty_chunks
+        snap = take_snapshot(self.world, self.fluids, WORLD_SEED, self.saved_state(), keys,
+                             full, self.streamer.stored)
+        self.dirty_chunks = set()
+        return snap
+
+    # -- streaming ------------------------------------------------------------
+    def stream_around(self) -> None:
+        """Load the chunk columns near the player, evict the far ones and prefetch ahead."""
+        streamer, gen = self.streamer, self.chunk_gen
+        tx = self.player.centerx // TILE_SIZE
+        x0, x1 = tx - STREAM_RADIUS, tx + STREAM_RADIUS + 1
+        lo, hi = streamer.column_range(x0, x1)
+        # Everything missing at once (cold start, respawn) is generated in parallel
+        gen.prefetch(cx for cx in range(lo, hi + 1) if streamer.needs_generating(cx))
+        streamer.update(x0, x1)
+
+        # Columns finished since the last frame are installed while still near
+        for cx in gen.collect():
+            if lo - EVICT_SLACK <= cx <= hi + EVICT_SLACK:
+                streamer.load_column(cx)
+        gen.trim(lo - EVICT_SLACK, hi + EVICT_SLACK)
+        if self.vx:
+            ahead = range(hi + 1, hi + 1 + PREFETCH_COLUMNS) if self.vx > 0 else range(lo - 1, lo - 1 - PREFETCH_COLUMNS, -1)
+            gen.prefetch(cx for cx in ahead if streamer.needs_generating(cx))
+
+    def close(self) -> None:
+        """Stop the chunk workers and drop the spill file."""
+        self.chunk_gen.close()
+        self.streamer.close()
+
+    def column_loaded(self, cx: int) -> None:
+        x0 = cx * CHUNK_SIZE
+        self.fluids.wake_region(x0 - 1, x0 + CHUNK_SIZE + 1, 0, WORLD_HEIGHT)
+        self.light.invalidate_region(x0 - LIGHT_MAX, x0 + CHUNK_SIZE + LIGHT_MAX, 0, WORLD_HEIGHT)
+
+    def column_evicted(self, cx: int) -> None:
+        x0 = cx * CHUNK_SIZE
+        self.fluids.sleep_region(x0, x0 + CHUNK_SIZE, 0, WORLD_HEIGHT)
+        self.light.invalidate_region(x0, x0 + CHUNK_SIZE, 0, WORLD_HEIGHT)
+
+    def saved_state(self) -> dict:
+        """Player, stats and equipment as plain JSON data."""
+        return {
+            "player": [self.player.x, self.player.y, self.vx, self.vy],
+            "on_ground": self.on_ground,
+            "time": self.time,
+            "coins": self.coins,
+            "hp": self.hp,
+            "stam": self.stam,
+            "cooldowns": [self.hp_regen_cd, self.stam_regen_cooldown, self.coyote_left],
+            "levels": {"str": self.strength_lvl, "end": self.endurance_lvl, "spd": self.speed_lvl},
+            "skill_points": self.skill_points,
+            "mined_count_for_skill": self.mined_count_for_skill,
+            "inventory": dict(self.inventory),
+            "tools_owned": dict(self.tools_owned),
+            "armor_items": dict(self.armor_items),
+            "accessory_item": self.accessory_item,
+            "lantern_on": self.lantern_on,
+            "hotbar": list(self.hotbar),
+            "selected_slot": self.selected_slot,
+        }
+
+    def restore_saved(self, data: dict) -> None:
+        x, y, self.vx, self.vy = data["player"]
+        self.player.topleft = self.prev_pos = (int(x), int(y))
+        self.time = data.get("time", 0.0)
+        self.coins = data["coins"]
+        levels = data["levels"]
+        self.strength_lvl, self.endurance_lvl, self.speed_lvl = levels["str"], levels["end"], levels["spd"]
+        self.hp_max = hp_for_strength(self.strength_lvl)
+        self.stam_max = stam_for_endurance(self.endurance_lvl)
+        self.hp = min(float(self.hp_max), data["hp"])
+        self.stam = min(float(self.stam_max), data["stam"])
+        self.skill_points = data["skill_points"]
+        self.mined_count_for_skill = data["mined_count_for_skill"]
+        self.inventory = dict(data["inventory"])
+        self.tools_owned = dict(data["tools_owned"])
+        self.armor_items = dict(data["armor_items"])
+        self.accessory_item = data["accessory_item"]
+        self.lantern_on = data["lantern_on"]
+        self.hotbar = list(data["hotbar"])
+        self.selected_slot = data["selected_slot"]
+        self.on_ground = data.get("on_ground", False)
+        self.hp_regen_cd, self.stam_regen_cooldown, self.coyote_left = data.get("cooldowns", (0.0, 0.0, 0.0))
+
+    # -- render feed ----------------------------------------------------------
+    def take_changes(self) -> tuple[set[tuple[int, int]], list[tuple[int, int]]]:
+        """Return and clear (terrain tiles, minimap tiles) changed since the last call."""
+        changes = (self.terrain_changes, self.map_changes)
+        self.terrain_changes, self.map_changes = set(), []
+        return changes
+
+    # -- player actions -------------------------------------------------------
+    def current_tool(self) -> str:
+        return self.hotbar[self.selected_slot] or "hand"
+
+    def add_item(self, item_id: str, amount: int = 1):
         if item_id not in ITEMS:
             return False
-        cap = capacity_for_strength(strength_lvl)
-        if total_items(inventory) + amount > cap and ITEMS[item_id]["type"] != "consumable":
+        cap = capacity_for_strength(self.strength_lvl)
+        if total_items(self.inventory) + amount > cap and ITEMS[item_id]["type"] != "consumable":
             return False
-        inventory[item_id] = inventory.get(item_id, 0) + amount
-        minimap_dirty = True
+        self.inventory[item_id] = self.inventory.get(item_id, 0) + amount
         return True
 
-    def tile_to_item(tile_type: str) -> str | None:
-        return {
-            GRASS: "grass_item",
-            DIRT: "dirt_item",
-            STONE: "stone_item",
-            COAL: "coal_item",
-            COPPER: "copper_item",
-            IRON: "iron_item",
-            GOLD: "gold_item",
-            EMERALD: "emerald_item",
-            DIAMOND: "diamond_item",
-        }.get(tile_type, None)
-
-    def adjusted_mining_time(tile_type: str) -> float:
-        tool = hotbar[selected_slot] or "hand"
-        if tool not in tools_owned or (TOOL_MAX_DUR.get(tool) and (tools_owned[tool] or 0) <= 0):
+    def adjusted_mining_time(self, tile_type: str) -> float:
+        tool = self.current_tool()
+        if tool not in self.tools_owned or (TOOL_MAX_DUR.get(tool) and (self.tools_owned[tool] or 0) <= 0):
             tool = "hand"
         base = mining_time_for(tile_type)
         factor = current_tool_factor(tool, tile_type)
-        speed_bonus = 1.0 + speed_lvl * SPEED_MINING_BONUS_PER_LVL
+        speed_bonus = 1.0 + self.speed_lvl * SPEED_MINING_BONUS_PER_LVL
         return base / (factor * speed_bonus)
 
-    def take_damage(amount: float):
-        nonlocal hp, hp_regen_cd
+    def take_damage(self, amount: float):
         dmg = amount
-        for item_id in armor_items.values():
+        for item_id in self.armor_items.values():
             if item_id:
                 info = ITEMS.get(item_id, {})
                 dmg *= max(0.0, 1.0 - info.get("dr", 0.0))
-        hp = max(0.0, hp - dmg)
-        hp_regen_cd = HP_REGEN_DELAY
+        self.hp = max(0.0, self.hp - dmg)
+        self.hp_regen_cd = HP_REGEN_DELAY
 
-    def apply_tool_wear_on_mine(tile_type: str):
-        tool = hotbar[selected_slot] or "hand"
-        if tool not in tools_owned:
+    def apply_tool_wear_on_mine(self, tile_type: str):
+        tool = self.current_tool()
+        if tool not in self.tools_owned:
             return
         mx = TOOL_MAX_DUR.get(tool)
         if not mx:  # infinite / hand
             return
         base_loss = TOOL_DECAY_PER_BLOCK.get(tile_type, 1.0)
-        reduction = max(0.0, 1.0 - endurance_lvl * ENDURANCE_DURA_REDUCT_PER_LVL)
+        reduction = max(0.0, 1.0 - self.endurance_lvl * ENDURANCE_DURA_REDUCT_PER_LVL)
         loss = base_loss * reduction
-        tools_owned[tool] = max(0.0, (tools_owned[tool] or 0) - loss)
+        self.tools_owned[tool] = max(0.0, (self.tools_owned[tool] or 0) - loss)
 
-    running = True
-    while running:
-        dt = clock.tick(60) / 1000.0
-
-        if minimap_dirty:
-            minimap = build_minimap(world, revealed)
-            minimap_dirty = False
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-
-            elif event.type == pygame.KEYDOWN:
-                if event.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4):
-                    selected_slot = {pygame.K_1:0, pygame.K_2:1, pygame.K_3:2, pygame.K_4:3}[event.key]
-                elif event.key == pygame.K_i:
-                    inventory_open = not inventory_open
-                elif event.key == pygame.K_o:
-                    skills_open = not skills_open
-                elif event.key == pygame.K_m:
-                    minimap_open = not minimap_open
-                elif event.key == pygame.K_h:
-                    take_damage(12.0)
-                elif event.key == pygame.K_q:
-                    if accessory_item == "lantern":
-                        lantern_on = not lantern_on
-                elif event.key == pygame.K_b:
-                    if run_shop is None:
-                        print("[world] Shop not available (shop_scene.py missing).")
-                    else:
-                        returned = None
-                        try:
-                            returned = run_shop(screen, coins, inventory, tools_owned, armor_items)
-                        except TypeError:
-                            run_shop(screen)
-                        else:
-                            if isinstance(returned, (list, tuple)) and len(returned) >= 4:
-                                coins, inventory, tools_owned, armor_items = returned[0], returned[1], returned[2], returned[3]
-                            elif isinstance(returned, dict):
-                                coins = returned.get("coins", coins)
-                                inventory = returned.get("inventory", inventory)
-                                tools_owned = returned.get("tools_owned", tools_owned)
-                                armor_items = returned.get("armor", armor_items)
-                        spawn_player_on_surface(world, player)
-                        vy = 0.0
-                        on_ground = True
-                        player = push_player_out_of_solids(world, player)
-                        player, on_ground = snap_player_to_ground(world, player)
-                        build_shop_button_ui(screen)
-
-            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                mx, my = pygame.mouse.get_pos()
-
-                # Shop button = TELEPORT to shop scene (buying only there)
-                if SHOP_BTN_RECT.collidepoint(mx, my):
-                    if run_shop is None:
-                        print("[world] Shop not available (shop_scene.py missing).")
-                    else:
-                        # Try flexible signatures for state handoff
-                        returned = None
-                        try:
-                            returned = run_shop(screen, coins, inventory, tools_owned, armor_items)
-                        except TypeError:
-                            # fall back to legacy signature
-                            run_shop(screen)
-                        else:
-                            # apply returned state if provided
-                            if isinstance(returned, (list, tuple)) and len(returned) >= 4:
-                                coins, inventory, tools_owned, armor_items = returned[0], returned[1], returned[2], returned[3]
-                            elif isinstance(returned, dict):
-                                coins = returned.get("coins", coins)
-                                inventory = returned.get("inventory", inventory)
-                                tools_owned = returned.get("tools_owned", tools_owned)
-                                armor_items = returned.get("armor", armor_items)
-
-                        # On return, snap safely to surface and rebuild cached UI
-                        spawn_player_on_surface(world, player)
-                        vy = 0.0
-                        on_ground = True
-                        player = push_player_out_of_solids(world, player)
-                        player, on_ground = snap_player_to_ground(world, player)
-                        build_shop_button_ui(screen)
-                    continue
-
-                # Minimap small + buttons under it
-                mini_rect = draw_minimap_small(screen, minimap)
-                btn_w, btn_h, gap = 110, 24, 6
-                inv_btn = pygame.Rect(mini_rect.right - btn_w, mini_rect.bottom + 6, btn_w, btn_h)
-                skl_btn = pygame.Rect(mini_rect.right - btn_w, inv_btn.bottom + gap, btn_w, btn_h)
-                if inv_btn.collidepoint(mx, my):
-                    inventory_open = not inventory_open
-                    continue
-                if skl_btn.collidepoint(mx, my):
-                    skills_open = not skills_open
-                    continue
-
-                # Inventory / Skills panel clicks (tools & item cells)
-                inv_cells, tool_cells = draw_inventory(screen, font, inventory, tools_owned, armor_items, accessory_item, selected_slot, inventory_open, strength_lvl)
-                skill_clicks = draw_skills(screen, font, skills_open, strength_lvl, endurance_lvl, speed_lvl, skill_points)
-
-                consumed = False
-                if inventory_open:
-                    for cell_rect, tool_id in tool_cells:
-                        if cell_rect.collidepoint(mx, my):
-                            hotbar[selected_slot] = tool_id
-                            consumed = True
-                            break
-                if not consumed and skills_open and skill_clicks:
-                    if skill_clicks.get("str") and skill_clicks["str"].collidepoint(mx, my) and skill_points > 0:
-                        skill_points -= 1
-                        strength_lvl += 1
-                        old = hp_max
-                        hp_max = hp_for_strength(strength_lvl)
-                        ratio = hp/old if old > 0 else 1.0
-                        hp = max(1.0, min(hp_max, ratio*hp_max))
-                        consumed = True
-                    elif skill_clicks.get("end") and skill_clicks["end"].collidepoint(mx, my) and skill_points > 0:
-                        skill_points -= 1
-                        endurance_lvl += 1
-                        old = stam_max
-                        stam_max = stam_for_endurance(endurance_lvl)
-                        ratio = stam/old if old > 0 else 1.0
-                        stam = max(0.0, min(stam_max, ratio*stam_max))
-                        consumed = True
-                    elif skill_clicks.get("spd") and skill_clicks["spd"].collidepoint(mx, my) and skill_points > 0:
-                        skill_points -= 1
-                        speed_lvl += 1
-                        consumed = True
-                if consumed:
-                    continue
-
-                # Attack NPCs before mining
-                wx = mx + camera_x
-                wy = my + camera_y
-                hit = False
-                for npc in list(npcs):
-                    if npc.rect.collidepoint(wx, wy):
-                        tool = hotbar[selected_slot] or "hand"
-                        dmg = TOOL_DAMAGE.get(tool, TOOL_DAMAGE["hand"])
-                        npc.damage(dmg)
-                        if not npc.alive():
-                            npcs.remove(npc)
-                        hit = True
-                        break
-                if hit:
-                    continue
-
-                # Mining click
-                tx = (mx + camera_x) // TILE_SIZE
-                ty = (my + camera_y) // TILE_SIZE
-                if 0 <= tx < WORLD_WIDTH and 0 <= ty < WORLD_HEIGHT:
-                    tx, ty = int(tx), int(ty)
-                    if revealed[tx][ty] and can_mine_tile(player, tx, ty, MINING_RANGE_TILES):
-                        tile = world[tx][ty]
-                        if tile and tile != BEDROCK:
-                            dur = adjusted_mining_time(tile)
-                            if math.isfinite(dur):
-                                cost = stamina_cost_for_duration(dur)
-                                if stam >= cost:
-                                    stam -= cost
-                                    stam_regen_cooldown = STAM_REGEN_DELAY
-                                    if (tx, ty) not in mining_effects:
-                                        mining_effects[(tx, ty)] = MiningEffect(tx, ty, dur, tile)
+    def toggle_lantern(self):
+        if self.accessory_item == "lantern":
+            self.lantern_on = not self.lantern_on
 
-        keys = pygame.key.get_pressed()
+    def spend_skill_point(self, skill: str) -> bool:
+        """Raise 'str', 'end' or 'spd' by one level if a point is available."""
+        if self.skill_points <= 0 or skill not in ("str", "end", "spd"):
+            return False
+        self.skill_points -= 1
+        if skill == "str":
+            self.strength_lvl += 1
+            old = self.hp_max
+            self.hp_max = hp_for_strength(self.strength_lvl)
+            ratio = self.hp/old if old > 0 else 1.0
+            self.hp = max(1.0, min(self.hp_max, ratio*self.hp_max))
+        elif skill == "end":
+            self.endurance_lvl += 1
+            old = self.stam_max
+            self.stam_max = stam_for_endurance(self.endurance_lvl)
+            ratio = self.stam/old if old > 0 else 1.0
+            self.stam = max(0.0, min(self.stam_max, ratio*self.stam_max))
+        else:
+            self.speed_lvl += 1
+        return True
+
+    def apply_shop_result(self, returned) -> None:
+        """Take back whatever state the shop scene handed over."""
+        if isinstance(returned, (list, tuple)) and len(returned) >= 4:
+            self.coins, self.inventory, self.tools_owned, self.armor_items = returned[0], returned[1], returned[2], returned[3]
+        elif isinstance(returned, dict):
+            self.coins = returned.get("coins", self.coins)
+            self.inventory = returned.get("inventory", self.inventory)
+            self.tools_owned = returned.get("tools_owned", self.tools_owned)
+            self.armor_items = returned.get("armor", self.armor_items)
+
+    def place_on_surface(self) -> None:
+        """Snap safely to the surface (used when returning from the shop)."""
+        spawn_player_on_surface(self.heights, self.player)
+        self.vy = 0.0
+        self.on_ground = True
+        self.player = push_player_out_of_solids(self.solids, self.player)
+        self.player, self.on_ground = snap_player_to_ground(self.solids, self.player)
+        self.prev_pos = self.player.topleft     # a jump, not a move to draw
+
+    def click(self, wx: int, wy: int) -> None:
+        """World click: attack an NPC under the cursor, otherwise start mining."""
+        for i in self.npcs.at_point(wx, wy):
+            dmg = TOOL_DAMAGE.get(self.current_tool(), TOOL_DAMAGE["hand"])
+            self.npcs.damage(i, dmg, NPC_SHOW_BAR_TIME)
+            return
+
+        tx = wx // TILE_SIZE
+        ty = wy // TILE_SIZE
+        if 0 <= tx < WORLD_WIDTH and 0 <= ty < WORLD_HEIGHT:
+            tx, ty = int(tx), int(ty)
+            if self.fog.is_revealed(tx, ty) and can_mine_tile(self.player, tx, ty, MINING_RANGE_TILES):
+                tile = self.world.get(tx, ty)
+                if tile and tile != BEDROCK:
+                    dur = self.adjusted_mining_time(tile)
+                    if math.isfinite(dur):
+                        cost = stamina_cost_for_duration(dur)
+                        if self.stam >= cost:
+                            self.stam -= cost
+                            self.stam_regen_cooldown = STAM_REGEN_DELAY
+                            if (tx, ty) not in self.mining_effects:
+                                self.mining_effects[(tx, ty)] = MiningEffect(tx, ty, dur, tile)
+
+    def mine_tile(self, tx: int, ty: int) -> None:
+        """Remove a finished tile and apply everything that follows from it."""
+        world, fog = self.world, self.fog
+        tile_type = world.get(tx, ty)
+        if not tile_type:
+            return
+        world.set(tx, ty, None)
+        world.set_id(tx, ty, 0, LAYER_VARIANT)
+        self.fluids.wake(tx, ty)
+        self.light.invalidate(tx, ty)
+        self.npc_paths.invalidate(tx, ty)
+        self.solids.set(tx, ty, False)
+        self.heights.mined(tx, ty)
+        changed = [(tx, ty)]
+        changed += fog.reveal_cave_and_halo(world, tx, ty)
+        for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
+            nx, ny = tx + dx, ty + dy
+            if 0 <= nx < WORLD_WIDTH and 0 <= ny < WORLD_HEIGHT and not world.is_solid(nx, ny) and not fog.is_revealed(nx, ny):
+                changed += fog.reveal_cave(world, nx, ny)
+        self.mark_dirty(changed)
+        if self.track_changes:
+            self.terrain_changes.add((tx, ty))
+            self.map_changes += changed
+        # Give resource
+        item_id = tile_to_item(tile_type)
+        if item_id:
+            self.add_item(item_id, 1)
+        # Tool wear
+        self.apply_tool_wear_on_mine(tile_type)
+        # Skill point progression
+        self.mined_count_for_skill += 1
+        if self.mined_count_for_skill >= 15:
+            self.mined_count_for_skill = 0
+            self.skill_points += 1
+
+    # -- simulation -----------------------------------------------------------
+    def step(self, dt: float, inputs: Inputs) -> None:
+        """Advance the simulation by dt seconds."""
+        prof = self.profiler
+        self.prev_pos = self.player.topleft
+        self.npcs.remember()
+        with prof.scope("stream"):
+            self.stream_around()
+        with prof.scope("clicks"):
+            for wx, wy in inputs.clicks:
+                self.click(wx, wy)
+
+        world = self.world
+        player = self.player
 
         # Horizontal accel/friction
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            vx -= accel * dt
-        elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            vx += accel * dt
-        else:
-            if vx > 0:   vx = max(0.0, vx - friction * dt)
-            elif vx < 0: vx = min(0.0, vx + friction * dt)
-        vx = max(-max_speed, min(max_speed, vx))
-
-        # Jump (coyote)
-        if on_ground: coyote_left = coyote_time
-        else: coyote_left = max(0.0, coyote_left - dt)
-        want_jump = (keys[pygame.K_UP] or keys[pygame.K_w] or keys[pygame.K_SPACE])
-        if want_jump and (on_ground or coyote_left > 0.0):
-            vy = -jump_speed
-            on_ground = False
-            coyote_left = 0.0
-
-        # Gravity
-        vy = min(max_fall, vy + gravity * dt)
-
-        # Move & collide: X
-        new_rect = player.copy()
-        new_rect.x += int(round(vx * dt))
-        x_start, x_end, y_start, y_end = tiles_overlapping_aabb(new_rect)
-        if new_rect.x != player.x:
-            step_right = new_rect.x > player.x
-            collided = False
-            for ty in range(y_start, y_end):
-                for tx in range(x_start, x_end):
-                    if not solid_at(world, tx, ty): continue
-                    tile_rect = pygame.Rect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    if new_rect.colliderect(tile_rect):
-                        collided = True
-                        if step_right: new_rect.right = tile_rect.left
-                        else: new_rect.left = tile_rect.right
-                        vx = 0.0
-                        break
-                if collided: break
-        player.x = new_rect.x
-
-        # Move & collide: Y
-        new_rect = player.copy()
-        new_rect.y += int(round(vy * dt))
-        x_start, x_end, y_start, y_end = tiles_overlapping_aabb(new_rect)
-        on_ground = False
-        if new_rect.y != player.y:
-            step_down = new_rect.y > player.y
-            collided = False
-            for tx in range(x_start, x_end):
-                for ty in range(y_start, y_end):
-                    if not solid_at(world, tx, ty): continue
-                    tile_rect = pygame.Rect(tx * TILE_SIZE, ty * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    if new_rect.colliderect(tile_rect):
-                        collided = True
-                        if step_down:
-                            new_rect.bottom = tile_rect.top
-                            on_ground = True
-                        else:
-                            new_rect.top = tile_rect.bottom
-                        vy = 0.0
-                        break
-                if collided: break
-        player.y = new_rect.y
-
-        # Camera
-        camera_x = max(0, min(player.centerx - SCREEN_WIDTH // 2, WORLD_WIDTH * TILE_SIZE - SCREEN_WIDTH))
-        camera_y = max(0, min(player.centery - SCREEN_HEIGHT // 2, WORLD_HEIGHT * TILE_SIZE - SCREEN_HEIGHT))
+        with prof.scope("movement"):
+            if inputs.left:
+                self.vx -= self.ACCEL * dt
+            elif inputs.right:
+                self.vx += self.ACCEL * dt
+            else:
+                if self.vx > 0:   self.vx = max(0.0, self.vx - self.FRICTION * dt)
+                elif self.vx < 0: self.vx = min(0.0, self.vx + self.FRICTION * dt)
+            self.vx = max(-self.MAX_SPEED, min(self.MAX_SPEED, self.vx))
+
+            # Jump (coyote)
+            if self.on_ground: self.coyote_left = self.COYOTE_TIME
+            else: self.coyote_left = max(0.0, self.coyote_left - dt)
+            if inputs.jump and (self.on_ground or self.coyote_left > 0.0):
+                self.vy = -self.JUMP_SPEED
+                self.on_ground = False
+                self.coyote_left = 0.0
+
+            # Gravity
+            self.vy = min(self.MAX_FALL, self.vy + self.GRAVITY * dt)
+
+        # Move & collide, one axis at a time; the sweep stops at the first
+        # solid tile the box would pass, however far it moves this step
+        solids = self.solids
+        with prof.scope("collision_x"):
+            player.x, hit = solids.sweep_x(player.x, player.y, player.width, player.height,
+                                           int(round(self.vx * dt)))
+            if hit:
+                self.vx = 0.0
+
+        with prof.scope("collision_y"):
+            dy = int(round(self.vy * dt))
+            player.y, hit = solids.sweep_y(player.x, player.y, player.width, player.height, dy)
+            self.on_ground = hit and dy > 0
+            if hit:
+                self.vy = 0.0
 
         # Mining effects update
-        finished_coords = []
-        for (tx, ty), eff in list(mining_effects.items()):
-            if eff.update(dt):
-                if 0 <= tx < WORLD_WIDTH and 0 <= ty < WORLD_HEIGHT and world[tx][ty]:
-                    tile_type = world[tx][ty]
-                    world[tx][ty] = None
-                    reveal_cave_and_halo(revealed, world, tx, ty)
-                    minimap_dirty = True
-                    for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-                        nx, ny = tx + dx, ty + dy
-                        if 0 <= nx < WORLD_WIDTH and 0 <= ny < WORLD_HEIGHT and world[nx][ny] is None and not revealed[nx][ny]:
-                            reveal_cave(revealed, world, nx, ny)
-                    # Give resource
-                    item_id = tile_to_item(tile_type)
-                    if item_id:
-                        add_item(item_id, 1)
-                    minimap_dirty = True
-                    # Tool wear
-                    apply_tool_wear_on_mine(tile_type)
-                    # Skill point progression
-                    mined_count_for_skill += 1
-                    if mined_count_for_skill >= 15:
-                        mined_count_for_skill = 0
-                        skill_points += 1
-                finished_coords.append((tx, ty))
-        for key in finished_coords:
-            mining_effects.pop(key, None)
+        with prof.scope("mining"):
+            finished_coords = []
+            for (tx, ty), eff in list(self.mining_effects.items()):
+                if eff.update(dt):
+                    self.mine_tile(tx, ty)
+                    finished_coords.append((tx, ty))
+            for key in finished_coords:
+                self.mining_effects.pop(key, None)
 
         # Stamina regen (with delay)
-        if stam_regen_cooldown > 0.0:
-            stam_regen_cooldown = max(0.0, stam_regen_cooldown - dt)
-        else:
-            regen = stamina_regen_rate(stam, stam_max)
-            stam = min(stam_max, max(0.0, stam + regen * dt))
+        with prof.scope("regen"):
+            if self.stam_regen_cooldown > 0.0:
+                self.stam_regen_cooldown = max(0.0, self.stam_regen_cooldown - dt)
+            else:
+                regen = stamina_regen_rate(self.stam, self.stam_max)
+                self.stam = min(self.stam_max, max(0.0, self.stam + regen * dt))
 
-        # Health regen (with delay)
-        if hp_regen_cd > 0.0:
-            hp_regen_cd = max(0.0, hp_regen_cd - dt)
-        else:
-            if hp < hp_max:
-                hregen = health_regen_rate(hp, hp_max)
-                hp = min(hp_max, hp + hregen * dt)
-
-        # Darkness for NPC spawning
-        depth_tiles = player.bottom // TILE_SIZE - SURFACE_LEVEL
-        dark_ratio = clamp(depth_tiles / MAX_DARK_DEPTH, 0.0, 1.0)
-        dark_alpha = int(200 * dark_ratio)
-        if lantern_on:
-            dark_alpha = max(0, dark_alpha - LANTERN_BRIGHTNESS)
-
-        # Spawn hostile NPCs only in pitch black
-        if dark_alpha >= PITCH_BLACK_ALPHA and random.random() < NPC_SPAWN_RATE * dt and len(npcs) < 5:
-            sx = player.x + random.randint(-5, 5) * TILE_SIZE
-            sy = player.y + random.randint(-3, 3) * TILE_SIZE
-            if 0 <= sx < WORLD_WIDTH * TILE_SIZE and 0 <= sy < WORLD_HEIGHT * TILE_SIZE:
-                tx, ty = int(sx // TILE_SIZE), int(sy // TILE_SIZE)
-                if world[tx][ty] is None:
-                    npcs.append(HostileNPC(sx, sy))
-
-        # Update NPCs
-        for npc in list(npcs):
-            npc.update(dt, player)
-            if npc.rect.colliderect(player) and npc.attack_cd <= 0.0:
-                take_damage(NPC_CONTACT_DAMAGE)
-                npc.attack_cd = 1.0
-            if not npc.alive():
-                npcs.remove(npc)
-
-        update_fluids(world, fluid_type, fluid_level)
-
-        # Draw world
-        screen.fill(SKY_BLUE)
-        start_x = max(0, camera_x // TILE_SIZE)
-        end_x = min(WORLD_WIDTH, (camera_x + SCREEN_WIDTH) // TILE_SIZE + 1)
-        start_y = max(0, camera_y // TILE_SIZE)
-        end_y = min(WORLD_HEIGHT, (camera_y + SCREEN_HEIGHT) // TILE_SIZE + 1)
-
-        for tx in range(start_x, end_x):
-            for ty in range(start_y, end_y):
-                rect = pygame.Rect(tx * TILE_SIZE - camera_x, ty * TILE_SIZE - camera_y, TILE_SIZE, TILE_SIZE)
-                pygame.draw.rect(screen, background[tx][ty], rect)
-                tile = world[tx][ty]
-                if tile:
-                    surf = pick_variant_surface(tile, tx, ty, tile_variants)
-                    if surf is not None:
-                        screen.blit(surf, rect.topleft)
-                ftype = fluid_type[tx][ty]
-                lvl = fluid_level[tx][ty]
-                if lvl > 0 and ftype:
-                    h = int((lvl / 4.0) * TILE_SIZE)
-                    f_rect = pygame.Rect(rect.left, rect.bottom - h, TILE_SIZE, h)
-                    pygame.draw.rect(screen, FLUID_COLORS.get(ftype, (0,0,255)), f_rect)
-                eff = mining_effects.get((tx, ty))
-                if eff and (ty < SURFACE_LEVEL or revealed[tx][ty]):
+            # Health regen (with delay)
+            if self.hp_regen_cd > 0.0:
+                self.hp_regen_cd = max(0.0, self.hp_regen_cd - dt)
+            else:
+                if self.hp < self.hp_max:
+                    hregen = health_regen_rate(self.hp, self.hp_max)
+                    self.hp = min(self.hp_max, self.hp + hregen * dt)
+
+            # Player light (lantern widens it)
+            self.light.set_source("player", player.centerx // TILE_SIZE, player.centery // TILE_SIZE,
+                                  LANTERN_LIGHT_LEVEL if self.lantern_on else PLAYER_LIGHT_LEVEL)
+
+        # Spawn hostile NPCs only on pitch-black tiles
+        with prof.scope("npc_spawn"):
+            if random.random() < NPC_SPAWN_RATE * dt and len(self.npcs) < NPC_MAX_COUNT:
+                sx = player.x + random.randint(-5, 5) * TILE_SIZE
+                sy = player.y + random.randint(-3, 3) * TILE_SIZE
+                if 0 <= sx < WORLD_WIDTH * TILE_SIZE and 0 <= sy < WORLD_HEIGHT * TILE_SIZE:
+                    tx, ty = int(sx // TILE_SIZE), int(sy // TILE_SIZE)
+                    if not world.is_solid(tx, ty) and self.light.level_at(tx, ty) <= PITCH_BLACK_LEVEL:
+                        # NPCs collide with terrain, so only spawn where the whole body fits
+                        x1, y1 = (sx + NPC_W - 1) // TILE_SIZE, (sy + NPC_H - 1) // TILE_SIZE
+                        if not world.solid_slice(tx, x1 + 1, ty, y1 + 1).any():
+                            self.npcs.spawn(sx, sy)
+
+        # Update NPCs (all at once; the camera follows the player, so LOD is
+        # measured from it).  They follow one shared flow field around the
+        # terrain; contact damage only tests NPCs hashed near the player.
+        with prof.scope("npc_update"):
+            npcs = self.npcs
+            if len(npcs):
+                paths = self.npc_paths
+                ptx, pty = player.centerx // TILE_SIZE, player.centery // TILE_SIZE
+                paths.update(ptx, pty)
+                # NPCs outside the bitmap window would read as walled in; it covers the field
+                solids.ensure(ptx - NPC_PATH_RADIUS, ptx + NPC_PATH_RADIUS, pty - NPC_PATH_RADIUS, pty + NPC_PATH_RADIUS)
+                npcs.update(dt, lambda cx, cy: paths.goals(cx, cy, player.center), player.center,
+                            lambda x, y, dx, dy: solids.move_boxes(x, y, NPC_W, NPC_H, dx, dy))
+            for i in npcs.touching(player.x, player.y, player.width, player.height):
+                if npcs.attack_cd[i] <= 0.0:
+                    self.take_damage(NPC_CONTACT_DAMAGE)
+                    npcs.attack_cd[i] = 1.0
+
+        with prof.scope("fluids"):
+            update_fluids(world, self.fluids)
+            self.light.invalidate_many(lava_glow_changes(self.fluids))
+            self.mark_dirty(self.fluids.changed)
+            if self.track_changes:
+                self.terrain_changes |= self.fluids.changed
+
+        self.time += dt
+        self.steps += 1
+
+    def drawn_player(self, alpha: float) -> pygame.Rect:
+        """The player's box alpha of the way from before the last step to now."""
+        (px, py), p = self.prev_pos, self.player
+        return pygame.Rect(round(px + (p.x - px) * alpha), round(py + (p.y - py) * alpha), p.width, p.height)
+
+# ------------------------------ Rendering -------------------------------------
+def camera_for(player: pygame.Rect, screen_w: int = SCREEN_WIDTH, screen_h: int = SCREEN_HEIGHT) -> tuple[int, int]:
+    camera_x = max(0, min(player.centerx - screen_w // 2, WORLD_WIDTH * TILE_SIZE - screen_w))
+    camera_y = max(0, min(player.centery - screen_h // 2, WORLD_HEIGHT * TILE_SIZE - screen_h))
+    return camera_x, camera_y
+
+class WorldView:
+    """Draws a GameState; owns every render cache and the UI panel toggles."""
+    def __init__(self, screen: pygame.Surface, state: GameState):
+        self.font = pygame.font.SysFont(None, 20)
+        self.big_font = pygame.font.SysFont(None, 24)
+        build_shop_button_ui(screen)
+
+        self.tile_atlas = load_tile_atlas(cache_dir=TILE_CACHE_DIR)
+        self.tile_variants = self.tile_atlas.variants
+        self.terrain = TerrainCache(
+            WORLD_WIDTH, WORLD_HEIGHT, TILE_SIZE,
+            lambda surf, tx, ty, px, py: paint_world_tile(surf, state.world, state.fluids, self.tile_variants, tx, ty, px, py),
+            paint_block=lambda surf, x0, y0, cols, rows: paint_world_block(
+                surf, state.world, state.fluids, self.tile_variants, x0, y0, cols, rows),
+        )
+        self.darkness = DarknessOverlay(TILE_SIZE, MAX_DARK_ALPHA)
+        # Minimap (patched per tile as the world changes)
+        self.minimap = build_minimap(state.world, state.fog.revealed, state.player.centerx // TILE_SIZE)
+        self.minimap_view = MinimapPresenter(self.minimap, (MINIMAP_W, MINIMAP_H), MINIMAP_PAD, MINIMAP_BG)
+
+        self.camera_x, self.camera_y = camera_for(state.player, *screen.get_size())
+        self.lantern_hint = False
+        self.profiler_overlay = ProfilerOverlay(pygame.font.SysFont(None, 18))
+
+        # Panels toggles
+        self.minimap_open = False
+        self.inventory_open = False
+        self.skills_open = False
+
+    def panel_buttons(self, screen: pygame.Surface) -> tuple[pygame.Rect, pygame.Rect]:
+        """Inventory / Skills buttons under the small minimap."""
+        mini_rect = self.minimap_view.small_rect(screen.get_size())
+        btn_w, btn_h, gap = 110, 24, 6
+        inv_btn = pygame.Rect(mini_rect.right - btn_w, mini_rect.bottom + 6, btn_w, btn_h)
+        skl_btn = pygame.Rect(mini_rect.right - btn_w, inv_btn.bottom + gap, btn_w, btn_h)
+        return inv_btn, skl_btn
+
+    def sync(self, state: GameState) -> None:
+        terrain_tiles, map_tiles = state.take_changes()
+        self.terrain.invalidate_many(terrain_tiles)
+        self.minimap.follow(state.world, state.fog.revealed, state.player.centerx // TILE_SIZE)
+        if map_tiles:
+            self.minimap.update_tiles(state.world, state.fog.revealed, map_tiles)
+
+    def draw(self, screen: pygame.Surface, state: GameState, alpha: float = 1.0) -> None:
+        """Draw the state as it was alpha of the way through its last step."""
+        prof = state.profiler
+        with prof.scope("sync"):
+            self.sync(state)
+        font = self.font
+        player, fog = state.drawn_player(alpha), state.fog
+        camera_x, camera_y = self.camera_x, self.camera_y = camera_for(player, *screen.get_size())
+
+        # Draw world (baked terrain chunks, then live mining effects on top)
+        with prof.scope("draw_tiles"):
+            screen.fill(SKY_BLUE)
+            self.terrain.draw(screen, camera_x, camera_y)
+            for (tx, ty), eff in state.mining_effects.items():
+                if ty < SURFACE_LEVEL or fog.is_revealed(tx, ty):
                     eff.draw(screen, camera_x, camera_y)
 
         # NPCs
-        for npc in npcs:
-            npc.draw(screen, camera_x, camera_y)
+        with prof.scope("draw_sprites"):
+            draw_npcs(screen, state.npcs, camera_x, camera_y, alpha)
 
         # Fog
         if not FOG_BLOCKS_PLAYER:
-            draw_fog()
+            with prof.scope("fog"):
+                fog.draw(screen, camera_x, camera_y)
 
-        # Player
-        pygame.draw.rect(
-            screen, (255, 255, 0),
-            pygame.Rect(player.x - camera_x, player.y - camera_y, player.width, player.height)
-        )
+        with prof.scope("draw_sprites"):
+            # Player
+            pygame.draw.rect(
+                screen, (255, 255, 0),
+                pygame.Rect(player.x - camera_x, player.y - camera_y, player.width, player.height)
+            )
 
-        # Bars
-        draw_player_bars(screen, camera_x, camera_y, player, hp, hp_max, stam, stam_max)
+            # Bars
+            draw_player_bars(screen, camera_x, camera_y, player, state.hp, state.hp_max, state.stam, state.stam_max)
 
         if FOG_BLOCKS_PLAYER:
-            draw_fog()
-
-        # Ambient lighting
-        depth_tiles = player.bottom // TILE_SIZE - SURFACE_LEVEL
-        dark_ratio = clamp(depth_tiles / MAX_DARK_DEPTH, 0.0, 1.0)
-        dark_alpha = int(200 * dark_ratio)
-        lantern_hint = dark_alpha >= LANTERN_HINT_ALPHA and not lantern_on
-        if dark_alpha > 0:
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, dark_alpha))
-            radius = LANTERN_LIGHT_RADIUS if lantern_on else LIGHT_RADIUS
-            light = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
-            for r in range(radius, 0, -4):
-                alpha = int(dark_alpha * (r / radius))
-                pygame.draw.circle(light, (0, 0, 0, alpha), (radius, radius), r)
-            px = player.centerx - camera_x
-            py = player.centery - camera_y
-            overlay.blit(light, (px - radius, py - radius), special_flags=pygame.BLEND_RGBA_SUB)
-            screen.blit(overlay, (0, 0))
+            with prof.scope("fog"):
+                fog.draw(screen, camera_x, camera_y)
+
+        # Lighting (tile light grid)
+        with prof.scope("lighting"):
+            ambient_alpha = self.darkness.alpha_for(state.light.ambient_level(player.bottom // TILE_SIZE))
+            self.lantern_hint = ambient_alpha >= LANTERN_HINT_ALPHA and not state.lantern_on
+            self.darkness.draw(screen, state.light, camera_x, camera_y)
 
         # Minimap small + buttons under it
-        mini_rect = draw_minimap_small(screen, minimap)
-        btn_w, btn_h, gap = 110, 24, 6
-        inv_btn = pygame.Rect(mini_rect.right - btn_w, mini_rect.bottom + 6, btn_w, btn_h)
-        skl_btn = pygame.Rect(mini_rect.right - btn_w, inv_btn.bottom + gap, btn_w, btn_h)
-        for rect, text in [(inv_btn, "Inventory (I)"), (skl_btn, "Skills (O)")]:
-            pygame.draw.rect(screen, (22,22,22), rect, border_radius=6)
-            pygame.draw.rect(screen, (90,90,90), rect, 1, border_radius=6)
-            lab = font.render(text, True, (235,235,235))
-            screen.blit(lab, (rect.centerx - lab.get_width()//2, rect.centery - lab.get_height()//2))
+        with prof.scope("minimap"):
+            self.minimap_view.draw_small(screen)
+            for rect, text in zip(self.panel_buttons(screen), ["Inventory (I)", "Skills (O)"]):
+                pygame.draw.rect(screen, (22,22,22), rect, border_radius=6)
+                pygame.draw.rect(screen, (90,90,90), rect, 1, border_radius=6)
+                lab = font.render(text, True, (235,235,235))
+                screen.blit(lab, (rect.centerx - lab.get_width()//2, rect.centery - lab.get_height()//2))
+
+        with prof.scope("ui"):
+            # Cached GUI (Shop button)
+            if SHOP_UI_SURF is not None:
+                screen.blit(SHOP_UI_SURF, (0, 0))
+            # Coins text to the right of Shop button (dynamic)
+            coin_rect = pygame.Rect(SHOP_BTN_RECT.right + 8, SHOP_BTN_RECT.y, 180, SHOP_BTN_RECT.height)
+            c_txt = self.big_font.render(f"Coins: {state.coins}", True, (245, 230, 120))
+            screen.blit(c_txt, (coin_rect.x, coin_rect.y + (coin_rect.height - c_txt.get_height())//2))
+
+            # Hotbar (always)
+            draw_hotbar(screen, font, state.hotbar, state.selected_slot, state.accessory_item, state.lantern_on, self.lantern_hint)
+
+            # Panels
+            self.draw_panels(screen, state)
+
+        if self.minimap_open:
+            with prof.scope("minimap"):
+                self.minimap_view.draw_big(screen)
+
+        # Frame-phase profiler (F3)
+        if prof.enabled:
+            self.profiler_overlay.draw(screen, prof)
+
+    def draw_panels(self, screen: pygame.Surface, state: GameState):
+        inv_cells, tool_cells = draw_inventory(screen, self.font, state.inventory, state.tools_owned, state.armor_items,
+                                               state.accessory_item, state.selected_slot, self.inventory_open, state.strength_lvl)
+        skill_clicks = draw_skills(screen, self.font, self.skills_open, state.strength_lvl, state.endurance_lvl,
+                                   state.speed_lvl, state.skill_points)
+        return inv_cells, tool_cells, skill_clicks
+
+# ---------------------------------- Main --------------------------------------
+def visit_shop(screen: pygame.Surface, state: GameState) -> None:
+    """Teleport into the shop scene (buying is only allowed there) and back."""
+    if run_shop is None:
+        print("[world] Shop not available (shop_scene.py missing).")
+        return
+    # Try flexible signatures for state handoff
+    try:
+        returned = run_shop(screen, state.coins, state.inventory, state.tools_owned, state.armor_items)
+    except TypeError:
+        # fall back to legacy signature
+        run_shop(screen)
+    else:
+        state.apply_shop_result(returned)
+    # On return, snap safely to surface and rebuild cached UI
+    state.place_on_surface()
+    build_shop_button_ui(screen)
+
+def handle_ui_click(screen: pygame.Surface, state: GameState, view: WorldView, mx: int, my: int) -> bool:
+    """Clicks on buttons and open panels. Returns True if the click was used up."""
+    if SHOP_BTN_RECT.collidepoint(mx, my):
+        visit_shop(screen, state)
+        return True
+
+    inv_btn, skl_btn = view.panel_buttons(screen)
+    if inv_btn.collidepoint(mx, my):
+        view.inventory_open = not view.inventory_open
+        return True
+    if skl_btn.collidepoint(mx, my):
+        view.skills_open = not view.skills_open
+        return True
 
-        # Cached GUI (Shop button)
-        if SHOP_UI_SURF is not None:
-            screen.blit(SHOP_UI_SURF, (0, 0))
-        # Coins text to the right of Shop button (dynamic)
-        coin_rect = pygame.Rect(SHOP_BTN_RECT.right + 8, SHOP_BTN_RECT.y, 180, SHOP_BTN_RECT.height)
-        c_txt = big_font.render(f"Coins: {coins}", True, (245, 230, 120))
-        screen.blit(c_txt, (coin_rect.x, coin_rect.y + (coin_rect.height - c_txt.get_height())//2))
+    # Inventory / Skills panel clicks (tools & item cells)
+    inv_cells, tool_cells, skill_clicks = view.draw_panels(screen, state)
+    if view.inventory_open:
+        for cell_rect, tool_id in tool_cells:
+            if cell_rect.collidepoint(mx, my):
+                state.hotbar[state.selected_slot] = tool_id
+                return True
+    if view.skills_open and skill_clicks:
+        for skill in ("str", "end", "spd"):
+            rect = skill_clicks.get(skill)
+            if rect and rect.collidepoint(mx, my) and state.skill_points > 0:
+                return state.spend_skill_point(skill)
+    return False
+
+def new_or_saved_state(save_path: str | None, new_world: bool = False, track_changes: bool = True,
+                       gen_workers: int = 0) -> GameState:
+    """Resume from save_path when it exists (unless new_world), else generate a world."""
+    if save_path and not new_world and os.path.exists(save_path):
+        try:
+            state = GameState.load(save_path, track_changes, gen_workers)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[world] Could not load {save_path}: {e}; generating a new world.")
+        else:
+            print(f"[world] Loaded {save_path}")
+            return state
+    return GameState(track_changes, gen_workers=gen_workers)
 
-        # Hotbar (always)
-        draw_hotbar(screen, font, hotbar, selected_slot, accessory_item, lantern_on, lantern_hint)
+def main(save_path: str | None = SAVE_PATH, new_world: bool = False, gen_workers: int = DEFAULT_WORKERS,
+         fps: int = RENDER_FPS):
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    clock = pygame.time.Clock()
+    # The simulation runs in fixed steps of SIM_DT whatever the frame rate;
+    # frames draw between the last two steps
+    stepper = FixedTimestep(SIM_DT)
 
-        # Panels
-        inv_cells, tool_cells = draw_inventory(screen, font, inventory, tools_owned, armor_items, accessory_item, selected_slot, inventory_open, strength_lvl)
-        skill_clicks = draw_skills(screen, font, skills_open, strength_lvl, endurance_lvl, speed_lvl, skill_points)
+    state = new_or_saved_state(save_path, new_world, gen_workers=gen_workers)
+    view = WorldView(screen, state)
+    prof = state.profiler
+    saver = AutoSaver(save_path, needs_full=state.loaded_from != save_path) if save_path else None
 
-        pygame.display.flip()
+    clicks: list[tuple[int, int]] = []     # held until the next step runs
+    running = True
+    while running:
+        dt = clock.tick(fps) / 1000.0
+        prof.begin_frame()
+
+        with prof.scope("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+                elif event.type == pygame.KEYDOWN:
+                    if event.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4):
+                        state.selected_slot = {pygame.K_1:0, pygame.K_2:1, pygame.K_3:2, pygame.K_4:3}[event.key]
+                    elif event.key == pygame.K_i:
+                        view.inventory_open = not view.inventory_open
+                    elif event.key == pygame.K_o:
+                        view.skills_open = not view.skills_open
+                    elif event.key == pygame.K_m:
+                        view.minimap_open = not view.minimap_open
+                    elif event.key == pygame.K_h:
+                        state.take_damage(12.0)
+                    elif event.key == pygame.K_q:
+                        state.toggle_lantern()
+                    elif event.key == pygame.K_b:
+                        visit_shop(screen, state)
+                    elif event.key == pygame.K_F3:
+                        prof.toggle()
+                    elif event.key == pygame.K_F5 and saver:
+                        saver.submit(state.snapshot(full=saver.needs_full))
+                        print(f"[world] Saving {save_path}")
+
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    mx, my = pygame.mouse.get_pos()
+                    if not handle_ui_click(screen, state, view, mx, my):
+                        # Attack NPCs / mine, resolved by the simulation
+                        clicks.append((mx + view.camera_x, my + view.camera_y))
 
+        keys = pygame.key.get_pressed()
+        for _ in range(stepper.advance(dt)):
+            state.step(SIM_DT, Inputs.from_keys(keys, clicks))
+            clicks = []
+        if saver and saver.due(dt):
+            with prof.scope("autosave"):
+                saver.submit(state.snapshot(full=saver.needs_full))
+
+        view.draw(screen, state, stepper.alpha)
+        with prof.scope("flip"):
+            pygame.display.flip()
+        prof.end_frame()
+
+    if saver:
+        saver.submit(state.snapshot(full=saver.needs_full))
+        saver.close()
+    state.close()
     pygame.quit()
 
+# ------------------------------ Headless mode ---------------------------------
+def configure_world(width: int | None = None, height: int | None = None, seed: int | None = None) -> None:
+    """Override world size / seed before a GameState is created."""
+    global WORLD_WIDTH, WORLD_HEIGHT, WORLD_SEED
+    if width is not None:
+        WORLD_WIDTH = int(width)
+    if height is not None:
+        WORLD_HEIGHT = int(height)
+    if seed is not None:
+        WORLD_SEED = int(seed)
+        random.seed(seed)
+
+def wander_inputs(state: GameState, step_idx: int) -> Inputs:
+    """Scripted player for soak tests: walks back and forth, hops and digs ahead."""
+    going_right = (step_idx // 600) % 2 == 0
+    inputs = Inputs(left=not going_right, right=going_right, jump=step_idx % 90 == 0)
+    if step_idx % 20 == 0:
+        p = state.player
+        ahead = p.right + TILE_SIZE // 2 if going_right else p.left - TILE_SIZE // 2
+        inputs.clicks.append((ahead, p.bottom + TILE_SIZE // 2))
+    return inputs
+
+def run_headless(steps: int, dt: float = SIM_DT, bot: bool = True,
+                 state: GameState | None = None) -> GameState:
+    """Run the simulation uncapped with no window. Returns the final state."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    if state is None:
+        state = GameState(track_changes=False)
+    for i in range(steps):
+        state.step(dt, wander_inputs(state, i) if bot else Inputs())
+    return state
+
+def headless_main(args) -> None:
+    configure_world(args.width, args.height, args.seed)
+    save_path = None if args.no_save else args.save_file
+    state = new_or_saved_state(save_path, args.new, track_changes=False, gen_workers=args.gen_workers or 0)
+    t0 = time.perf_counter()
+    run_headless(args.steps, args.dt, bot=not args.idle, state=state)
+    elapsed = time.perf_counter() - t0
+    if save_path:
+        state.save(save_path)
+    state.close()
+    print(f"[headless] {WORLD_WIDTH}x{WORLD_HEIGHT} seed={WORLD_SEED}: {state.steps} steps "
+          f"({state.time:.1f}s simulated) in {elapsed:.2f}s wall, "
+          f"{elapsed / max(1, state.steps) * 1000:.3f} ms/step")
+    print(f"[headless] hp={state.hp:.0f} stam={state.stam:.0f} npcs={len(state.npcs)} "
+          f"items={total_items(state.inventory)} active_fluid_cells={state.fluids.active_count()}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Digsim platformer")
+    parser.add_argument("--headless", action="store_true", help="run the simulation without a window, uncapped")
+    parser.add_argument("--steps", type=int, default=3600, help="headless: number of simulation steps")
+    parser.add_argument("--dt", type=float, default=SIM_DT, help="headless: seconds per step")
+    parser.add_argument("--idle", action="store_true", help="headless: no scripted player input")
+    parser.add_argument("--width", type=int, default=None, help="world width in tiles")
+    parser.add_argument("--height", type=int, default=None, help="world height in tiles")
+    parser.add_argument("--seed", type=int, default=None, help="world seed")
+    parser.add_argument("--save-file", default=None,
+                        help=f"save to resume from and write on quit / F5 (windowed default: {SAVE_PATH})")
+    parser.add_argument("--new", action="store_true", help="ignore an existing save and generate a new world")
+    parser.add_argument("--no-save", action="store_true", help="neither load nor write a save")
+    parser.add_argument("--gen-workers", type=int, default=None,
+                        help=f"processes generating chunks, 0 = main thread (default: {DEFAULT_WORKERS} windowed, 0 headless)")
+    parser.add_argument("--fps", type=int, default=RENDER_FPS,
+                        help=f"windowed: frame rate cap; the simulation always steps at {SIM_HZ} Hz")
+    return parser.parse_args(argv)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    _args = parse_args()
+    if _args.headless:
+        headless_main(_args)
+    else:
+        configure_world(_args.width, _args.height, _args.seed)
+        main(None if _args.no_save else (_args.save_file or SAVE_PATH), _args.new,
+             DEFAULT_WORKERS if _args.gen_workers is None else _args.gen_workers, _args.fps)
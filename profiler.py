@@ -0,0 +1,155 @@
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import pygame
+
+# ---------- Frame-phase profiler ----------
+#
+# Code marks phases with ``with profiler.scope("name"):``.  While the profiler
+# is disabled scope() hands back one shared no-op context, so instrumented
+# code costs a method call per phase and nothing else.  While enabled, each
+# frame's per-phase milliseconds are kept for the last HISTORY_FRAMES frames.
+
+HISTORY_FRAMES = 240
+REFRESH_FRAMES = 15          # overlay text is re-rendered this often
+GRAPH_BUDGET_MS = 1000.0 / 60.0
+
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ("acc", "name", "t0")
+
+    def __init__(self, acc: Dict[str, float], name: str):
+        self.acc = acc
+        self.name = name
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        acc = self.acc
+        acc[self.name] = acc.get(self.name, 0.0) + (time.perf_counter() - self.t0) * 1000.0
+        return False
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    i = min(len(sorted_samples) - 1, int(round(q / 100.0 * (len(sorted_samples) - 1))))
+    return sorted_samples[i]
+
+
+class FrameProfiler:
+    def __init__(self, history: int = HISTORY_FRAMES):
+        self.enabled = False
+        self.history = history
+        self.phases: Dict[str, Deque[float]] = {}    # first-seen order
+        self.frame_ms: Deque[float] = deque(maxlen=history)
+        self._acc: Dict[str, float] = {}
+        self._scopes: Dict[str, _Scope] = {}
+        self._frame_t0: Optional[float] = None
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        self.reset()
+
+    def reset(self) -> None:
+        self.phases.clear()
+        self.frame_ms.clear()
+        self._acc.clear()
+        self._frame_t0 = None
+
+    def scope(self, name: str):
+        """Context manager timing one phase; repeated scopes in a frame add up."""
+        if not self.enabled:
+            return _NULL_SCOPE
+        s = self._scopes.get(name)
+        if s is None:
+            s = self._scopes[name] = _Scope(self._acc, name)
+        return s
+
+    def begin_frame(self) -> None:
+        if self.enabled:
+            self._acc.clear()
+            self._frame_t0 = time.perf_counter()
+
+    def end_frame(self) -> None:
+        if not self.enabled or self._frame_t0 is None:
+            return
+        self.frame_ms.append((time.perf_counter() - self._frame_t0) * 1000.0)
+        for name in self._acc:
+            if name not in self.phases:
+                self.phases[name] = deque(maxlen=self.history)
+        for name, samples in self.phases.items():
+            samples.append(self._acc.get(name, 0.0))
+        self._frame_t0 = None
+
+    def summary(self) -> List[Tuple[str, float, float, float]]:
+        """(phase, last, p50, p99) in ms for every phase, then 'frame'."""
+        rows = []
+        for name, samples in list(self.phases.items()) + [("frame", self.frame_ms)]:
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            rows.append((name, samples[-1], _percentile(ordered, 50), _percentile(ordered, 99)))
+        return rows
+
+
+class ProfilerOverlay:
+    """Per-phase table plus a frame-time graph, drawn in the top-left corner."""
+
+    def __init__(self, font: pygame.font.Font, pos: Tuple[int, int] = (10, 48)):
+        self.font = font
+        self.pos = pos
+        self._table: Optional[pygame.Surface] = None
+        self._frames_since = REFRESH_FRAMES
+
+    def _render_table(self, profiler: FrameProfiler) -> pygame.Surface:
+        rows = [("phase", "ms", "p50", "p99")]
+        for name, last, p50, p99 in profiler.summary():
+            rows.append((name, f"{last:.2f}", f"{p50:.2f}", f"{p99:.2f}"))
+        # Columns are placed explicitly so proportional fonts still line up.
+        col_x = (6, 100, 150, 200)
+        line_h = self.font.get_linesize()
+        surf = pygame.Surface((HISTORY_FRAMES + 12, line_h * len(rows) + 8), pygame.SRCALPHA)
+        surf.fill((0, 0, 0, 170))
+        for i, row in enumerate(rows):
+            for j, text in enumerate(row):
+                s = self.font.render(text, True, (235, 235, 235))
+                x = col_x[j] if j == 0 else col_x[j] + 44 - s.get_width()   # numbers right-aligned
+                surf.blit(s, (x, 4 + i * line_h))
+        return surf
+
+    def draw(self, screen: pygame.Surface, profiler: FrameProfiler) -> None:
+        self._frames_since += 1
+        if self._table is None or self._frames_since >= REFRESH_FRAMES:
+            self._table = self._render_table(profiler)
+            self._frames_since = 0
+        x, y = self.pos
+        screen.blit(self._table, (x, y))
+
+        # Frame-time graph: one column per frame, budget line at 16.7 ms
+        gx, gy = x, y + self._table.get_height() + 4
+        gw, gh = self._table.get_width(), 60
+        scale = gh / (2.0 * GRAPH_BUDGET_MS)
+        pygame.draw.rect(screen, (0, 0, 0), (gx, gy, gw, gh))
+        for i, ms in enumerate(profiler.frame_ms):
+            h = min(gh, int(ms * scale))
+            color = (90, 200, 90) if ms <= GRAPH_BUDGET_MS else (220, 80, 60)
+            pygame.draw.line(screen, color, (gx + 6 + i, gy + gh - 1), (gx + 6 + i, gy + gh - h))
+        budget_y = gy + gh - int(GRAPH_BUDGET_MS * scale)
+        pygame.draw.line(screen, (230, 230, 120), (gx, budget_y), (gx + gw - 1, budget_y))
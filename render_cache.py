@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import pygame
+
+# ---------- Baked terrain chunks for the world draw pass ----------
+#
+# Terrain (background, tile variant, fluid overlay) changes rarely, so each
+# square of RENDER_CHUNK_TILES x RENDER_CHUNK_TILES tiles is painted once into
+# its own Surface and the draw pass only blits the chunks on screen.  Editing
+# a tile marks it pending; the next draw repaints just those tiles in place.
+# A ``paint_block`` callable, if given, bakes a whole chunk in one call so it
+# can read the world a region at a time instead of tile by tile.
+
+RENDER_CHUNK_TILES = 16
+MAX_BAKED_CHUNKS = 24
+
+# paint_tile(surface, tx, ty, px, py): draw world tile (tx, ty) at (px, py)
+PaintTile = Callable[[pygame.Surface, int, int, int, int], None]
+# paint_block(surface, x0, y0, cols, rows): draw tiles [x0, x0 + cols) x [y0, y0 + rows) at (0, 0)
+PaintBlock = Callable[[pygame.Surface, int, int, int, int], None]
+
+
+class TerrainCache:
+    def __init__(self, world_w: int, world_h: int, tile_size: int, paint_tile: PaintTile,
+                 chunk_tiles: int = RENDER_CHUNK_TILES, max_chunks: int = MAX_BAKED_CHUNKS,
+                 paint_block: Optional[PaintBlock] = None):
+        self.world_w = world_w
+        self.world_h = world_h
+        self.tile_size = tile_size
+        self.paint_tile = paint_tile
+        self.paint_block = paint_block
+        self.chunk_tiles = chunk_tiles
+        self.max_chunks = max_chunks
+        self._surfaces: "OrderedDict[Tuple[int, int], pygame.Surface]" = OrderedDict()
+        self._pending: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+
+    # -- invalidation -----------------------------------------------------
+    def invalidate(self, tx: int, ty: int) -> None:
+        """Repaint tile (tx, ty) before its chunk is next drawn."""
+        key = (tx // self.chunk_tiles, ty // self.chunk_tiles)
+        if key in self._surfaces:
+            self._pending.setdefault(key, set()).add((tx, ty))
+
+    def invalidate_many(self, tiles) -> None:
+        for tx, ty in tiles:
+            self.invalidate(tx, ty)
+
+    # -- baking -----------------------------------------------------------
+    def _bake(self, cx: int, cy: int, screen: pygame.Surface) -> pygame.Surface:
+        n, ts = self.chunk_tiles, self.tile_size
+        x0, y0 = cx * n, cy * n
+        cols = min(n, self.world_w - x0)
+        rows = min(n, self.world_h - y0)
+        surf = pygame.Surface((cols * ts, rows * ts), 0, screen)
+        if self.paint_block is not None:
+            self.paint_block(surf, x0, y0, cols, rows)
+            return surf
+        for tx in range(x0, x0 + cols):
+            for ty in range(y0, y0 + rows):
+                self.paint_tile(surf, tx, ty, (tx - x0) * ts, (ty - y0) * ts)
+        return surf
+
+    def _chunk_surface(self, cx: int, cy: int, screen: pygame.Surface) -> pygame.Surface:
+        key = (cx, cy)
+        surf = self._surfaces.get(key)
+        if surf is None:
+            surf = self._bake(cx, cy, screen)
+            self._surfaces[key] = surf
+            self._pending.pop(key, None)
+            while len(self._surfaces) > self.max_chunks:
+                old, _ = self._surfaces.popitem(last=False)
+                self._pending.pop(old, None)
+            return surf
+        self._surfaces.move_to_end(key)
+        tiles = self._pending.pop(key, None)
+        if tiles:
+            n, ts = self.chunk_tiles, self.tile_size
+            for tx, ty in tiles:
+                self.paint_tile(surf, tx, ty, (tx - cx * n) * ts, (ty - cy * n) * ts)
+        return surf
+
+    # -- drawing ----------------------------------------------------------
+    def draw(self, screen: pygame.Surface, camera_x: int, camera_y: int) -> None:
+        sw, sh = screen.get_size()
+        span = self.chunk_tiles * self.tile_size
+        cx0 = max(0, camera_x // span)
+        cy0 = max(0, camera_y // span)
+        cx1 = min((self.world_w - 1) // self.chunk_tiles, (camera_x + sw - 1) // span)
+        cy1 = min((self.world_h - 1) // self.chunk_tiles, (camera_y + sh - 1) // span)
+        blits = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                surf = self._chunk_surface(cx, cy, screen)
+                blits.append((surf, (cx * span - camera_x, cy * span - camera_y)))
+        screen.blits(blits, False)
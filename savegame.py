@@ -0,0 +1,261 @@
+import json
+import os
+import struct
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from world_store import NUM_LAYERS
+
+# ---------- Save files ----------
+#
+# One file, fixed-width records, so the chunk data can be memory-mapped:
+#
+#   [0, HEADER_BYTES)   magic, version, JSON length, JSON header (space padded):
+#                       world size, chunk size, tile/fluid names, seed, record
+#                       and slot counts and the caller's player/inventory state
+#   slots               n_slots record-sized slots; each holds a WorldStore
+#                       chunk array (NUM_LAYERS, C, C) uint8, i.e. tiles,
+#                       backgrounds, fog, fluids and tile variants, or is
+#                       unused (a superseded record or an old index)
+#   index               int32 (n_records, 3): (cx, cy, slot) of each chunk
+#
+# Only chunks that differ from what the world generator makes for the seed
+# are stored; every other chunk is generated again when it is needed.  A save
+# therefore grows with what the player changed, not with the world size.
+# Opening one reads the header and index and maps the slots; chunks are
+# copied out of the map only when the world first touches them.
+#
+# A full write builds a new file beside the save and replaces it.  A partial
+# write only appends: the changed chunks go into fresh slots after the
+# current index, the new index follows them, and once both are on disk the
+# header is rewritten to point at it.  Until that last write the old header
+# and index still describe the old save, so a crash or a full disk leaves it
+# intact, and bytes a loaded save has mapped are never written.  The slots
+# left behind are reclaimed by compact_save(), which runs before a save is
+# opened.
+
+SAVE_MAGIC = b"DIGSAVE\0"
+SAVE_VERSION = 4
+HEADER_BYTES = 64 * 1024
+INDEX_COLUMNS = 3       # cx, cy, slot
+
+_PREFIX = struct.Struct("<8sII")    # magic, version, JSON length
+
+ChunkKey = Tuple[int, int]
+
+
+class SaveLayout:
+    """Byte offsets of every section for one chunk size."""
+
+    def __init__(self, width: int, height: int, chunk_size: int):
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.chunks_x = (width + chunk_size - 1) // chunk_size
+        self.chunks_y = (height + chunk_size - 1) // chunk_size
+        self.record_shape = (NUM_LAYERS, chunk_size, chunk_size)
+        self.record_bytes = NUM_LAYERS * chunk_size * chunk_size
+        self.records_offset = HEADER_BYTES
+
+    def record_offset(self, slot: int) -> int:
+        return self.records_offset + slot * self.record_bytes
+
+    def index_offset(self, n_slots: int) -> int:
+        return self.records_offset + n_slots * self.record_bytes
+
+    def index_slots(self, n_records: int) -> int:
+        """Slots an index of n_records entries spans (rounded up)."""
+        return -(-n_records * INDEX_COLUMNS * 4 // self.record_bytes)
+
+
+def encode_header(layout: SaveLayout, tile_names, fluid_names, seed: int,
+                  n_records: int, n_slots: int, state: Dict[str, Any]) -> bytes:
+    header = {
+        "width": layout.width,
+        "height": layout.height,
+        "chunk_size": layout.chunk_size,
+        "tile_names": list(tile_names),
+        "fluid_names": list(fluid_names),
+        "seed": int(seed),
+        "n_records": int(n_records),
+        "n_slots": int(n_slots),
+        "state": state,
+    }
+    body = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    if _PREFIX.size + len(body) > HEADER_BYTES:
+        raise ValueError(f"save header is {len(body)} bytes; at most {HEADER_BYTES - _PREFIX.size} fit")
+    raw = _PREFIX.pack(SAVE_MAGIC, SAVE_VERSION, len(body)) + body
+    return raw + b" " * (HEADER_BYTES - len(raw))
+
+
+def read_header(f, path: str) -> Dict[str, Any]:
+    """Parse the header at the start of open file ``f``."""
+    prefix = f.read(_PREFIX.size)
+    if len(prefix) < _PREFIX.size:
+        raise ValueError(f"{path}: not a Digsim save")
+    magic, version, n = _PREFIX.unpack(prefix)
+    if magic != SAVE_MAGIC:
+        raise ValueError(f"{path}: not a Digsim save")
+    if version != SAVE_VERSION:
+        raise ValueError(f"{path}: save version {version}, expected {SAVE_VERSION}")
+    return json.loads(f.read(n).decode("utf-8"))
+
+
+def read_index(f, layout: SaveLayout, header: Dict[str, Any]) -> Dict[ChunkKey, int]:
+    """(cx, cy) -> slot for the records of open file ``f``."""
+    n = header["n_records"]
+    if not n:
+        return {}
+    f.seek(layout.index_offset(header["n_slots"]))
+    index = np.frombuffer(f.read(n * INDEX_COLUMNS * 4), dtype=np.int32).reshape(-1, INDEX_COLUMNS)
+    return {(int(cx), int(cy)): int(slot) for cx, cy, slot in index}
+
+
+def encode_index(slots: Dict[ChunkKey, int]) -> bytes:
+    index = np.zeros((len(slots), INDEX_COLUMNS), dtype=np.int32)
+    for row, ((cx, cy), slot) in enumerate(slots.items()):
+        index[row] = cx, cy, slot
+    return index.tobytes()
+
+
+class SaveSnapshot:
+    """Copies of everything one save write needs, safe to hand to another thread.
+
+    ``chunks`` maps (cx, cy) to a chunk array.  A full snapshot holds every
+    stored chunk and creates the file from scratch; the others are appended
+    to an existing save.
+    """
+
+    def __init__(self, layout: SaveLayout, tile_names, fluid_names, seed: int,
+                 state: Dict[str, Any], chunks: Dict[ChunkKey, np.ndarray], full: bool):
+        self.layout = layout
+        self.tile_names = tuple(tile_names)
+        self.fluid_names = tuple(fluid_names)
+        self.seed = seed
+        self.state = state
+        self.chunks = chunks
+        self.full = full
+
+
+def take_snapshot(world, fluids, seed: int, state: Dict[str, Any], keys: Iterable[ChunkKey],
+                  full: bool = False,
+                  chunk_of: Optional[Callable[[int, int], Optional[np.ndarray]]] = None) -> SaveSnapshot:
+    """Copy the given chunks; ``chunk_of(cx, cy)`` finds them (default: world.find_chunk)."""
+    layout = SaveLayout(world.width, world.height, world.chunk_size)
+    chunk_of = chunk_of or world.find_chunk
+    chunks = {}
+    for cx, cy in keys:
+        if not (0 <= cx < layout.chunks_x and 0 <= cy < layout.chunks_y):
+            continue
+        ch = chunk_of(cx, cy)
+        if ch is not None:
+            chunks[(cx, cy)] = ch.copy()
+    return SaveSnapshot(layout, world.names[1:], fluids.names[1:], seed, state, chunks, full)
+
+
+def _sync(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _write_full(path: str, snap: SaveSnapshot) -> None:
+    lay = snap.layout
+    slots = {key: slot for slot, key in enumerate(snap.chunks)}
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(encode_header(lay, snap.tile_names, snap.fluid_names, snap.seed, len(slots), len(slots), snap.state))
+        for ch in snap.chunks.values():
+            f.write(np.ascontiguousarray(ch, dtype=np.uint8).tobytes())
+        f.write(encode_index(slots))
+        _sync(f)
+    os.replace(tmp, path)
+
+
+def _append(path: str, snap: SaveSnapshot) -> None:
+    lay = snap.layout
+    with open(path, "r+b") as f:
+        header = read_header(f, path)
+        slots = read_index(f, lay, header)
+        n_slots = header["n_slots"]
+        if snap.chunks:
+            # New records start past the current index, which stays readable
+            slot = n_slots + lay.index_slots(len(slots))
+            f.seek(lay.record_offset(slot))
+            for key, ch in snap.chunks.items():
+                f.write(np.ascontiguousarray(ch, dtype=np.uint8).tobytes())
+                slots[key] = slot
+                slot += 1
+            n_slots = slot
+            f.write(encode_index(slots))
+            _sync(f)
+        # Header last: it switches the save over to the new index
+        f.seek(0)
+        f.write(encode_header(lay, snap.tile_names, snap.fluid_names, snap.seed, len(slots), n_slots, snap.state))
+        _sync(f)
+
+
+def write_snapshot(path: str, snap: SaveSnapshot) -> None:
+    """Write a snapshot without ever leaving a broken save: a full one replaces the file, others append to it."""
+    if snap.full:
+        _write_full(path, snap)
+    else:
+        _append(path, snap)
+
+
+def compact_save(path: str) -> bool:
+    """Rewrite the save without unused slots if they outnumber the records; True if it did.
+
+    The file is replaced, so call this before the save is opened (a mapped
+    file cannot be replaced on every platform).
+    """
+    with open(path, "rb") as f:
+        h = read_header(f, path)
+        lay = SaveLayout(h["width"], h["height"], h["chunk_size"])
+        slots = read_index(f, lay, h)
+        if h["n_slots"] - len(slots) <= len(slots):
+            return False
+        chunks = {}
+        for key, slot in slots.items():
+            f.seek(lay.record_offset(slot))
+            chunks[key] = np.frombuffer(f.read(lay.record_bytes), dtype=np.uint8).reshape(lay.record_shape)
+    _write_full(path, SaveSnapshot(lay, h["tile_names"], h["fluid_names"], h["seed"], h["state"], chunks, True))
+    return True
+
+
+class SaveFile:
+    """An opened save: parsed header, chunk index and a memory map over the records."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header: Dict[str, Any] = read_header(f, path)
+            h = self.header
+            self.layout = SaveLayout(h["width"], h["height"], h["chunk_size"])
+            self.slots = read_index(f, self.layout, h)
+        self.width, self.height = h["width"], h["height"]
+        self.tile_names: Tuple[str, ...] = tuple(h["tile_names"])
+        self.fluid_names: Tuple[str, ...] = tuple(h["fluid_names"])
+        self.seed: int = h["seed"]
+        self.state: Dict[str, Any] = h["state"]
+        self._records = None
+        if self.slots:
+            self._records = np.memmap(path, dtype=np.uint8, mode="r", offset=self.layout.records_offset,
+                                      shape=(h["n_slots"],) + self.layout.record_shape)
+
+    def keys(self) -> Iterable[ChunkKey]:
+        return self.slots.keys()
+
+    def chunk(self, cx: int, cy: int) -> Optional[np.ndarray]:
+        """Private copy of one stored chunk, or None if the save does not hold it."""
+        slot = self.slots.get((cx, cy))
+        if slot is None:
+            return None
+        return np.array(self._records[slot])
+
+    def check(self, world, fluid_names) -> None:
+        """Raise ValueError unless ``world`` and the fluid set match what was saved."""
+        if tuple(world.names[1:]) != self.tile_names or tuple(fluid_names) != self.fluid_names:
+            raise ValueError(f"{self.path}: saved with a different tile or fluid set")
+        if (world.width, world.height, world.chunk_size) != (self.width, self.height, self.layout.chunk_size):
+            raise ValueError(f"{self.path}: world size does not match")
@@ -0,0 +1,86 @@
+from typing import Dict, Hashable, List, Tuple
+
+# ---------- Uniform-grid spatial hash ----------
+#
+# Entities are kept in every grid cell their box overlaps.  Moving one only
+# touches the hash when it crosses a cell border, and a lookup visits just
+# the cells it covers, so hit-tests cost the same with five entities or five
+# hundred.  The hash stores no boxes: callers keep them and do the exact
+# overlap test on the candidates.  Boxes are integer pixels,
+# [x, x + w) x [y, y + h), matching pygame.Rect.  Cells keep insertion order,
+# so lookups are deterministic.
+
+Cell = Tuple[int, int]
+Box = Tuple[int, int, int, int]     # x, y, w, h
+
+
+class SpatialHash:
+    def __init__(self, cell_size: int):
+        self.cell_size = int(cell_size)
+        self._cells: Dict[Cell, Dict[Hashable, None]] = {}
+        self._spans: Dict[Hashable, Box] = {}    # cx0, cy0, cx1, cy1 (inclusive)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __contains__(self, obj: Hashable) -> bool:
+        return obj in self._spans
+
+    def _span(self, x: int, y: int, w: int, h: int) -> Box:
+        c = self.cell_size
+        return x // c, y // c, (x + max(1, w) - 1) // c, (y + max(1, h) - 1) // c
+
+    # -- edits ------------------------------------------------------------
+    def update(self, obj: Hashable, x: int, y: int, w: int, h: int) -> None:
+        """Insert ``obj`` or move it to box (x, y, w, h)."""
+        span = self._span(x, y, w, h)
+        old = self._spans.get(obj)
+        if old == span:
+            return
+        if old is not None:
+            self._unlink(obj, old)
+        self._spans[obj] = span
+        cells = self._cells
+        cx0, cy0, cx1, cy1 = span
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is None:
+                    bucket = cells[(cx, cy)] = {}
+                bucket[obj] = None
+
+    def remove(self, obj: Hashable) -> None:
+        span = self._spans.pop(obj, None)
+        if span is None:
+            return
+        self._unlink(obj, span)
+
+    def _unlink(self, obj: Hashable, span: Box) -> None:
+        cells = self._cells
+        cx0, cy0, cx1, cy1 = span
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.pop(obj, None)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._spans.clear()
+
+    # -- queries ----------------------------------------------------------
+    def candidates(self, qx: int, qy: int, qw: int, qh: int) -> List[Hashable]:
+        """Entities in the cells (qx, qy, qw, qh) covers, each once, without the exact overlap test."""
+        cells = self._cells
+        cx0, cy0, cx1, cy1 = self._span(qx, qy, qw, qh)
+        if cx0 == cx1 and cy0 == cy1:
+            return list(cells.get((cx0, cy0), ()))
+        found: Dict[Hashable, None] = {}
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        return list(found)
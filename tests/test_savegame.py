@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import savegame
+from savegame import SaveFile, SaveLayout, SaveSnapshot, compact_save, write_snapshot
+
+TILES = ("dirt", "stone")
+FLUIDS = ("water",)
+
+
+def snapshot(chunks, full=False, state=None):
+    layout = SaveLayout(64, 64, 16)
+    return SaveSnapshot(layout, TILES, FLUIDS, 7, state or {}, chunks, full)
+
+
+def chunk(value):
+    return np.full(SaveLayout(64, 64, 16).record_shape, value, dtype=np.uint8)
+
+
+def stored(path):
+    save = SaveFile(path)
+    return {key: int(save.chunk(*key)[0, 0, 0]) for key in save.keys()}, save.state
+
+
+def test_partial_write_appends_and_loads(tmp_path):
+    path = str(tmp_path / "world.sav")
+    write_snapshot(path, snapshot({(0, 0): chunk(1), (1, 0): chunk(2)}, full=True))
+    write_snapshot(path, snapshot({(1, 0): chunk(3), (2, 1): chunk(4)}, state={"hp": 5}))
+    assert stored(path) == ({(0, 0): 1, (1, 0): 3, (2, 1): 4}, {"hp": 5})
+
+
+def test_crash_before_header_keeps_old_save(tmp_path, monkeypatch):
+    path = str(tmp_path / "world.sav")
+    write_snapshot(path, snapshot({(0, 0): chunk(1), (1, 0): chunk(2)}, full=True, state={"hp": 1}))
+    size = (tmp_path / "world.sav").stat().st_size
+
+    def killed(*args):
+        raise OSError("killed")
+
+    # Records and index reach the file, the header rewrite never happens
+    monkeypatch.setattr(savegame, "encode_header", killed)
+    with pytest.raises(OSError):
+        write_snapshot(path, snapshot({(0, 0): chunk(9), (3, 3): chunk(8)}, state={"hp": 2}))
+    monkeypatch.undo()
+
+    assert (tmp_path / "world.sav").stat().st_size > size
+    assert stored(path) == ({(0, 0): 1, (1, 0): 2}, {"hp": 1})
+
+
+def test_compact_drops_superseded_records(tmp_path):
+    path = str(tmp_path / "world.sav")
+    write_snapshot(path, snapshot({(0, 0): chunk(1)}, full=True))
+    for value in range(2, 6):
+        write_snapshot(path, snapshot({(0, 0): chunk(value)}))
+    size = (tmp_path / "world.sav").stat().st_size
+    assert compact_save(path)
+    assert (tmp_path / "world.sav").stat().st_size < size
+    assert not compact_save(path)
+    assert stored(path) == ({(0, 0): 5}, {})
@@ -0,0 +1,37 @@
+# ---------- Fixed-timestep simulation clock ----------
+#
+# Frames hand their real duration to advance(), which banks it and pays it
+# out as whole simulation steps of ``step`` seconds, so the game behaves the
+# same at any frame rate.  What is left over (less than a step) becomes
+# ``alpha``, the fraction of the way from the previous step's state to the
+# current one that the renderer should draw.  After a long stall (a slow
+# frame, the shop scene, a window drag) at most ``max_steps`` are run and
+# the rest of the backlog is dropped, so a slow machine slows the game down
+# instead of spiralling into ever longer catch-up frames.
+
+SIM_HZ = 60
+MAX_CATCHUP_STEPS = 5
+
+
+class FixedTimestep:
+    def __init__(self, step: float = 1.0 / SIM_HZ, max_steps: int = MAX_CATCHUP_STEPS):
+        self.step = step
+        self.max_steps = max_steps
+        self.acc = 0.0
+        self.dropped = 0.0      # seconds of backlog thrown away so far
+
+    def advance(self, frame_dt: float) -> int:
+        """Bank frame_dt seconds; returns how many steps to simulate now."""
+        self.acc += frame_dt
+        n = int(self.acc / self.step)
+        if n > self.max_steps:
+            self.dropped += (n - self.max_steps) * self.step
+            n = self.max_steps
+            self.acc = n * self.step + self.acc % self.step
+        self.acc = max(0.0, self.acc - n * self.step)
+        return n
+
+    @property
+    def alpha(self) -> float:
+        """How far between the last two steps to draw, 0..1."""
+        return min(1.0, self.acc / self.step)
@@ -0,0 +1,247 @@
+from typing import Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+# ---------- Chunked tile storage ----------
+#
+# The world is split into CHUNK_SIZE x CHUNK_SIZE chunks.  Each chunk is one
+# uint8 array of shape (NUM_LAYERS, CHUNK_SIZE, CHUNK_SIZE) indexed as
+# [layer, local_x, local_y]:
+#   LAYER_TILE         tile id (0 = empty, i + 1 = tile_names[i])
+#   LAYER_BG           tile id whose background colour shows behind the cell (0 = sky)
+#   LAYER_REVEALED     1 where the fog has been lifted
+#   LAYER_FLUID        fluid id (0 = none)
+#   LAYER_FLUID_LEVEL  fluid units in the cell
+#   LAYER_VARIANT      which art variant and flip the tile is drawn with
+#                      (chosen by the world generator; 0 for empty cells)
+# Keeping every per-tile layer in the chunk means a chunk can be generated,
+# evicted, spilled or saved as one unit.  Chunks are allocated on first
+# write; missing chunks read as empty sky.
+#
+# A store may have a ``source`` (a save file, a world generator): missing
+# chunks are first looked up there and kept once read, so only chunks that
+# are touched are ever loaded.
+
+CHUNK_SIZE = 32
+
+LAYER_TILE = 0
+LAYER_BG = 1
+LAYER_REVEALED = 2
+LAYER_FLUID = 3
+LAYER_FLUID_LEVEL = 4
+LAYER_VARIANT = 5
+NUM_LAYERS = 6
+
+EMPTY = 0
+
+# source(cx, cy) -> chunk array (NUM_LAYERS, C, C) or None if it has none
+ChunkSource = Callable[[int, int], Optional[np.ndarray]]
+
+
+class WorldStore:
+    def __init__(self, width: int, height: int, tile_names: Iterable[str],
+                 bg_colors: Mapping[str, Tuple[int, int, int]],
+                 sky_color: Tuple[int, int, int], chunk_size: int = CHUNK_SIZE):
+        if chunk_size & (chunk_size - 1):
+            raise ValueError("chunk_size must be a power of two")
+        self.width = int(width)
+        self.height = int(height)
+        self.chunk_size = chunk_size
+        self.shift = chunk_size.bit_length() - 1
+        self.mask = chunk_size - 1
+        self.names: Tuple[Optional[str], ...] = (None,) + tuple(tile_names)
+        self.ids: Dict[Optional[str], int] = {name: i for i, name in enumerate(self.names)}
+        # bg_palette[id] -> RGB; id 0 is the sky
+        self.bg_palette = np.array(
+            [sky_color] + [bg_colors[name] for name in self.names[1:]], dtype=np.uint8)
+        self._bg_tuples = [tuple(int(c) for c in rgb) for rgb in self.bg_palette]
+        self.chunks: Dict[Tuple[int, int], np.ndarray] = {}
+        self.source: Optional[ChunkSource] = None
+
+    # -- chunks -----------------------------------------------------------
+    @property
+    def chunks_x(self) -> int:
+        return (self.width + self.mask) >> self.shift
+
+    @property
+    def chunks_y(self) -> int:
+        return (self.height + self.mask) >> self.shift
+
+    def find_chunk(self, cx: int, cy: int) -> Optional[np.ndarray]:
+        """Chunk (cx, cy) from memory or the source; None if neither has it."""
+        ch = self.chunks.get((cx, cy))
+        if ch is None and self.source is not None:
+            ch = self.source(cx, cy)
+            if ch is not None:
+                self.chunks[(cx, cy)] = ch
+        return ch
+
+    def chunk(self, cx: int, cy: int) -> np.ndarray:
+        """Chunk array at chunk coords (cx, cy), allocating it if needed."""
+        ch = self.chunks.get((cx, cy))
+        if ch is None:
+            ch = self.find_chunk(cx, cy)
+            if ch is None:
+                ch = np.zeros((NUM_LAYERS, self.chunk_size, self.chunk_size), dtype=np.uint8)
+                self.chunks[(cx, cy)] = ch
+        return ch
+
+    def layer(self, layer: int, dtype=np.uint8) -> "LayerView":
+        """Array-like (width, height) view of one layer, e.g. for FogOfWar or FluidSim."""
+        return LayerView(self, layer, dtype)
+
+    def nbytes(self) -> int:
+        return sum(ch.nbytes for ch in self.chunks.values())
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    # -- single tiles -----------------------------------------------------
+    def get_id(self, x: int, y: int, layer: int = LAYER_TILE) -> int:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            ch = self.chunks.get((x >> self.shift, y >> self.shift))
+            if ch is None and self.source is not None:
+                ch = self.find_chunk(x >> self.shift, y >> self.shift)
+            if ch is not None:
+                return int(ch[layer, x & self.mask, y & self.mask])
+        return EMPTY
+
+    def get(self, x: int, y: int) -> Optional[str]:
+        """Tile type name at (x, y), or None for empty / out of bounds."""
+        return self.names[self.get_id(x, y)]
+
+    def is_solid(self, x: int, y: int) -> bool:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            ch = self.chunks.get((x >> self.shift, y >> self.shift))
+            if ch is None and self.source is not None:
+                ch = self.find_chunk(x >> self.shift, y >> self.shift)
+            return ch is not None and ch[LAYER_TILE, x & self.mask, y & self.mask] != EMPTY
+        return True
+
+    def is_solid_loaded(self, x: int, y: int) -> bool:
+        """Like is_solid, but chunks not in memory count as solid and are never loaded."""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            ch = self.chunks.get((x >> self.shift, y >> self.shift))
+            return ch is None or ch[LAYER_TILE, x & self.mask, y & self.mask] != EMPTY
+        return True
+
+    def set_id(self, x: int, y: int, value: int, layer: int = LAYER_TILE) -> None:
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError(f"tile ({x}, {y}) outside {self.width}x{self.height} world")
+        self.chunk(x >> self.shift, y >> self.shift)[layer, x & self.mask, y & self.mask] = value
+
+    def set(self, x: int, y: int, tile: Optional[str]) -> None:
+        self.set_id(x, y, self.ids[tile])
+
+    def background_at(self, x: int, y: int) -> Tuple[int, int, int]:
+        return self._bg_tuples[self.get_id(x, y, LAYER_BG)]
+
+    # -- bulk access ------------------------------------------------------
+    def slice(self, x0: int, x1: int, y0: int, y1: int, layer: int = LAYER_TILE,
+              fill: int = EMPTY, load: bool = True) -> np.ndarray:
+        """Copy of ``layer`` over [x0, x1) x [y0, y1); cells outside the world read ``fill``.
+
+        With ``load=False`` chunks not in memory read as empty instead of
+        being fetched from the source.
+        """
+        out = np.full((max(0, x1 - x0), max(0, y1 - y0)), fill, dtype=np.uint8)
+        ax0, ax1 = max(0, x0), min(self.width, x1)
+        ay0, ay1 = max(0, y0), min(self.height, y1)
+        if ax0 >= ax1 or ay0 >= ay1:
+            return out
+        out[ax0 - x0:ax1 - x0, ay0 - y0:ay1 - y0] = EMPTY
+        C, s = self.chunk_size, self.shift
+        for cx in range(ax0 >> s, ((ax1 - 1) >> s) + 1):
+            sx0, sx1 = max(ax0, cx * C), min(ax1, (cx + 1) * C)
+            for cy in range(ay0 >> s, ((ay1 - 1) >> s) + 1):
+                ch = self.find_chunk(cx, cy) if load else self.chunks.get((cx, cy))
+                if ch is None:
+                    continue
+                sy0, sy1 = max(ay0, cy * C), min(ay1, (cy + 1) * C)
+                out[sx0 - x0:sx1 - x0, sy0 - y0:sy1 - y0] = \
+                    ch[layer, sx0 - cx * C:sx1 - cx * C, sy0 - cy * C:sy1 - cy * C]
+        return out
+
+    def solid_slice(self, x0: int, x1: int, y0: int, y1: int) -> np.ndarray:
+        """Bool solidity over [x0, x1) x [y0, y1); outside the world counts as solid."""
+        return self.slice(x0, x1, y0, y1, LAYER_TILE, fill=255) != EMPTY
+
+    def write_slice(self, x0: int, y0: int, values: np.ndarray, layer: int = LAYER_TILE) -> None:
+        """Write a (w, h) array into ``layer`` with its corner at (x0, y0); clipped to the world."""
+        w, h = values.shape
+        ax0, ax1 = max(0, x0), min(self.width, x0 + w)
+        ay0, ay1 = max(0, y0), min(self.height, y0 + h)
+        if ax0 >= ax1 or ay0 >= ay1:
+            return
+        C, s = self.chunk_size, self.shift
+        for cx in range(ax0 >> s, ((ax1 - 1) >> s) + 1):
+            sx0, sx1 = max(ax0, cx * C), min(ax1, (cx + 1) * C)
+            for cy in range(ay0 >> s, ((ay1 - 1) >> s) + 1):
+                sy0, sy1 = max(ay0, cy * C), min(ay1, (cy + 1) * C)
+                self.chunk(cx, cy)[layer, sx0 - cx * C:sx1 - cx * C, sy0 - cy * C:sy1 - cy * C] = \
+                    values[sx0 - x0:sx1 - x0, sy0 - y0:sy1 - y0]
+
+
+class LayerView:
+    """One layer of a WorldStore indexed like a (width, height) array.
+
+    Supports ``view[x, y]`` and ``view[x0:x1, y0:y1]`` (no steps or negative
+    indices), for reading and writing.  Reads only see chunks already in
+    memory, so code that scans a view never pulls chunks in; writes go
+    through the store and load or allocate the chunk first.
+    """
+
+    def __init__(self, world: WorldStore, layer: int, dtype=np.uint8):
+        self.world = world
+        self.layer = layer
+        self.dtype = np.dtype(dtype)
+        self.shape = (world.width, world.height)
+        self._chunks = world.chunks
+        self._shift, self._mask = world.shift, world.mask
+        self._bool = self.dtype == np.bool_
+
+    def _bounds(self, key) -> Tuple[int, int, int, int]:
+        xs, ys = key
+        if not isinstance(xs, slice):
+            xs = slice(xs, xs + 1)
+        if not isinstance(ys, slice):
+            ys = slice(ys, ys + 1)
+        x0 = 0 if xs.start is None else xs.start
+        x1 = self.shape[0] if xs.stop is None else xs.stop
+        y0 = 0 if ys.start is None else ys.start
+        y1 = self.shape[1] if ys.stop is None else ys.stop
+        return x0, x1, y0, y1
+
+    def _read_region(self, key) -> np.ndarray:
+        x, y = key
+        x0, x1, y0, y1 = self._bounds(key)
+        out = self.world.slice(x0, x1, y0, y1, self.layer, load=False)
+        if isinstance(x, slice) and isinstance(y, slice):
+            return out.astype(self.dtype, copy=False)
+        return (out[0] if not isinstance(x, slice) else out[:, 0]).astype(self.dtype, copy=False)
+
+    # Scalar access is the hot path (FluidSim reads a few cells per active
+    # cell), so it is tried first; a slice fails the shift and falls back.
+    def __getitem__(self, key):
+        x, y = key
+        try:
+            ch = self._chunks.get((x >> self._shift, y >> self._shift))
+        except TypeError:
+            return self._read_region(key)
+        if ch is None or not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+            return False if self._bool else 0
+        v = ch[self.layer, x & self._mask, y & self._mask]
+        return v != 0 if self._bool else v
+
+    def __setitem__(self, key, value) -> None:
+        x, y = key
+        if isinstance(x, slice) or isinstance(y, slice):
+            x0, x1, y0, y1 = self._bounds(key)
+            values = np.broadcast_to(np.asarray(value, dtype=np.uint8), (max(0, x1 - x0), max(0, y1 - y0)))
+            self.world.write_slice(x0, y0, values, self.layer)
+            return
+        ch = self._chunks.get((x >> self._shift, y >> self._shift))
+        if ch is None or not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+            self.world.set_id(x, y, value, self.layer)
+            return
+        ch[self.layer, x & self._mask, y & self._mask] = value
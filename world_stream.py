@@ -0,0 +1,164 @@
+import tempfile
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from world_store import NUM_LAYERS, ChunkSource, WorldStore
+
+# ---------- Streaming world chunks ----------
+#
+# The world is loaded one chunk column (every cy for one cx) at a time, as the
+# player gets near it.  A column's chunks come from, in order: the spill file
+# (chunks evicted earlier with changes in them), the save file, or the world
+# generator, which must be deterministic for a column so it can make it again
+# at any time.  Columns far from the player are evicted: unchanged chunks are
+# dropped (they will be generated again), changed ones are written to the
+# spill file.  Memory therefore depends on the view distance, not on how far
+# the player has travelled.
+
+STREAM_MARGIN = 1     # chunk columns loaded beyond the requested range
+EVICT_SLACK = 2       # further columns kept before eviction, so walking back and forth does not thrash
+
+ChunkKey = Tuple[int, int]
+# generate(cx) -> (chunks_y, NUM_LAYERS, C, C) uint8, the chunks of column cx
+ColumnGenerator = Callable[[int], np.ndarray]
+# on_load(cx) / on_evict(cx)
+ColumnHook = Callable[[int], None]
+
+
+class ChunkSpill:
+    """Evicted chunks, one fixed-size slot each, in an anonymous temporary file."""
+
+    def __init__(self, shape: Tuple[int, ...]):
+        self.shape = shape
+        self.record_bytes = int(np.prod(shape))
+        self._slots: Dict[ChunkKey, int] = {}
+        self._file = None
+
+    def __contains__(self, key: ChunkKey) -> bool:
+        return key in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def put(self, key: ChunkKey, chunk: np.ndarray) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="digsim-spill-")
+        slot = self._slots.setdefault(key, len(self._slots))
+        self._file.seek(slot * self.record_bytes)
+        self._file.write(np.ascontiguousarray(chunk, dtype=np.uint8).tobytes())
+
+    def get(self, key: ChunkKey) -> Optional[np.ndarray]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        self._file.seek(slot * self.record_bytes)
+        data = self._file.read(self.record_bytes)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.shape).copy()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._slots.clear()
+
+
+class ChunkStreamer:
+    """Loads and evicts whole chunk columns of ``world``; installs itself as its source."""
+
+    def __init__(self, world: WorldStore, generate: ColumnGenerator,
+                 saved: Optional[ChunkSource] = None, saved_keys: Iterable[ChunkKey] = ()):
+        self.world = world
+        self.generate = generate
+        self.saved = saved
+        # Chunks that differ from the generator's output: evicting them spills, not drops
+        self.modified: Set[ChunkKey] = set(saved_keys)
+        self.spill = ChunkSpill((NUM_LAYERS, world.chunk_size, world.chunk_size))
+        self.columns: Set[int] = set()
+        self.on_load: List[ColumnHook] = []
+        self.on_evict: List[ColumnHook] = []
+        self.generated = 0      # columns generated so far
+        world.source = self._load
+
+    # -- loading ----------------------------------------------------------
+    def _load(self, cx: int, cy: int) -> Optional[np.ndarray]:
+        if not (0 <= cx < self.world.chunks_x and 0 <= cy < self.world.chunks_y):
+            return None
+        self.load_column(cx)
+        return self.world.chunks.get((cx, cy))
+
+    def load_column(self, cx: int) -> None:
+        if cx in self.columns or not 0 <= cx < self.world.chunks_x:
+            return
+        chunks = self.world.chunks
+        generated = None
+        for cy in range(self.world.chunks_y):
+            key = (cx, cy)
+            if key in chunks:
+                continue
+            ch = self.spill.get(key) if key in self.spill else None
+            if ch is None and self.saved is not None:
+                ch = self.saved(cx, cy)
+            if ch is None:
+                if generated is None:
+                    generated = self.generate(cx)
+                    self.generated += 1
+                ch = generated[cy]
+            chunks[key] = ch
+        self.columns.add(cx)
+        for hook in self.on_load:
+            hook(cx)
+
+    def stored(self, cx: int, cy: int) -> Optional[np.ndarray]:
+        """Chunk (cx, cy) from memory, the spill file or the save, without loading its column."""
+        key = (cx, cy)
+        ch = self.world.chunks.get(key)
+        if ch is None:
+            ch = self.spill.get(key)
+        if ch is None and self.saved is not None:
+            ch = self.saved(cx, cy)
+        return ch
+
+    def needs_generating(self, cx: int) -> bool:
+        """True if loading column cx would run the generator (some chunk is neither loaded nor stored)."""
+        if cx in self.columns or not 0 <= cx < self.world.chunks_x:
+            return False
+        return any((cx, cy) not in self.modified for cy in range(self.world.chunks_y))
+
+    def mark_modified(self, keys: Iterable[ChunkKey]) -> None:
+        self.modified.update(keys)
+
+    # -- streaming --------------------------------------------------------
+    def column_range(self, x0: int, x1: int) -> Tuple[int, int]:
+        """First and last chunk column update(x0, x1) keeps loaded."""
+        s = self.world.shift
+        return max(0, (x0 >> s) - STREAM_MARGIN), min(self.world.chunks_x - 1, ((x1 - 1) >> s) + STREAM_MARGIN)
+
+    def update(self, x0: int, x1: int) -> Tuple[int, int]:
+        """Make sure tile columns [x0, x1) are loaded and evict columns far from them.
+
+        Returns the loaded chunk column range, as column_range().
+        """
+        lo, hi = self.column_range(x0, x1)
+        for cx in range(lo, hi + 1):
+            self.load_column(cx)
+        far = [cx for cx in self.columns if cx < lo - EVICT_SLACK or cx > hi + EVICT_SLACK]
+        for cx in far:
+            self.evict_column(cx)
+        return lo, hi
+
+    def evict_column(self, cx: int) -> None:
+        if cx not in self.columns:
+            return
+        for hook in self.on_evict:
+            hook(cx)
+        chunks = self.world.chunks
+        for cy in range(self.world.chunks_y):
+            key = (cx, cy)
+            ch = chunks.pop(key, None)
+            if ch is not None and key in self.modified:
+                self.spill.put(key, ch)
+        self.columns.discard(cx)
+
+    def close(self) -> None:
+        self.spill.close()